@@ -8,19 +8,36 @@ warnings.filterwarnings(
     module="stopwordsiso._core",
 )
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from controllers.document_controller import document_bp
+from services.vocabulaire_service import document_words, document_bigrams, delete_document_terms
+from services.aggregats_service import apply_changes, document_contribution
+from services.metadata_service import (
+    get_entry,
+    metadata_exists,
+    update as update_entries,
+    remove as remove_entries,
+    transaction as metadata_transaction
+)
+from services.generation_service import bump_generation
+from services.stats_service import snapshot_response
+from services.inventaire_service import find_file
+from services.recherche_service import current_index
+from services.catalogue_service import catalogue_for, parse_params as parse_list_params
+from services.tableau_service import analytics, parse_params as parse_analytics_params
+from services.fichiers_service import send_corpus_file, txt_viewer_response
+from services.textes_service import RAW_DIR, CLEAN_DIR, delete_text, document_window
+from services import cache_service, metrics_service, profiling_service
 from pathlib import Path
 import os
-import json
 from datetime import datetime
 
 # Config
 SECRET_KEY = 'dev-secret-key-change-in-prod'
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=["X-Total-Count"])  # Enable CORS for all routes (pagination total readable by the frontend)
 app.secret_key = SECRET_KEY
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max
 
@@ -31,6 +48,13 @@ os.makedirs('data/processed', exist_ok=True)
 # Register blueprints
 app.register_blueprint(document_bp, url_prefix="/api")
 
+# Latence / taille par endpoint + en-tête Server-Timing
+metrics_service.init_app(app)
+# Profilage à la demande (?profile=1 admin, PROFILE_ENDPOINTS)
+profiling_service.init_app(app)
+# Contexte des recalculs en arrière-plan du cache de recherche
+cache_service.init_app(app)
+
 # =====================================
 # Authentication Routes
 # =====================================
@@ -61,100 +85,71 @@ def health():
     return jsonify({'status': 'ok', 'message': 'Backend is running'})
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Métriques de tous les workers au format texte Prometheus."""
+    return Response(metrics_service.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # =====================================
 # Admin Stats Alias (for old frontend routes)
 # =====================================
 
 @app.route('/api/admin/stats', methods=['GET'])
 def admin_stats():
-    """Admin stats endpoint - delegates to visualisation service."""
-    from services.visualisation_service import compute_visualisation_data, get_all_imports, stats_imports_by_date
-    
-    # Get visualisation data
-    viz_data = compute_visualisation_data()
-    
-    # Get imports stats
-    imports = get_all_imports()
-    imports_stats = stats_imports_by_date(imports)
-    
-    # Build by_date structure for compatibility
-    by_date_dict = {}
-    for stat in imports_stats:
-        by_date_dict[stat['date']] = stat.get('count', 0)
-    
-    if by_date_dict:
-        sorted_items = sorted(by_date_dict.items())
-        by_date = {'labels': [k for k, _ in sorted_items], 'data': [v for _, v in sorted_items]}
-    else:
-        by_date = {'labels': [], 'data': []}
-    
-    # Build by_type structure
-    by_type = {}
-    for word, count in viz_data.get('top_types', []):
-        by_type[word] = count
-    
-    return jsonify({
-        'total_docs': viz_data.get('num_files', 0),
-        'total_words': viz_data.get('total_words', 0),
-        'total_size': round(viz_data.get('total_size_mo', 0) * 1024 * 1024),  # Convert back to bytes
-        'last_import': viz_data.get('last_import_date', 'Aucun'),
-        'by_type': by_type,
-        'by_date': by_date,
-        'top_words': viz_data.get('top_words', [])
-    })
+    """Admin stats endpoint - snapshot computed once per corpus generation (ETag/304)."""
+    return snapshot_response("admin_stats")
+
+
+@app.route('/api/admin/analytics', methods=['GET'])
+def admin_analytics():
+    """
+    Group-bys over the columnar document table (pandas, updated incrementally from metadata).
+    group = date | month | year | type | lang | size | pages; date_from, date_to, type, lang filter;
+    bins sets the size histogram resolution.
+    """
+    try:
+        params = parse_analytics_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(analytics(**params))
 
 
 @app.route('/api/admin/files', methods=['GET'])
 def admin_files():
-    """Get list of indexed files with optional search - delegates to /api/documents"""
-    q = request.args.get('q', '').strip().lower()
-    
-    metadata_file = Path("data/processed/metadata.json")
-    if not metadata_file.exists():
+    """
+    Get list of indexed files, paginated and sorted server-side.
+    q searches file names (trigram index) and document text (search index); type, date_from, date_to, size_min, size_max filter;
+    sort / order / limit / offset page the result (total in the X-Total-Count header).
+    """
+    if not metadata_exists():
         return jsonify([])
-    
     try:
-        with open(metadata_file, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
+        params = parse_list_params(request.args, default_sort="name")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    corpus_dir = Path("data/corpus")
+    try:
+        index = current_index()
+        catalogue = catalogue_for(index, corpus_dir)
     except Exception:
         return jsonify([])
     
+    # q : noms de fichiers (index de trigrammes) et texte des documents (index de recherche)
+    positions, total = catalogue.page(catalogue.filter(text_view=index, **params["filters"]), params["sort"],
+                                      params["descending"], params["offset"], params["limit"])
     rows = []
-    corpus_dir = Path("data/corpus")
-    raw_texts_dir = Path("data/processed/raw_texts")
-    
-    for key, data in metadata.items():
-        # Apply search filter if provided
-        if q and q not in key.lower() and q not in json.dumps(data).lower():
-            continue
-        
-        # 1. Essayer d'obtenir la taille depuis les métadonnées
+    for i in positions:
+        key, data, found = catalogue.names[i], catalogue.entries[i], catalogue.exact_files[i]
+        # 1. Taille depuis les métadonnées, sinon celle du fichier dans corpus (inventaire)
         file_size = data.get('size', 0)
         file_path = data.get('path')
+        if not file_size and found:
+            file_size = found['size']
+            if not file_path or os.path.abspath(file_path) != os.path.abspath(found['path']):
+                file_path = str(Path(found['path']).resolve())
         
-        # 2. Si pas de taille sauvegardée, chercher le fichier original dans corpus
-        if not file_size or file_size == 0:
-            if not file_path or not Path(file_path).exists():
-                # Chercher le fichier dans corpus par nom exact
-                possible_paths = []
-                # Chercher le fichier avec le nom exact
-                for f in corpus_dir.rglob('*'):
-                    if f.is_file() and f.name == key:
-                        possible_paths.append(f)
-                        break
-                
-                # Si trouvé, utiliser ce fichier
-                if possible_paths:
-                    file_path = str(possible_paths[0].resolve())
-            
-            # Calculer la taille depuis le fichier trouvé
-            if file_path and Path(file_path).exists():
-                try:
-                    file_size = Path(file_path).stat().st_size
-                except:
-                    file_size = 0
-        
-        # 3. Calculer le chemin relatif pour le téléchargement/visualisation
+        # 2. Calculer le chemin relatif pour le téléchargement/visualisation
         corpus_relpath = data.get('corpus_relpath')
         if not corpus_relpath and file_path:
             try:
@@ -164,6 +159,7 @@ def admin_files():
         elif not corpus_relpath:
             corpus_relpath = key
         
+        cleaned_text = index.text(i)
         rows.append({
             'filename': key,
             'name': key,
@@ -175,10 +171,12 @@ def admin_files():
             'date_import': data.get('date_import', 'Inconnue'),
             'path': file_path,
             'corpus_relpath': corpus_relpath,
-            'cleaned_text': (data.get('context', '')[:300]) if data.get('context') else ''
+            'cleaned_text': cleaned_text[:300] if cleaned_text else ''
         })
     
-    return jsonify(rows)
+    response = jsonify(rows)
+    response.headers['X-Total-Count'] = str(total)
+    return response
 
 
 @app.route('/api/admin/delete', methods=['POST'])
@@ -192,36 +190,19 @@ def admin_delete():
     if not filename:
         return jsonify({'error': 'filename required'}), 400
     
-    metadata_file = Path("data/processed/metadata.json")
     corpus_dir = Path("data/corpus")
     
-    if metadata_file.exists():
-        try:
-            with open(metadata_file, "r", encoding="utf-8") as f:
-                metadata = json.load(f)
-        except Exception:
-            metadata = {}
-    else:
-        metadata = {}
-    
     deleted_files = []
     
     try:
         # Delete processed files
-        raw_file = Path("data/processed/raw_texts") / f"{filename}.txt"
-        clean_file = Path("data/processed/clean_texts") / f"{filename}.txt"
-        for p in [raw_file, clean_file]:
-            if p.exists():
-                p.unlink()
+        for folder in (RAW_DIR, CLEAN_DIR):
+            for p in delete_text(folder, filename):
                 deleted_files.append(str(p))
                 print(f"[DELETE] Supprimé: {p}")
         
         # Delete original file from corpus
-        found = None
-        for f in corpus_dir.rglob("*"):
-            if f.is_file() and f.name == filename:
-                found = f
-                break
+        found = find_file(filename, corpus_dir)
         
         if found:
             found.unlink()
@@ -230,17 +211,20 @@ def admin_delete():
         else:
             print(f"[DELETE] Fichier non trouvé dans corpus: {filename}")
         
-        # Remove from metadata
-        if filename in metadata:
-            metadata.pop(filename)
-            print(f"[DELETE] Retiré des métadonnées: {filename}")
-        else:
-            print(f"[DELETE] Pas dans les métadonnées: {filename}")
-        
-        # Save updated metadata
-        metadata_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(metadata_file, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=4)
+        # Counts, metadata and aggregates are updated together
+        with metadata_transaction():
+            entry = get_entry(filename)
+            removed_contribs = [document_contribution(filename, entry)] if entry is not None else []
+            if delete_document_terms(filename):
+                print(f"[DELETE] Comptages supprimés: {filename}")
+
+            # Remove from metadata (append-only change log)
+            if remove_entries([filename]):
+                print(f"[DELETE] Retiré des métadonnées: {filename}")
+            else:
+                print(f"[DELETE] Pas dans les métadonnées: {filename}")
+            apply_changes(removed=removed_contribs)
+        bump_generation()
         
         print(f"[DELETE] Suppression terminée. Fichiers supprimés: {deleted_files}")
         return jsonify({
@@ -253,6 +237,25 @@ def admin_delete():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """List recorded profiles (most recent first)."""
+    if not profiling_service.is_admin(request):
+        return jsonify({'error': 'Admin only'}), 403
+    return jsonify(profiling_service.list_profiles())
+
+
+@app.route('/api/admin/profiles/<filename>', methods=['GET'])
+def admin_profile_download(filename):
+    """Download a profile file (.txt report, .prof for pstats/snakeviz, .collapsed for flamegraphs)."""
+    if not profiling_service.is_admin(request):
+        return jsonify({'error': 'Admin only'}), 403
+    path = profiling_service.profile_file(filename)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_from_directory(path.parent.resolve(), path.name, as_attachment=True)
+
+
 @app.route('/api/admin/download', methods=['GET'])
 def admin_download():
     """Download a file from corpus."""
@@ -266,19 +269,18 @@ def admin_download():
         
         # Si le path est absolu et existe, l'utiliser
         if file_path.is_absolute() and file_path.exists():
-            return send_from_directory(file_path.parent, file_path.name, as_attachment=True)
+            return send_corpus_file(file_path, as_attachment=True)
         
         # Sinon, chercher dans corpus en utilisant le path comme relatif
         file_in_corpus = corpus_dir / path
         if file_in_corpus.exists():
-            return send_from_directory(file_in_corpus.parent, file_in_corpus.name, as_attachment=True)
+            return send_corpus_file(file_in_corpus, as_attachment=True)
         
         # Dernier recours: chercher par nom de fichier
         filename = Path(path).name
-        found = list(corpus_dir.rglob(filename))
-        if found:
-            fp = found[0]
-            return send_from_directory(fp.parent, fp.name, as_attachment=True)
+        fp = find_file(filename, corpus_dir)
+        if fp:
+            return send_corpus_file(fp, as_attachment=True)
         
         return jsonify({'error': f'File not found: {path}'}), 404
     except Exception as e:
@@ -292,17 +294,14 @@ def admin_file_stats():
     if not filename:
         return jsonify({'error': 'filename required'}), 400
     
-    metadata_file = Path("data/processed/metadata.json")
-    if not metadata_file.exists():
+    if not metadata_exists():
         return jsonify({'error': 'No metadata found'}), 404
     
     try:
-        with open(metadata_file, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
+        data = get_entry(filename) or {}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
-    data = metadata.get(filename, {})
     if not data:
         return jsonify({'error': f'{filename} not found'}), 404
     
@@ -313,8 +312,8 @@ def admin_file_stats():
         'total_tokens_after': data.get('total_tokens_after'),
         'char_count_before': data.get('char_count_before'),
         'char_count_after': data.get('char_count_after'),
-        'words': data.get('words', [])[:50],  # Top 50
-        'bigrams': data.get('bigrams', [])[:50],  # Top 50
+        'words': document_words(filename, data, limit=50),  # Top 50
+        'bigrams': document_bigrams(filename, data, limit=50),  # Top 50
     })
 
 
@@ -325,17 +324,14 @@ def admin_file_detail():
     if not filename:
         return jsonify({'error': 'filename required'}), 400
     
-    metadata_file = Path("data/processed/metadata.json")
-    if not metadata_file.exists():
+    if not metadata_exists():
         return jsonify({'error': 'No metadata found'}), 404
     
     try:
-        with open(metadata_file, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
+        data = get_entry(filename) or {}
     except Exception:
         return jsonify({'error': 'Failed to load metadata'}), 500
     
-    data = metadata.get(filename, {})
     if not data:
         return jsonify({'error': f'{filename} not found'}), 404
     
@@ -346,9 +342,9 @@ def admin_file_detail():
         'num_pages': data.get('num_pages'),
         'total_tokens_after': data.get('total_tokens_after'),
         'char_count_after': data.get('char_count_after'),
-        'context': data.get('context', '')[:1000],  # First 1000 chars
-        'words': data.get('words', [])[:30],
-        'bigrams': data.get('bigrams', [])[:30],
+        'context': document_window(filename, data, 0, 1000),  # First 1000 chars (only the first compressed block is read)
+        'words': document_words(filename, data, limit=30),
+        'bigrams': document_bigrams(filename, data, limit=30),
         'thumbnail': data.get('thumbnail'),
     })
 
@@ -363,11 +359,7 @@ def admin_view():
     corpus_dir = Path("data/corpus")
     
     # Chercher le fichier dans le corpus
-    found_file = None
-    for f in corpus_dir.rglob("*"):
-        if f.is_file() and f.name == filename:
-            found_file = f
-            break
+    found_file = find_file(filename, corpus_dir)
     
     if not found_file:
         return f"<h1>Erreur</h1><p>Fichier '{filename}' introuvable dans le corpus</p>", 404
@@ -377,97 +369,23 @@ def admin_view():
     file_type = file_ext.lstrip('.')
     
     try:
-        # Pour les PDF, les servir directement
+        # PDF : envoi direct (Range / 206 pour que le lecteur puisse se déplacer dans le fichier)
         if file_type == 'pdf':
-            return send_from_directory(
-                found_file.parent,
-                found_file.name,
-                mimetype='application/pdf'
-            )
-        
-        # Pour les fichiers texte, HTML, lire et afficher dans une page
-        elif file_type in ['txt', 'html', 'htm']:
-            try:
-                with open(found_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            except UnicodeDecodeError:
-                # Essayer avec latin-1 si UTF-8 échoue
-                with open(found_file, 'r', encoding='latin-1') as f:
-                    content = f.read()
-            
-            # Pour HTML/HTM, servir directement
-            if file_type in ['html', 'htm']:
-                return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-            
-            # Pour TXT, créer une page HTML simple
-            html_content = f"""
-<!DOCTYPE html>
-<html lang="fr">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{filename}</title>
-    <style>
-        body {{
-            font-family: 'Courier New', monospace;
-            max-width: 1000px;
-            margin: 20px auto;
-            padding: 30px;
-            background: #f5f5f5;
-        }}
-        .container {{
-            background: white;
-            padding: 40px;
-            border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        h1 {{
-            color: #333;
-            border-bottom: 2px solid #667eea;
-            padding-bottom: 10px;
-            font-size: 20px;
-        }}
-        pre {{
-            white-space: pre-wrap;
-            word-wrap: break-word;
-            line-height: 1.6;
-            color: #333;
-            font-size: 14px;
-        }}
-        .close-btn {{
-            background: #667eea;
-            color: white;
-            padding: 10px 20px;
-            border: none;
-            border-radius: 5px;
-            cursor: pointer;
-            font-size: 14px;
-            margin-top: 20px;
-        }}
-        .close-btn:hover {{
-            background: #5568d3;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>📄 {filename}</h1>
-        <pre>{content}</pre>
-        <button class="close-btn" onclick="window.close()">Fermer</button>
-    </div>
-</body>
-</html>
-"""
-            return html_content, 200, {'Content-Type': 'text/html; charset=utf-8'}
-        
+            return send_corpus_file(found_file, mimetype='application/pdf')
+
+        # HTML/HTM : servis tels quels
+        elif file_type in ['html', 'htm']:
+            return send_corpus_file(found_file, mimetype='text/html')
+
+        # TXT : page HTML paginée, envoyée par morceaux (?page=N)
+        elif file_type == 'txt':
+            page = request.args.get('page', default=0, type=int)
+            return txt_viewer_response(found_file, filename, page)
+
         # Pour DOCX et autres formats, télécharger le fichier
         else:
-            return send_from_directory(
-                found_file.parent,
-                found_file.name,
-                as_attachment=False
-            )
-    
+            return send_corpus_file(found_file)
+
     except Exception as e:
         return f"<h1>Erreur</h1><p>Impossible d'ouvrir le fichier: {str(e)}</p>", 500
 
@@ -475,62 +393,64 @@ def admin_view():
 @app.route('/api/wordcloud', methods=['GET'])
 def wordcloud():
     """Return wordcloud data (top words)."""
-    from services.visualisation_service import compute_visualisation_data
-    
-    viz_data = compute_visualisation_data()
-    top_words = viz_data.get('top_words', [])
-    
     # Format for wordcloud: {"word": count, ...}
-    wordcloud_dict = {word: count for word, count in top_words}
-    
-    return jsonify(wordcloud_dict)
+    return snapshot_response("wordcloud")
 
 
 @app.route('/api/admin/recalc-sizes', methods=['POST'])
 def recalc_sizes():
     """Recalculate file sizes for all documents in metadata"""
-    metadata_file = Path("data/processed/metadata.json")
     corpus_dir = Path("data/corpus")
     
-    if not metadata_file.exists():
+    if not metadata_exists():
         return jsonify({"error": "Aucune métadonnée trouvée"}), 404
     
-    try:
-        with open(metadata_file, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
-    except Exception as e:
-        return jsonify({"error": f"Erreur lecture metadata: {e}"}), 500
-    
-    updated_count = 0
-    
-    for key, data in metadata.items():
-        file_path = data.get('path')
-        
-        # Chercher le fichier dans corpus si path n'existe pas
-        if not file_path or not Path(file_path).exists():
-            for f in corpus_dir.rglob('*'):
-                if f.is_file() and f.name == key:
-                    file_path = str(f.resolve())
+    counts = {"updated": 0}
+    
+    def compute(entries):
+        """Nouvelles tailles, calculées hors verrou ; seules les entrées modifiées sont retournées."""
+        counts["updated"] = 0
+        changed = {}
+        for key, data in entries.items():
+            if data is None:
+                continue
+            before = (data.get('path'), data.get('size'))
+            file_path = data.get('path')
+            
+            # Chercher le fichier dans corpus si path n'existe pas
+            if not file_path or not Path(file_path).exists():
+                found = find_file(key, corpus_dir)
+                if found:
+                    file_path = str(found.resolve())
                     data['path'] = file_path
-                    break
-        
-        # Recalculer la taille
-        if file_path and Path(file_path).exists():
-            try:
-                data['size'] = Path(file_path).stat().st_size
-                updated_count += 1
-            except:
-                pass
-    
-    # Sauvegarder les métadonnées mises à jour
+            
+            # Recalculer la taille
+            if file_path and Path(file_path).exists():
+                try:
+                    data['size'] = Path(file_path).stat().st_size
+                    counts["updated"] += 1
+                except:
+                    pass
+            
+            if (data.get('path'), data.get('size')) != before:
+                changed[key] = data
+        return changed
+    
+    def on_commit(before, changes):
+        # Agrégats mis à jour dans la même transaction que le journal
+        apply_changes(
+            removed=[document_contribution(key, before[key]) for key in changes],
+            added=[document_contribution(key, data) for key, data in changes.items()]
+        )
+    
+    # Mise à jour optimiste : réessayée si un autre worker modifie ces entrées entre-temps
     try:
-        with open(metadata_file, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=4)
-        return jsonify({"message": f"Tailles recalculées pour {updated_count} fichier(s)", "updated": updated_count})
+        update_entries(compute, on_commit=on_commit)
+        bump_generation()
+        return jsonify({"message": f"Tailles recalculées pour {counts['updated']} fichier(s)", "updated": counts["updated"]})
     except Exception as e:
         return jsonify({"error": f"Erreur sauvegarde: {e}"}), 500
 
-
 if __name__ == "__main__":
     # Start server on localhost:5000
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,210 @@
+# bench_pipeline.py
+# Benchmark des étapes du pipeline (acquisition, normalisation, extraction, pipeline fusionné)
+# sur un corpus synthétique déterministe. Chaque étape tourne dans un processus neuf pour
+# mesurer son pic mémoire, et les résultats sont écrits en JSON pour comparer deux runs.
+#
+# Usage (depuis backend/) :
+#   python benchmarks/bench_pipeline.py --docs 200 --output benchmarks/results/avant.json
+#   python benchmarks/bench_pipeline.py --docs 200 --compare benchmarks/results/avant.json
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus_synthetique import DEFAULT_MIX, generate_corpus, parse_mix  # noqa: E402
+
+# Étape -> dossier d'entrée (relatif au dossier de travail) et motif des fichiers lus
+STAGES = {
+    "acquisition": ("data/import", "*"),
+    "normalisation": ("data/processed/raw_texts", "*"),
+    "extraction": ("data/processed/clean_texts", "*.txt.z"),
+    "pipeline": ("data/processed/raw_texts", "*.txt.z"),
+}
+DEFAULT_STAGES = ["acquisition", "normalisation", "extraction", "pipeline"]
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus courant (Mo), None si non mesurable."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1e6
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : Ko, macOS : octets
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def _inputs(work_dir, stage):
+    folder, pattern = STAGES[stage]
+    files = [p for p in Path(work_dir, folder).glob(pattern) if p.is_file()]
+    return len(files), sum(p.stat().st_size for p in files)
+
+
+def run_stage(args):
+    """Exécuté dans un processus neuf : lance une étape et mesure temps et mémoire."""
+    work_dir, stage, workers, lemmatize = args
+    os.chdir(work_dir)
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    # Imports hors chronométrage (modèles, bibliothèques lourdes)
+    from services.acquisition_service import read_corpus
+    from services.normalisation_service import normalize_corpus
+    from services.extraction_service import extract_corpus
+    from services.pipeline_service import normalize_extract_corpus
+
+    docs, size = _inputs(work_dir, stage)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    if stage == "acquisition":
+        read_corpus(max_workers=workers)
+    elif stage == "normalisation":
+        normalize_corpus(max_workers=workers, lemmatize=lemmatize)
+    elif stage == "extraction":
+        extract_corpus(max_workers=workers)
+    elif stage == "pipeline":
+        normalize_extract_corpus(max_workers=workers, lemmatize=lemmatize)
+    seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+
+    return {
+        "stage": stage,
+        "docs": docs,
+        "bytes": size,
+        "seconds": round(seconds, 4),
+        "docs_per_s": round(docs / seconds, 2) if seconds else None,
+        "mb_per_s": round(size / 1e6 / seconds, 3) if seconds else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "rss_before_mb": round(rss_before, 1) if rss_before is not None else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(docs, mix, seed, words, stages, workers, lemmatize, repeat=1, work_dir=None):
+    """
+    Génère le corpus puis exécute chaque étape repeat fois (chaque répétition repart
+    d'un dossier data/processed vide). Retourne le dictionnaire de résultats.
+    """
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix="bench_pipeline_"))
+    import_dir = work_dir / "data" / "import"
+    t0 = time.perf_counter()
+    corpus = generate_corpus(import_dir, docs, mix, seed, words)
+    print(f"📦 Corpus: {corpus['files']} fichiers, {corpus['bytes'] / 1e6:.1f} Mo "
+          f"({time.perf_counter() - t0:.1f}s) -> {import_dir}")
+
+    runs = []
+    ctx = multiprocessing.get_context("spawn")
+    for r in range(repeat):
+        for sub in ("processed", "corpus"):
+            shutil.rmtree(work_dir / "data" / sub, ignore_errors=True)
+        for stage in stages:
+            # Un processus par étape : le pic mémoire n'inclut pas les étapes précédentes
+            with ctx.Pool(1) as pool:
+                result = pool.apply(run_stage, ((str(work_dir), stage, workers, lemmatize),))
+            result["run"] = r
+            runs.append(result)
+            print(f"⏱️ {stage:<14} {result['docs']:>6} docs  {result['seconds']:>8.2f}s  "
+                  f"{result['docs_per_s'] or 0:>8.1f} docs/s  {result['mb_per_s'] or 0:>7.2f} Mo/s  "
+                  f"pic {result['peak_rss_mb']} Mo")
+
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {"docs": docs, "mix": mix, "seed": seed, "words": words, "workers": workers,
+                   "lemmatize": lemmatize, "repeat": repeat},
+        "corpus": corpus,
+        "runs": runs,
+        "summary": summarize(runs),
+    }
+
+
+def summarize(runs):
+    """Meilleur temps par étape (le moins bruité d'une série de répétitions)."""
+    best = {}
+    for run in runs:
+        current = best.get(run["stage"])
+        if current is None or run["seconds"] < current["seconds"]:
+            best[run["stage"]] = {k: v for k, v in run.items() if k != "run"}
+    return best
+
+
+def compare(baseline, current):
+    """Affiche l'évolution par étape entre deux fichiers de résultats."""
+    print(f"\n📊 Comparaison avec {baseline['meta'].get('commit')} ({baseline['meta'].get('date')})")
+    if baseline.get("params") != current.get("params"):
+        print("⚠️ Paramètres différents: les chiffres ne sont pas directement comparables")
+    for stage, now in current["summary"].items():
+        before = baseline.get("summary", {}).get(stage)
+        if not before:
+            print(f"   {stage:<14} (absent de la référence)")
+            continue
+        speedup = before["seconds"] / now["seconds"] if now["seconds"] else float("inf")
+        rss = ""
+        if before.get("peak_rss_mb") and now.get("peak_rss_mb"):
+            rss = f"  pic {before['peak_rss_mb']} -> {now['peak_rss_mb']} Mo"
+        print(f"   {stage:<14} {before['seconds']:>8.2f}s -> {now['seconds']:>8.2f}s  x{speedup:.2f}{rss}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des étapes du pipeline sur un corpus synthétique")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                        help="poids par type: txt,html,docx,pdf,scan,zip")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--words", type=int, default=600, help="mots par document (moyenne)")
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES))
+    parser.add_argument("--workers", type=int, default=4, help="max_workers passé à chaque étape")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-lemmatize", action="store_true")
+    parser.add_argument("--dir", help="dossier de travail (par défaut: dossier temporaire)")
+    parser.add_argument("--output", help="fichier JSON de résultats (défaut: benchmarks/results/pipeline_<date>.json)")
+    parser.add_argument("--compare", help="fichier JSON de référence à comparer")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"étape(s) inconnue(s): {unknown} (attendues: {', '.join(STAGES)})")
+
+    results = run_benchmark(args.docs, parse_mix(args.mix), args.seed, args.words, stages,
+                            args.workers, not args.no_lemmatize, args.repeat, args.dir)
+
+    output = Path(args.output) if args.output else (
+        BACKEND_DIR / "benchmarks" / "results" / f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"💾 Résultats: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
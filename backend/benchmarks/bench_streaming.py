@@ -0,0 +1,163 @@
+# bench_streaming.py
+# Pic mémoire de l'acquisition sur des fichiers de taille croissante (TXT, HTML, PDF) :
+# en flux (process_file, texte écrit page par page dans raw_texts) contre en mémoire
+# (acquire_file, texte complet retourné). En flux, le pic doit rester à peu près constant.
+#
+# Usage (depuis backend/) :
+#   python benchmarks/bench_streaming.py --sizes 16,64,256 --pdf-pages 100,400
+#   python benchmarks/bench_streaming.py --formats txt --sizes 1024 --modes flux
+import argparse
+import json
+import multiprocessing
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_pipeline import peak_rss_mb  # noqa: E402
+from corpus_synthetique import _paragraphs, _wrap  # noqa: E402
+
+MODES = ("flux", "memoire")
+
+
+# ---------------------------
+# Gros fichiers synthétiques (écrits par blocs)
+# ---------------------------
+
+def _blocks(rng, target_bytes, render):
+    """Blocs de texte rendus jusqu'à atteindre target_bytes (quelques blocs distincts répétés)."""
+    samples = [render(_paragraphs(rng, 2000)).encode("utf-8") for _ in range(8)]
+    written = 0
+    while written < target_bytes:
+        block = samples[rng.randrange(len(samples))]
+        written += len(block)
+        yield block
+
+
+def write_big_txt(path, size_mb, rng):
+    render = lambda ps: "\n\n".join("\n".join(_wrap(p)) for p in ps) + "\n"
+    with open(path, "wb") as f:
+        for block in _blocks(rng, size_mb * 1_000_000, render):
+            f.write(block)
+
+
+def write_big_html(path, size_mb, rng):
+    with open(path, "wb") as f:
+        f.write(b"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Gros document</title>"
+                b"<style>p { margin: 0 }</style></head><body>\n")
+        render = lambda ps: "".join(f"<h2>Section</h2><p>{p}</p>\n<!-- fin -->\n" for p in ps)
+        for block in _blocks(rng, size_mb * 1_000_000, render):
+            f.write(block)
+        f.write(b"<script>var ignore = 1;</script></body></html>\n")
+
+
+def write_big_pdf(path, pages, rng):
+    import fitz
+    lines = _wrap(" ".join(_paragraphs(rng, 400)))
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 60), "\n".join(lines[:45]), fontsize=9)
+        rng.shuffle(lines)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+WRITERS = {"txt": write_big_txt, "html": write_big_html, "pdf": write_big_pdf}
+
+
+# ---------------------------
+# Mesure (un processus neuf par fichier et par mode)
+# ---------------------------
+
+def run_one(args):
+    path, mode, work_dir = args
+    sys.path.insert(0, str(BACKEND_DIR))
+    from services.acquisition_service import acquire_file, process_file
+
+    out_dir = Path(work_dir) / f"raw_{mode}"
+    corpus_dir = Path(work_dir) / f"corpus_{mode}"
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "flux":
+        name, meta = process_file(Path(path), corpus_dir, out_dir)
+    else:
+        name, meta, text = acquire_file(Path(path), corpus_dir, out_dir)
+    seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+    shutil.rmtree(corpus_dir, ignore_errors=True)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    return {
+        "seconds": round(seconds, 3),
+        "chars": meta["char_count_before"],
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "rss_before_mb": round(rss_before, 1) if rss_before is not None else None,
+    }
+
+
+def run_benchmark(formats, sizes, pdf_pages, modes, seed, work_dir=None):
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix="bench_streaming_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    ctx = multiprocessing.get_context("spawn")
+    runs = []
+    for fmt in formats:
+        for size in (pdf_pages if fmt == "pdf" else sizes):
+            path = work_dir / f"gros_{size}.{fmt}"
+            t0 = time.perf_counter()
+            WRITERS[fmt](path, size, rng)
+            file_mb = path.stat().st_size / 1e6
+            print(f"📦 {path.name}: {file_mb:.1f} Mo ({time.perf_counter() - t0:.1f}s)")
+            for mode in modes:
+                with ctx.Pool(1) as pool:
+                    result = pool.apply(run_one, ((str(path), mode, str(work_dir)),))
+                result.update({"format": fmt, "size": size, "file_mb": round(file_mb, 1), "mode": mode})
+                runs.append(result)
+                print(f"⏱️ {fmt:<5} {file_mb:>8.1f} Mo  {mode:<8} {result['seconds']:>8.2f}s  "
+                      f"pic {result['peak_rss_mb']} Mo (départ {result['rss_before_mb']} Mo)")
+            path.unlink()
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "meta": {"date": datetime.now().isoformat(timespec="seconds")},
+        "params": {"formats": formats, "sizes_mb": sizes, "pdf_pages": pdf_pages, "modes": modes, "seed": seed},
+        "runs": runs,
+    }
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pic mémoire de l'acquisition en flux / en mémoire")
+    parser.add_argument("--formats", default="txt,html,pdf")
+    parser.add_argument("--sizes", type=_int_list, default=[16, 64, 256], help="tailles TXT/HTML en Mo")
+    parser.add_argument("--pdf-pages", type=_int_list, default=[100, 400], help="nombres de pages PDF")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dir", help="dossier de travail (par défaut: dossier temporaire)")
+    parser.add_argument("--output", help="fichier JSON de résultats (défaut: benchmarks/results/streaming_<date>.json)")
+    args = parser.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    if any(f not in WRITERS for f in formats) or any(m not in MODES for m in modes):
+        parser.error(f"formats attendus: {', '.join(WRITERS)} ; modes attendus: {', '.join(MODES)}")
+
+    results = run_benchmark(formats, args.sizes, args.pdf_pages, modes, args.seed, args.dir)
+
+    output = Path(args.output) if args.output else (
+        BACKEND_DIR / "benchmarks" / "results" / f"streaming_{datetime.now():%Y%m%d_%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"💾 Résultats: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# charge_http.py
+# Test de charge HTTP local (hors ligne) : démarre l'API sur un corpus synthétique puis rejoue
+# un mélange de requêtes (/api/search dans tous les modes, requêtes sans résultat,
+# /api/autocomplete, /api/documents, /api/admin/files) avec N clients concurrents.
+# Rapporte p50/p95/p99, débit et erreurs par endpoint.
+#
+# Usage (depuis backend/) :
+#   python benchmarks/charge_http.py --docs 200 --concurrency 16 --duration 30
+#   python benchmarks/charge_http.py --server prod --workers 4 --output benchmarks/results/charge.json
+#   python benchmarks/charge_http.py --url http://127.0.0.1:5000 --duration 10   # serveur déjà lancé
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus_synthetique import VOCABULAIRE, generate_corpus, parse_mix  # noqa: E402
+
+SEARCH_MODES = ["contains", "not_contains", "starts_with", "ends_with", "exact",
+                "all_words", "all_words_and", "or", "all_words_or", "semantic"]
+DEFAULT_WEIGHTS = {"search": 60, "miss": 10, "autocomplete": 15, "documents": 10, "admin_files": 5}
+DEFAULT_MIX = "txt=50,html=25,docx=10,pdf=15"
+
+# Connexions locales uniquement : ignorer les proxys de l'environnement
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+# ---------------------------
+# Préparation : corpus + ingestion
+# ---------------------------
+
+def ingest(work_dir, batch=20):
+    """Importe data/import via /api/upload (client de test Flask, dans un processus neuf)."""
+    os.chdir(work_dir)
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app import app
+
+    client = app.test_client()
+    files = sorted(p for p in Path("data/import").iterdir() if p.is_file())
+    for start in range(0, len(files), batch):
+        data = {"files": [(io.BytesIO(p.read_bytes()), p.name) for p in files[start:start + batch]]}
+        r = client.post("/api/upload", data=data, content_type="multipart/form-data")
+        if r.status_code != 200:
+            raise RuntimeError(f"upload: {r.status_code} {r.get_data(as_text=True)[:200]}")
+    return len(files)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(work_dir, kind, port, workers, threads):
+    """Lance le serveur de développement (Flask threaded) ou de production (serve.py)."""
+    if kind == "prod":
+        cmd = [sys.executable, str(BACKEND_DIR / "serve.py"), "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--threads", str(threads)]
+    else:
+        code = (f"import sys; sys.path.insert(0, {str(BACKEND_DIR)!r}); from app import app; "
+                f"app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)")
+        cmd = [sys.executable, "-c", code]
+    log = open(Path(work_dir) / "server.log", "wb")
+    return subprocess.Popen(cmd, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(base_url, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with _opener.open(f"{base_url}/api/health", timeout=2) as r:
+                if r.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    return False
+
+
+# ---------------------------
+# Mélange de requêtes
+# ---------------------------
+
+def _typo(rng, word):
+    """Mot presque connu (lettre remplacée) : recherche floue sans résultat."""
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice("qxzkw") + word[i + 1:]
+
+
+def make_request(rng, weights):
+    """Retourne (label, chemin) pour une requête tirée selon les poids."""
+    kind = rng.choices(list(weights), weights=list(weights.values()))[0]
+    if kind == "search":
+        mode = rng.choice(SEARCH_MODES)
+        if mode in ("all_words", "all_words_and", "or", "all_words_or"):
+            q = " ".join(rng.sample(VOCABULAIRE, rng.randint(2, 3)))
+        elif mode in ("starts_with", "ends_with"):
+            word = rng.choice(VOCABULAIRE)
+            q = word[:3] if mode == "starts_with" else word[-3:]
+        elif mode == "exact":
+            q = " ".join(rng.sample(VOCABULAIRE, 2)) if rng.random() < 0.3 else rng.choice(VOCABULAIRE)
+        else:
+            q = rng.choice(VOCABULAIRE)
+        return f"search:{mode}", "/api/search?" + urllib.parse.urlencode({"q": q, "mode": mode})
+    if kind == "miss":
+        mode = rng.choice(SEARCH_MODES)
+        q = _typo(rng, rng.choice(VOCABULAIRE)) if rng.random() < 0.7 else "".join(rng.choices("bcdfghjklmnp", k=8))
+        return "search:miss", "/api/search?" + urllib.parse.urlencode({"q": q, "mode": mode})
+    if kind == "autocomplete":
+        word = rng.choice(VOCABULAIRE)
+        return "autocomplete", "/api/autocomplete?" + urllib.parse.urlencode({"q": word[:rng.randint(2, 4)]})
+    if kind == "documents":
+        params = {"type": rng.choice(["txt", "pdf", "html", "docx"])} if rng.random() < 0.3 else {}
+        return "documents", "/api/documents" + ("?" + urllib.parse.urlencode(params) if params else "")
+    params = {"q": rng.choice(VOCABULAIRE)[:3]} if rng.random() < 0.3 else {}
+    return "admin_files", "/api/admin/files" + ("?" + urllib.parse.urlencode(params) if params else "")
+
+
+def parse_weights(value):
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in value.split(","):
+        if part.strip():
+            key, _, weight = part.partition("=")
+            if key.strip() not in DEFAULT_WEIGHTS:
+                raise ValueError(f"Endpoint inconnu: {key} (attendus: {', '.join(DEFAULT_WEIGHTS)})")
+            weights[key.strip()] = float(weight)
+    return {k: v for k, v in weights.items() if v > 0}
+
+
+# ---------------------------
+# Charge et statistiques
+# ---------------------------
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_load(base_url, weights, concurrency, duration, requests_total, seed, warmup=0):
+    """Chaque client envoie ses requêtes en boucle (ferme) jusqu'à la durée ou au total demandé."""
+    samples = []  # (label, secondes, ok)
+    lock = threading.Lock()
+    counter = {"sent": 0}
+    stop_at = time.monotonic() + warmup + duration if duration else None
+    measure_from = time.monotonic() + warmup
+
+    def client(client_id):
+        rng = random.Random(seed * 1000 + client_id)
+        local = []
+        while True:
+            if stop_at and time.monotonic() >= stop_at:
+                break
+            if requests_total:
+                with lock:
+                    if counter["sent"] >= requests_total:
+                        break
+                    counter["sent"] += 1
+            label, path = make_request(rng, weights)
+            start = time.perf_counter()
+            try:
+                with _opener.open(base_url + path, timeout=60) as r:
+                    r.read()
+                    ok = r.status == 200
+            except (urllib.error.URLError, OSError):
+                ok = False
+            if time.monotonic() >= measure_from:
+                local.append((label, time.perf_counter() - start, ok))
+        with lock:
+            samples.extend(local)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    return samples, max(time.monotonic() - measure_from, 1e-9)
+
+
+def report(samples, elapsed):
+    by_label = {}
+    for label, seconds, ok in samples:
+        by_label.setdefault(label, []).append((seconds, ok))
+    by_label["total"] = [(s, ok) for _, s, ok in samples]
+
+    endpoints = {}
+    for label in sorted(by_label):
+        values = by_label[label]
+        latencies = sorted(s * 1000 for s, _ in values)
+        errors = sum(1 for _, ok in values if not ok)
+        endpoints[label] = {
+            "requests": len(values),
+            "errors": errors,
+            "error_rate": round(errors / len(values), 4) if values else 0,
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+            "max_ms": round(latencies[-1], 2) if latencies else None,
+        }
+    return endpoints
+
+
+def print_report(endpoints):
+    print(f"\n{'endpoint':<22}{'req':>8}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, s in endpoints.items():
+        print(f"{label:<22}{s['requests']:>8}{s['errors']:>6}{s['throughput_rps']:>9.1f}"
+              f"{s['p50_ms'] or 0:>9.1f}{s['p95_ms'] or 0:>9.1f}{s['p99_ms'] or 0:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge HTTP local des endpoints de lecture")
+    parser.add_argument("--url", help="serveur déjà lancé (pas de corpus ni de démarrage)")
+    parser.add_argument("--server", choices=["dev", "prod"], default="dev",
+                        help="dev: Flask threaded, prod: serve.py (gunicorn / waitress)")
+    parser.add_argument("--workers", type=int, default=4, help="workers du serveur prod")
+    parser.add_argument("--threads", type=int, default=4, help="threads par worker du serveur prod")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="types de documents du corpus généré")
+    parser.add_argument("--words", type=int, default=600)
+    parser.add_argument("--dir", help="dossier de travail (réutilisé s'il contient déjà un corpus)")
+    parser.add_argument("--weights", default="", help="ex: search=60,miss=10,autocomplete=15,documents=10,admin_files=5")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20, help="secondes (0: utiliser --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="nombre total de requêtes (remplace --duration)")
+    parser.add_argument("--warmup", type=float, default=2, help="secondes non mesurées au début")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+    if args.requests:
+        args.duration = 0
+    if not args.duration and not args.requests:
+        parser.error("--duration ou --requests requis")
+
+    weights = parse_weights(args.weights)
+    server = None
+    work_dir = None
+    base_url = args.url.rstrip("/") if args.url else None
+    try:
+        if not base_url:
+            work_dir = Path(args.dir or tempfile.mkdtemp(prefix="charge_http_"))
+            if not Path(work_dir, "data", "processed").exists():
+                summary = generate_corpus(work_dir / "data" / "import", args.docs, parse_mix(args.mix), args.seed, args.words)
+                print(f"📦 Corpus: {summary['files']} fichiers ({summary['bytes'] / 1e6:.1f} Mo) -> {work_dir}")
+                t0 = time.perf_counter()
+                with multiprocessing.get_context("spawn").Pool(1) as pool:
+                    count = pool.apply(ingest, (str(work_dir),))
+                print(f"📥 {count} fichiers importés en {time.perf_counter() - t0:.1f}s")
+            port = _free_port()
+            server = start_server(str(work_dir), args.server, port, args.workers, args.threads)
+            base_url = f"http://127.0.0.1:{port}"
+            if not wait_ready(base_url):
+                raise RuntimeError(f"Le serveur ne répond pas (voir {work_dir / 'server.log'})")
+
+        print(f"🚀 {base_url} | {args.concurrency} clients | "
+              + (f"{args.duration:.0f}s" if args.duration else f"{args.requests} requêtes") + f" | {weights}")
+        samples, elapsed = run_load(base_url, weights, args.concurrency, args.duration, args.requests,
+                                    args.seed, args.warmup if args.duration else 0)
+        endpoints = report(samples, elapsed)
+        print_report(endpoints)
+
+        if args.output:
+            results = {
+                "meta": {"date": datetime.now().isoformat(timespec="seconds"), "url": base_url,
+                         "server": None if args.url else args.server},
+                "params": {k: v for k, v in vars(args).items() if k not in ("output", "dir", "url")},
+                "elapsed_s": round(elapsed, 3),
+                "endpoints": endpoints,
+            }
+            Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.output).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+            print(f"💾 Résultats: {args.output}")
+    finally:
+        if server:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    if endpoints["total"]["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# corpus_synthetique.py
+# Génère un corpus synthétique déterministe (même graine -> mêmes textes) pour les benchmarks :
+# TXT, HTML, DOCX avec images, PDF texte, PDF scannés (pages image) et archives ZIP.
+#
+# Usage (depuis backend/) :
+#   python benchmarks/corpus_synthetique.py data/import --docs 200 --mix txt=40,html=20,docx=15,pdf=15,scan=5,zip=5
+import argparse
+import io
+import random
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+# Vocabulaire de base : fréquences de type Zipf pour des textes réalistes
+VOCABULAIRE = (
+    "abeille miel ruche reine essaim nectar pollen fleur jardin printemps été automne hiver "
+    "analyse texte corpus document recherche données modèle langue mot phrase paragraphe "
+    "machine apprentissage réseau neurone calcul statistique fréquence indexation requête "
+    "environnement climat température pluie forêt rivière montagne village ville région "
+    "histoire économie société culture politique éducation santé recherche université étudiant "
+    "le la les un une des du de et à en pour par avec sur dans est sont été avoir être plus"
+).split()
+
+DEFAULT_MIX = {"txt": 40, "html": 20, "docx": 15, "pdf": 15, "scan": 5, "zip": 5}
+EXTENSIONS = {"txt": ".txt", "html": ".html", "docx": ".docx", "pdf": ".pdf", "scan": ".pdf", "zip": ".zip"}
+# Date fixe dans les fichiers générés (DOCX, PDF) pour des sorties reproductibles
+FIXED_DATE = datetime(2024, 1, 1)
+
+
+def parse_mix(value):
+    """'txt=40,html=20' -> {"txt": 40, "html": 20}"""
+    mix = {}
+    for part in value.split(","):
+        if part.strip():
+            kind, _, weight = part.partition("=")
+            kind = kind.strip().lower()
+            if kind not in EXTENSIONS:
+                raise ValueError(f"Type inconnu: {kind} (attendus: {', '.join(EXTENSIONS)})")
+            mix[kind] = float(weight or 1)
+    return mix
+
+
+def _words(rng, count):
+    # Zipf approximatif : les premiers mots du vocabulaire sont plus fréquents
+    weights = [1.0 / (rank + 1) for rank in range(len(VOCABULAIRE))]
+    return rng.choices(VOCABULAIRE, weights=weights, k=count)
+
+
+def _paragraphs(rng, words_per_doc):
+    words = _words(rng, words_per_doc)
+    paragraphs, pos = [], 0
+    while pos < len(words):
+        size = rng.randint(40, 120)
+        sentence = " ".join(words[pos:pos + size])
+        paragraphs.append(sentence[:1].upper() + sentence[1:] + ".")
+        pos += size
+    return paragraphs
+
+
+def _text_image(lines, width=900):
+    """Image PNG contenant du texte (pour les DOCX avec images et les PDF scannés)."""
+    from PIL import Image, ImageDraw
+
+    height = 30 + 22 * len(lines)
+    image = Image.new("L", (width, height), color=255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((20, 15 + 22 * i), line, fill=0)
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _wrap(paragraph, width=90):
+    lines, line = [], ""
+    for word in paragraph.split():
+        if len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        lines.append(line)
+    return lines
+
+
+# ---------------------------
+# Écriture par type
+# ---------------------------
+
+def write_txt(path, paragraphs, rng):
+    path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+
+
+def write_html(path, paragraphs, rng):
+    body = "\n".join(f"<p>{p}</p>" for p in paragraphs)
+    html = (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{path.stem}</title>"
+            f"<style>p {{ margin: 1em; }}</style></head><body><h1>{path.stem}</h1>\n{body}\n</body></html>")
+    path.write_text(html, encoding="utf-8")
+
+
+def write_docx(path, paragraphs, rng):
+    import docx
+    from docx.shared import Inches
+
+    document = docx.Document()
+    document.core_properties.created = FIXED_DATE
+    document.core_properties.modified = FIXED_DATE
+    document.add_heading(path.stem, level=1)
+    for i, paragraph in enumerate(paragraphs):
+        document.add_paragraph(paragraph)
+        if i % 3 == 0:
+            # Image contenant du texte : exerce l'OCR des images intégrées
+            image = _text_image(_wrap(paragraph)[:4])
+            document.add_picture(io.BytesIO(image), width=Inches(5))
+    document.save(path)
+
+
+def write_pdf(path, paragraphs, rng):
+    import fitz
+
+    doc = fitz.open()
+    lines = [line for p in paragraphs for line in _wrap(p) + [""]]
+    for start in range(0, max(len(lines), 1), 45):
+        page = doc.new_page()
+        page.insert_text((50, 60), "\n".join(lines[start:start + 45]), fontsize=10)
+    doc.set_metadata({"creationDate": "D:20240101000000", "modDate": "D:20240101000000"})
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def write_scan(path, paragraphs, rng):
+    """PDF « scanné » : pages image uniquement, sans couche texte."""
+    import fitz
+
+    doc = fitz.open()
+    lines = [line for p in paragraphs for line in _wrap(p) + [""]]
+    for start in range(0, max(len(lines), 1), 35):
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=_text_image(lines[start:start + 35], width=1240))
+    doc.set_metadata({"creationDate": "D:20240101000000", "modDate": "D:20240101000000"})
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def write_zip(path, paragraphs, rng):
+    """Archive contenant quelques TXT et HTML (extraits par read_corpus)."""
+    per_file = max(1, len(paragraphs) // 3)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for i in range(3):
+            chunk = paragraphs[i * per_file:(i + 1) * per_file] or paragraphs[:1]
+            info = zipfile.ZipInfo(f"{path.stem}_{i}.txt" if i % 2 == 0 else f"{path.stem}_{i}.html",
+                                   date_time=FIXED_DATE.timetuple()[:6])
+            content = "\n\n".join(chunk) if i % 2 == 0 else "<html><body>" + "".join(f"<p>{p}</p>" for p in chunk) + "</body></html>"
+            archive.writestr(info, content.encode("utf-8"), compress_type=zipfile.ZIP_DEFLATED)
+
+
+WRITERS = {"txt": write_txt, "html": write_html, "docx": write_docx, "pdf": write_pdf, "scan": write_scan, "zip": write_zip}
+
+
+def generate_corpus(out_dir, docs=100, mix=None, seed=42, words_per_doc=600):
+    """
+    Écrit docs fichiers dans out_dir selon mix ({type: poids}). Les tailles varient
+    autour de words_per_doc. Retourne {"files": n, "bytes": total, "by_type": {...}}.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    kinds = list(mix)
+    by_type = {kind: 0 for kind in kinds}
+    total = 0
+    for i in range(docs):
+        kind = rng.choices(kinds, weights=[mix[k] for k in kinds])[0]
+        # Graine propre à chaque document : le contenu ne dépend pas des autres fichiers
+        doc_rng = random.Random(f"{seed}-{i}")
+        paragraphs = _paragraphs(doc_rng, max(20, int(doc_rng.lognormvariate(0, 0.6) * words_per_doc)))
+        path = out_dir / f"doc_{i:05d}_{kind}{EXTENSIONS[kind]}"
+        WRITERS[kind](path, paragraphs, doc_rng)
+        by_type[kind] += 1
+        total += path.stat().st_size
+    return {"files": docs, "bytes": total, "by_type": by_type}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un corpus synthétique déterministe")
+    parser.add_argument("out_dir")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--words", type=int, default=600, help="mots par document (moyenne)")
+    args = parser.parse_args()
+
+    summary = generate_corpus(args.out_dir, args.docs, parse_mix(args.mix), args.seed, args.words)
+    print(f"✅ {summary['files']} fichiers ({summary['bytes'] / 1e6:.1f} Mo) dans {args.out_dir}: {summary['by_type']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# stress_concurrence.py
+# Test de charge : plusieurs processus (comme des workers gunicorn) importent et
+# suppriment des documents en parallèle sur le même dossier data/, puis on vérifie
+# qu'aucune mise à jour n'a été perdue.
+#
+# Usage (depuis backend/) :
+#   python benchmarks/stress_concurrence.py --workers 4 --ops 40
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+WORDS = ("abeille miel fleur pollen jardin robot machine données texte analyse "
+         "corpus recherche ruche reine essaim nectar capteur modèle langue réseau").split()
+
+
+def _letters(n):
+    # Les tokens contenant des chiffres sont filtrés par le nettoyage
+    out = ""
+    while True:
+        n, r = divmod(n, 26)
+        out = chr(ord("a") + r) + out
+        if n == 0:
+            return out
+
+
+def _text(rng, worker, i):
+    # Quelques mots propres au worker pour faire grossir le vocabulaire en parallèle
+    words = [rng.choice(WORDS) for _ in range(rng.randint(20, 80))]
+    words += ["terme" + _letters(worker * 100000 + i * 10 + k) for k in range(rng.randint(0, 5))]
+    return " ".join(words)
+
+
+def worker(args):
+    """Un worker : uploads et suppressions aléatoires via le client de test Flask."""
+    work_dir, worker_id, ops, seed, shared = args
+    os.chdir(work_dir)
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app import app
+
+    client = app.test_client()
+    rng = random.Random(seed)
+    own = [f"w{worker_id}_doc{i}.txt" for i in range(max(2, ops // 4))]
+    present = set()  # état final attendu pour les documents propres au worker
+    errors = 0
+
+    for i in range(ops):
+        use_shared = shared and rng.random() < 0.3
+        name = rng.choice(shared if use_shared else own)
+        if rng.random() < 0.65:
+            data = {"files": (io.BytesIO(_text(rng, worker_id, i).encode("utf-8")), name)}
+            r = client.post("/api/upload", data=data, content_type="multipart/form-data")
+            ok = r.status_code == 200 and name in (r.get_json() or {}).get("results", {})
+            # Document partagé : un autre worker peut supprimer le fichier pendant l'import
+            ok = ok or (use_shared and r.status_code == 200)
+            if ok and not use_shared:
+                present.add(name)
+        elif rng.random() < 0.5:
+            r = client.delete("/api/documents", json={"names": [name]})
+            ok = r.status_code == 200 and not (r.get_json() or {}).get("errors")
+            if ok and not use_shared:
+                present.discard(name)
+        else:
+            r = client.post("/api/admin/delete", json={"filename": name})
+            ok = r.status_code == 200
+            if ok and not use_shared:
+                present.discard(name)
+        if not ok:
+            errors += 1
+            print(f"❌ worker {worker_id}: {r.status_code} {r.get_data(as_text=True)[:200]}")
+    return worker_id, sorted(present), errors
+
+
+def check(work_dir, expected_own, prefixes):
+    """Vérifie la cohérence des métadonnées, comptages, vocabulaire, index et agrégats."""
+    os.chdir(work_dir)
+    sys.path.insert(0, str(BACKEND_DIR))
+    from services.metadata_service import load_metadata
+    from services.vocabulaire_service import vocabulary, TERMS_DIR
+    from services import aggregats_service as ag
+
+    problems = []
+    metadata = load_metadata()
+
+    own_in_meta = {n for n in metadata if n.startswith(prefixes)}
+    lost = set(expected_own) - own_in_meta
+    extra = own_in_meta - set(expected_own)
+    if lost:
+        problems.append(f"documents perdus: {sorted(lost)}")
+    if extra:
+        problems.append(f"documents supprimés encore présents: {sorted(extra)}")
+
+    with_terms = {p.name[:-len(".bin")] for p in TERMS_DIR.glob("*.bin")} if TERMS_DIR.exists() else set()
+    if with_terms != set(metadata):
+        problems.append(f"comptages et métadonnées désynchronisés: {sorted(with_terms ^ set(metadata))}")
+
+    vocab = vocabulary()
+    if len(vocab) != len(set(vocab)):
+        problems.append(f"vocabulaire: {len(vocab) - len(set(vocab))} terme(s) en double")
+
+    from services.recherche_service import current_index
+    from services.textes_service import document_text
+    index = current_index()
+    indexed = {index.names[i]: index.text(i) for i in range(len(index))}
+    if len(indexed) != len(index) or indexed != {n: document_text(n, e) for n, e in metadata.items()}:
+        problems.append(f"index de recherche désynchronisé: {sorted(set(indexed) ^ set(metadata))}")
+
+    incremental = ag.corpus_summary(k=50)
+    ag.rebuild(metadata)
+    full = ag.corpus_summary(k=50)
+    if incremental != full:
+        problems.append(f"agrégats incrémentaux différents d'une reconstruction: {incremental} != {full}")
+
+    return len(metadata), len(vocab), problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uploads et suppressions concurrents multi-processus")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=40, help="opérations par worker")
+    parser.add_argument("--shared", type=int, default=3, help="documents partagés entre workers (contention)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dir", help="dossier de travail (par défaut: dossier temporaire)")
+    args = parser.parse_args()
+
+    work_dir = args.dir or tempfile.mkdtemp(prefix="stress_corpus_")
+    Path(work_dir, "data", "corpus").mkdir(parents=True, exist_ok=True)
+    shared = [f"shared_doc{i}.txt" for i in range(args.shared)]
+    print(f"📂 Dossier de travail: {work_dir}")
+    print(f"🚀 {args.workers} worker(s) x {args.ops} opération(s)")
+
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.workers) as pool:
+        results = pool.map(worker, [(work_dir, w, args.ops, args.seed * 1000 + w, shared)
+                                    for w in range(args.workers)])
+    elapsed = time.perf_counter() - start
+
+    expected = [name for _, present, _ in results for name in present]
+    errors = sum(e for _, _, e in results)
+    prefixes = tuple(f"w{w}_" for w in range(args.workers))
+    num_docs, vocab_size, problems = check(work_dir, expected, prefixes)
+
+    total_ops = args.workers * args.ops
+    print(f"⏱️ {total_ops} opérations en {elapsed:.1f}s ({total_ops / elapsed:.1f} op/s)")
+    print(f"📄 {num_docs} document(s), {vocab_size} terme(s), {errors} requête(s) en erreur")
+    if problems or errors:
+        for p in problems:
+            print(f"❌ {p}")
+        sys.exit(1)
+    print("✅ Aucune mise à jour perdue")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,49 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 from pathlib import Path
 import json
 import os
 from datetime import datetime
 
-from services.acquisition_service import read_corpus, process_file as acq_process_file
-from services.normalisation_service import normalize_corpus, process_file as norm_process_file
-from services.extraction_service import extract_corpus, extract_from_text
-from services.visualisation_service import (
-    compute_visualisation_data,
-    stats_imports_by_date,
-    get_all_imports
+from services.acquisition_service import read_corpus, acquire_file
+from services.pipeline_service import normalize_and_extract, normalize_extract_corpus
+from services.vocabulaire_service import (
+    detach_terms,
+    delete_document_terms,
+    document_words,
+    document_bigrams,
+    get_terms
 )
+from services.aggregats_service import (
+    apply_changes,
+    document_contribution,
+    rebuild as rebuild_aggregates,
+    live_term_ids
+)
+from services.metadata_service import (
+    load_metadata,
+    get_entry,
+    metadata_exists,
+    transaction as metadata_transaction,
+    upsert as upsert_entries,
+    remove as remove_entries
+)
+from services.generation_service import bump_generation
+from services.stats_service import snapshot_response
+from services.inventaire_service import find_file, invalidate as invalidate_inventory
+from services.recherche_service import current_index
+from services.catalogue_service import catalogue_for, parse_params as parse_list_params
+from services.textes_service import RAW_DIR, CLEAN_DIR, detach_text, delete_text
+from services.metrics_service import enqueue, dequeue
+from services.profiling_service import job as profiled_job
+from services.fichiers_service import send_corpus_file
+from services.cache_service import ResultCache
+from services.requete_service import QuerySyntaxError, parse_query, execute as execute_query
+from services.similarite_service import similar_documents
+from services.semantique_service import search as semantic_search
+from services.doublons_service import THRESHOLD as DUPLICATE_THRESHOLD, duplicates_of, duplicates_of_many, duplicate_clusters, representatives
+from services.facettes_service import facets_for, to_bits, to_positions
 
 # Blueprint unique pour tout
 document_bp = Blueprint("document_bp", __name__)
@@ -40,12 +71,14 @@ def upload_files():
         # Read/copy corpus into raw_texts, normalize and extract all
         try:
             logs.append("🔁 Démarrage reprocess_all")
-            rc = read_corpus(base_path=str(UPLOAD_DIR), corpus_dir=str(UPLOAD_DIR), output_path="data/processed/raw_texts")
-            logs.append(f"📥 read_corpus terminé: {len(rc)} fichiers")
-            normalize_corpus("data/processed/raw_texts", "data/processed/clean_texts")
-            logs.append("🧼 normalize_corpus terminé")
-            all_results = extract_corpus()
-            logs.append(f"🧠 extract_corpus terminé: {len(all_results)} entrées")
+            # Profilé si PROFILE_JOBS=1 (data/profiles)
+            with profiled_job("reprocess_all"):
+                rc = read_corpus(base_path=str(UPLOAD_DIR), corpus_dir=str(UPLOAD_DIR), output_path=str(RAW_DIR))
+                logs.append(f"📥 read_corpus terminé: {len(rc)} fichiers")
+                all_results = normalize_extract_corpus(str(RAW_DIR), str(CLEAN_DIR))
+                rebuild_aggregates(all_results)
+            bump_generation()
+            logs.append(f"🧼🧠 normalisation + extraction terminées: {len(all_results)} entrées")
             return jsonify({"message": "Reprocessing complet terminé ✅", "results": all_results, "logs": logs})
         except Exception as e:
             logs.append(f"❌ Erreur reprocess_all: {e}")
@@ -58,89 +91,98 @@ def upload_files():
         dest_path.parent.mkdir(parents=True, exist_ok=True)
         file.save(dest_path)
         saved_paths.append(dest_path)
+        # Un fichier réécrit sur place ne modifie pas la signature du dossier
+        invalidate_inventory(dest_path.parent, UPLOAD_DIR)
 
     # Traitement incrémental : ne traiter que les fichiers importés
-    metadata_file = Path("data/processed/metadata.json")
-    if metadata_file.exists():
-        try:
-            with open(metadata_file, "r", encoding="utf-8") as f:
-                existing_meta = json.load(f)
-        except Exception:
-            existing_meta = {}
-    else:
-        existing_meta = {}
-
     results = {}
     summary = {"new": 0, "updated": 0}
     logs.append(f"📦 Fichiers reçus: {len(saved_paths)}")
 
+    # Fichiers reçus en attente de traitement (queue_depth{queue="upload"})
+    enqueue("upload", len(saved_paths))
     for saved in saved_paths:
         try:
             # Acquisition: copie dans corpus si nécessaire et extrait texte brut
-            name, acq_meta = acq_process_file(saved, str(UPLOAD_DIR), Path("data/processed/raw_texts"))
+            name, acq_meta, raw_text = acquire_file(saved, str(UPLOAD_DIR), RAW_DIR)
+            invalidate_inventory(Path(acq_meta["path"]).parent, UPLOAD_DIR)
             logs.append(f"📥 {saved.name}: acquisition OK")
-            
-            # Normalisation: nettoie le fichier brut et écrit dans clean_texts
-            # Les fichiers .txt gardent le nom complet: texte_abeilles.pdf.txt
-            raw_txt = Path("data/processed/raw_texts") / f"{name}.txt"
-            clean_txt = Path("data/processed/clean_texts") / f"{name}.txt"
-            norm_process_file(raw_txt, Path("data/processed/clean_texts"))
-            logs.append(f"🧼 {saved.name}: normalisation OK")
 
-            # Extraction: calcule mots/bigrams/context pour le fichier nettoyé
-            _, extract_data = extract_from_text(clean_txt)
+            # Normalisation + extraction en une seule tokenisation, sur le texte en mémoire
+            extract_data = normalize_and_extract(name, raw_text)
+            logs.append(f"🧼 {saved.name}: normalisation OK")
             logs.append(f"🧠 {saved.name}: extraction OK ({extract_data.get('total_tokens_after', 0)} tokens)")
 
-            # Fusionner métadonnées existantes avec nouvelles données
-            # Utiliser 'name' (nom avec extension) comme clé dans metadata
-            merged = existing_meta.get(name, {})
-            # acq_meta contient des infos utiles (type, path, thumbnail...)
-            merged.update(acq_meta)
-            merged.update(extract_data)
-
-            # Garder date_import et type basés sur le fichier dans data/corpus
-            corpus_candidate = UPLOAD_DIR / name
-            
-            if corpus_candidate.exists():
-                merged["date_import"] = datetime.fromtimestamp(corpus_candidate.stat().st_mtime).strftime("%Y-%m-%d")
-                merged["type"] = corpus_candidate.suffix.lstrip('.') if corpus_candidate.suffix else merged.get("type", "unknown")
-                merged["size"] = corpus_candidate.stat().st_size
-                merged["path"] = str(corpus_candidate.resolve())
-                merged["filename"] = name
-                # Ajouter corpus_relpath pour visualisation
-                try:
-                    merged["corpus_relpath"] = str(corpus_candidate.resolve().relative_to(UPLOAD_DIR.resolve())).replace('\\', '/')
-                except Exception:
+            # Enregistrement du document : comptages, métadonnées et agrégats ensemble
+            with metadata_transaction():
+                # Fusionner métadonnées existantes avec nouvelles données
+                # Utiliser 'name' (nom avec extension) comme clé dans metadata
+                existing = get_entry(name)
+                merged = existing or {}
+                # Part de l'ancienne version dans les agrégats (avant d'écraser ses comptages)
+                old_contrib = document_contribution(name, merged) if existing is not None else None
+                # acq_meta contient des infos utiles (type, path, thumbnail...)
+                merged.update(acq_meta)
+                merged.update(extract_data)
+                # Mots et bigrammes : stockage binaire par ids du vocabulaire
+                detach_terms(name, merged)
+                # Texte nettoyé : stockage compressé, nom complet (clean_texts/texte_abeilles.pdf.txt.z),
+                # pas de copie dans les métadonnées
+                detach_text(name, merged, CLEAN_DIR)
+
+                # Garder date_import et type basés sur le fichier dans data/corpus
+                corpus_candidate = UPLOAD_DIR / name
+                
+                if corpus_candidate.exists():
+                    merged["date_import"] = datetime.fromtimestamp(corpus_candidate.stat().st_mtime).strftime("%Y-%m-%d")
+                    merged["type"] = corpus_candidate.suffix.lstrip('.') if corpus_candidate.suffix else merged.get("type", "unknown")
+                    merged["size"] = corpus_candidate.stat().st_size
+                    merged["path"] = str(corpus_candidate.resolve())
+                    merged["filename"] = name
+                    # Ajouter corpus_relpath pour visualisation
+                    try:
+                        merged["corpus_relpath"] = str(corpus_candidate.resolve().relative_to(UPLOAD_DIR.resolve())).replace('\\', '/')
+                    except Exception:
+                        merged["corpus_relpath"] = name
+                else:
+                    # Fallback: set today if file not found
+                    merged["date_import"] = datetime.utcnow().strftime("%Y-%m-%d")
+                    merged["type"] = merged.get("type", "unknown")
+                    merged["size"] = 0
+                    merged["path"] = None
+                    merged["filename"] = name
                     merged["corpus_relpath"] = name
-            else:
-                # Fallback: set today if file not found
-                merged["date_import"] = datetime.utcnow().strftime("%Y-%m-%d")
-                merged["type"] = merged.get("type", "unknown")
-                merged["size"] = 0
-                merged["path"] = None
-                merged["filename"] = name
-                merged["corpus_relpath"] = name
-
-            existed_before = name in existing_meta
-            existing_meta[name] = merged
+
+                # Une ligne ajoutée au journal des métadonnées, puis mise à jour incrémentale des agrégats
+                upsert_entries({name: merged})
+                apply_changes(removed=[old_contrib] if old_contrib else [], added=[document_contribution(name, merged)])
+
             # Indicateur status (new / updated)
-            status = "updated" if existed_before else "new"
+            status = "updated" if existing is not None else "new"
             merged_with_status = dict(merged)
             merged_with_status["status"] = status
+            # Aperçu du texte nettoyé (encore en mémoire) pour la page d'import
+            merged_with_status["context"] = extract_data.get("context", "")
             results[name] = merged_with_status
             summary[status] += 1
             logs.append(f"✅ {saved.name}: {status}")
         except Exception as e:
             print(f"Erreur traitement fichier {saved}: {e}")
             logs.append(f"❌ {saved.name}: erreur {e}")
+        finally:
+            dequeue("upload")
 
-    # Sauvegarde des métadonnées fusionnées
-    try:
-        metadata_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(metadata_file, "w", encoding="utf-8") as f:
-            json.dump(existing_meta, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        print(f"Erreur écriture metadata.json : {e}")
+    if results:
+        # Quasi-doublons signalés dès l'import : index LSH mis à jour une fois pour tout le lot
+        try:
+            for name, duplicates in duplicates_of_many(list(results)).items():
+                results[name]["duplicates"] = duplicates
+                if duplicates:
+                    logs.append(f"⚠️ {name}: quasi-doublon de " + ", ".join(
+                        f"{d['name']} ({d['jaccard']:.0%})" for d in duplicates))
+        except Exception as e:
+            print(f"Erreur détection des quasi-doublons: {e}")
+        bump_generation()
 
     logs.append("🏁 Traitement incrémental terminé")
     return jsonify({"message": "Traitement incrémental terminé ✅", "summary": summary, "results": results, "logs": logs})
@@ -165,143 +207,196 @@ def levenshtein_distance(s1, s2):
         previous_row = current_row
     return previous_row[-1]
 
+def _known_words(metadata):
+    """Mots connus : termes présents dans le corpus + anciennes entrées avec liste 'words'."""
+    all_words = set(get_terms(live_term_ids().tolist()))
+    for doc_data in metadata.values():
+        for w, _ in doc_data.get("words", []):
+            all_words.add(w.lower())
+    return all_words
+
 # ------------------------------
 # 🔍 Recherche de texte
 # ------------------------------
 @document_bp.route("/search", methods=["GET"])
 def search_documents():
-    query = request.args.get("q", "").strip().lower()
+    raw_query = request.args.get("q", "").strip()
+    query = raw_query.lower()
     mode = request.args.get("mode", "contains").lower()
     types_param = request.args.get("types", "").strip()
     
     # Parse types: comma-separated list or empty for all
     selected_types = [t.strip().lower() for t in types_param.split(",") if t.strip()] if types_param else []
+    # Mois d'import (AAAA-MM), même format que types
+    selected_dates = [d.strip() for d in request.args.get("dates", "").split(",") if d.strip()]
 
     if not query:
         return jsonify({"error": "Paramètre 'q' requis"}), 400
-    
+
+    if mode == "query":
+        # Langage booléen : opérateurs AND / OR / NOT en majuscules, la casse est gardée
+        query = raw_query
+        try:
+            parse_query(query)
+        except QuerySyntaxError as e:
+            return jsonify({"error": f"Requête invalide: {e}"}), 400
+
+    if not metadata_exists():
+        return jsonify({"error": "Aucun document indexé"}), 404
+
+    # Résultat en cache pour la génération courante (paramètres normalisés : types et mois triés)
+    body, hit = search_cache.get((query, mode, tuple(sorted(set(selected_types))), tuple(sorted(set(selected_dates)))))
+    response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return response
+
+
+def _search_body(params):
+    query, mode, selected_types, selected_dates = params
+    return jsonify(run_search(query, mode, list(selected_types), list(selected_dates))).get_data()
+
+
+search_cache = ResultCache("search_results", _search_body)
+
+
+def run_search(query, mode, selected_types, selected_dates=()):
+    """Recherche dans l'index de la génération courante ; retourne {"results", "suggestions", "facets"}."""
     # Supprimer les espaces de la requête pour la recherche
     query_no_spaces = query.replace(" ", "")
     query_words = query.split()
 
-    metadata_file = Path("data/processed/metadata.json")
-    if not metadata_file.exists():
-        return jsonify({"error": "Aucun document indexé"}), 404
-
-    with open(metadata_file, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
+    # Index partagé (mmap) de la génération courante : pas de copie du corpus par worker
+    index = current_index()
+    metadata = index.metadata()
+
+    # Filtres type / mois d'import (bitsets des facettes) appliqués avant la recherche textuelle
+    facets = facets_for(index)
+    allowed = facets.allowed(type=selected_types, date=selected_dates)
+    candidates = to_positions(allowed, len(index)).tolist() if allowed is not None else None
+    universe = set(range(len(index))) if candidates is None else set(candidates)
+
+    matched = set()
+    if mode == "contains":
+        matched = set(index.containing(query_no_spaces, candidates=candidates))
+    elif mode == "not_contains":
+        matched = universe - set(index.containing(query_no_spaces, candidates=candidates))
+    elif mode == "starts_with":
+        matched = set(index.starting_with(query_no_spaces, candidates=candidates))
+    elif mode == "ends_with":
+        matched = set(index.ending_with(query_no_spaces, candidates=candidates))
+    elif mode == "exact":
+        # Search for exact phrase (with word boundaries)
+        matched = set(index.containing(query, blob="lower", candidates=candidates))  # Keep spaces for exact phrase matching
+    elif mode in ("all_words", "all_words_and"):
+        # ALL words must be present (AND logic) : chaque mot ne teste que les documents restants
+        matched = universe
+        for word in query_words:
+            matched &= set(index.containing(word, candidates=sorted(matched)))
+    elif mode == "or" or mode == "all_words_or":
+        # At least one word must be present (OR logic)
+        for word in query_words:
+            matched |= set(index.containing(word, candidates=candidates))
+    elif mode == "query":
+        # AND / OR / NOT, "phrases", préfixe*, type:, date> : plan exécuté sur les postings
+        plan = parse_query(query)
+        matched = set(execute_query(plan, index, candidates).tolist())
+        query_words = plan.terms()
+        query = " ".join(query_words)
+    elif mode == "semantic":
+        # LSA : documents proches par le sens (vecteurs en mmap), restreints aux filtres
+        names = [index.names[i] for i in candidates] if candidates is not None else None
+        index_positions = {name: i for i, name in enumerate(index.names)}
+        semantic_scores = {name: score for name, score in semantic_search(query, names) if name in index_positions}
+        matched = {index_positions[name] for name in semantic_scores}
 
     results = {}
-    all_words = set() # Collect all words for suggestions if needed
-
-    for filename, data in metadata.items():
-        text = data.get("context", "").lower()
-        text_no_spaces = text.replace(" ", "")
+    positions = {}  # nom -> position dans l'index (comptage des facettes)
+
+    for i in sorted(matched):
+        filename, data = index.names[i], index.entries[i]
+        positions[filename] = i
+        text = index.text(i, "lower")
+        text_no_spaces = index.text(i, "compact")
+        # 🔹 On cherche le fichier correspondant dans data/corpus en comparant les noms complets
+        matched_file = UPLOAD_DIR / filename
         
-        # Collect words for potential suggestions
-        if not results: # Optimization: only collect if we might need them (though we iterate anyway)
-             for w, _ in data.get("words", []):
-                all_words.add(w.lower())
-
-        match = False
-        if mode == "contains":
-            match = query_no_spaces in text_no_spaces
-        elif mode == "not_contains":
-            match = query_no_spaces not in text_no_spaces
-        elif mode == "starts_with":
-            match = text_no_spaces.startswith(query_no_spaces)
-        elif mode == "ends_with":
-            match = text_no_spaces.endswith(query_no_spaces)
-        elif mode == "exact":
-            # Search for exact phrase (with word boundaries)
-            match = query in text  # Keep spaces for exact phrase matching
-        elif mode == "all_words":
-            match = all(word.replace(" ", "") in text_no_spaces for word in query.split())
-        elif mode == "all_words_and":
-            # ALL words must be present (AND logic)
-            match = all(word.replace(" ", "") in text_no_spaces for word in query.split())
-        elif mode == "or" or mode == "all_words_or":
-            # At least one word must be present (OR logic)
-            match = any(word.replace(" ", "") in text_no_spaces for word in query.split())
-
-        if match:
-            # 🔹 On cherche le fichier correspondant dans data/corpus en comparant les noms complets
-            matched_file = UPLOAD_DIR / filename
-            
-            if not matched_file.exists():
-                # Fallback: search recursively for exact filename
-                found = list(UPLOAD_DIR.rglob(filename))
-                if found:
-                    matched_file = found[0]
-
-            if matched_file.exists():
-                date_import = datetime.fromtimestamp(matched_file.stat().st_mtime).strftime("%Y-%m-%d")
-                doc_type = matched_file.suffix.lstrip('.') if matched_file.suffix else "unknown"
-                file_size = matched_file.stat().st_size
+        if not matched_file.exists():
+            # Fallback: search recursively for exact filename (inventaire en cache)
+            found = find_file(filename, UPLOAD_DIR)
+            if found:
+                matched_file = found
+
+        if matched_file.exists():
+            date_import = datetime.fromtimestamp(matched_file.stat().st_mtime).strftime("%Y-%m-%d")
+            doc_type = matched_file.suffix.lstrip('.') if matched_file.suffix else "unknown"
+            file_size = matched_file.stat().st_size
+        else:
+            # Fallback: try to guess type from filename in metadata
+            date_import = data.get("date_import", "Inconnue")
+            parts = filename.rsplit('.', 1)
+            if len(parts) > 1:
+                doc_type = parts[1]
             else:
-                # Fallback: try to guess type from filename in metadata
-                date_import = data.get("date_import", "Inconnue")
-                parts = filename.rsplit('.', 1)
-                if len(parts) > 1:
-                    doc_type = parts[1]
-                else:
-                    doc_type = data.get("type", "unknown")
-                file_size = 0
-            
-            # Filtrer par type si spécifié
-            if selected_types and doc_type.lower() not in selected_types:
-                continue
-
-            # Count occurrences of each search word
-            word_occurrences = {}
-            total_occurrences = 0
-            for word in query_words:
-                word_clean = word.replace(" ", "")
-                count = text_no_spaces.count(word_clean)
-                if count > 0:
-                    word_occurrences[word] = count
-                    total_occurrences += count
-            
-            # Extract a preview snippet around the first occurrence
-            preview = ""
-            if text:
-                # Find first occurrence position
-                first_pos = text.find(query_words[0]) if query_words else -1
-                if first_pos >= 0:
-                    start = max(0, first_pos - 100)
-                    end = min(len(text), first_pos + 200)
-                    preview = text[start:end].strip()
-                    if start > 0:
-                        preview = "..." + preview
-                    if end < len(text):
-                        preview = preview + "..."
-                else:
-                    preview = text[:300] + "..." if len(text) > 300 else text
-
-            results[filename] = {
-                "filename": filename,
-                "name": filename,
-                "words": data.get("words", []),
-                "bigrams": data.get("bigrams", []),
-                "context": data.get("context", ""),
-                "preview": preview,
-                "total_tokens_after": data.get("total_tokens_after", 0),
-                "date_import": date_import,
-                "type": doc_type,
-                "size": file_size,
-                "word_occurrences": word_occurrences,
-                "total_occurrences": total_occurrences,
-            }
-
-    # Sort results by total occurrences (descending)
-    sorted_results = dict(sorted(results.items(), key=lambda x: x[1].get('total_occurrences', 0), reverse=True))
+                doc_type = data.get("type", "unknown")
+            file_size = 0
+        
+        # Count occurrences of each search word
+        word_occurrences = {}
+        total_occurrences = 0
+        for word in query_words:
+            word_clean = word.replace(" ", "")
+            count = text_no_spaces.count(word_clean)
+            if count > 0:
+                word_occurrences[word] = count
+                total_occurrences += count
+        
+        # Extract a preview snippet around the first occurrence
+        preview = ""
+        if text:
+            # Find first occurrence position
+            first_pos = text.find(query_words[0]) if query_words else -1
+            if first_pos >= 0:
+                start = max(0, first_pos - 100)
+                end = min(len(text), first_pos + 200)
+                preview = text[start:end].strip()
+                if start > 0:
+                    preview = "..." + preview
+                if end < len(text):
+                    preview = preview + "..."
+            else:
+                preview = text[:300] + "..." if len(text) > 300 else text
+
+        results[filename] = {
+            "filename": filename,
+            "name": filename,
+            "words": document_words(filename, data),
+            "bigrams": document_bigrams(filename, data),
+            "context": index.text(i),
+            "preview": preview,
+            "total_tokens_after": data.get("total_tokens_after", 0),
+            "date_import": date_import,
+            "type": doc_type,
+            "size": file_size,
+            "word_occurrences": word_occurrences,
+            "total_occurrences": total_occurrences,
+        }
+        if mode == "semantic":
+            results[filename]["semantic_score"] = semantic_scores[filename]
+
+    # Sort results by total occurrences (descending) ; par similarité en mode sémantique
+    sort_key = "semantic_score" if mode == "semantic" else "total_occurrences"
+    sorted_results = dict(sorted(results.items(), key=lambda x: x[1].get(sort_key, 0), reverse=True))
 
     # Remove duplicate content (keep only one version when same text)
+    # Quasi-doublons (groupes MinHash/LSH) traités comme un même texte
     unique_results = {}
     seen_contexts = {}
+    groups = representatives()
     
     for filename, data in sorted_results.items():
         context = data.get('context', '').strip()
+        if filename in groups:
+            context = ("groupe", groups[filename])
         
         # Check if we've already seen this exact content
         if context in seen_contexts:
@@ -323,6 +418,7 @@ def search_documents():
     suggestions = []
     if not sorted_results and len(query) > 2:
         # Calculer la distance de Levenshtein avec tous les mots connus
+        all_words = _known_words(metadata)
         similar_words = []
         for w in all_words:
             # Ignorer les mots trop courts pour éviter le bruit
@@ -343,7 +439,9 @@ def search_documents():
         similar_words.sort(key=lambda x: (x[1], x[0]))
         suggestions = [w for w, _ in similar_words[:5]]
 
-    return jsonify({"results": sorted_results, "suggestions": suggestions})
+    # Comptages par facette sur les résultats retournés
+    result_bits = to_bits([positions[name] for name in sorted_results], len(index))
+    return {"results": sorted_results, "suggestions": suggestions, "facets": facets.counts(result_bits)}
 
 
 # ------------------------------
@@ -352,8 +450,7 @@ def search_documents():
 @document_bp.route("/visualisation", methods=["GET"])
 def visualisation():
     """Retourne les données globales de visualisation (nuage de mots, stats globales, etc.)"""
-    data = compute_visualisation_data()
-    return jsonify(data)
+    return snapshot_response("visualisation")
 
 
 # ------------------------------
@@ -362,9 +459,7 @@ def visualisation():
 @document_bp.route("/visualisation/imports", methods=["GET"])
 def imports_stats():
     """Retourne le nombre d'imports, leur taille et leurs types par date"""
-    imports = get_all_imports()
-    stats = stats_imports_by_date(imports)
-    return jsonify(stats)
+    return snapshot_response("imports")
 
 
 # ------------------------------
@@ -372,61 +467,43 @@ def imports_stats():
 # ------------------------------
 @document_bp.route("/documents", methods=["GET"])
 def list_documents():
-    """Retourne la liste des documents avec métadonnées essentielles sans le contexte."""
-    metadata_file = Path("data/processed/metadata.json")
-    if not metadata_file.exists():
+    """
+    Retourne la liste des documents avec métadonnées essentielles sans le contexte.
+    Filtres q (nom), type, date_from, date_to, size_min, size_max ; tri sort / order ;
+    pagination limit / offset (nombre total dans l'en-tête X-Total-Count).
+    """
+    if not metadata_exists():
         return jsonify([])
     try:
-        with open(metadata_file, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
+        params = parse_list_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        # Instantané léger (sans les textes) partagé avec l'index de recherche
+        catalogue = catalogue_for(current_index(), UPLOAD_DIR)
     except Exception as e:
         return jsonify({"error": f"Impossible de lire metadata.json: {e}"}), 500
 
-    # Optional filters
-    filter_type = (request.args.get("type") or '').strip().lower()
-    date_from_s = (request.args.get("date_from") or '').strip()
-    date_to_s = (request.args.get("date_to") or '').strip()
-
-    def parse_date(s):
-        try:
-            return datetime.strptime(s, "%Y-%m-%d") if s else None
-        except Exception:
-            return None
-
-    date_from = parse_date(date_from_s)
-    date_to = parse_date(date_to_s)
-
+    positions, total = catalogue.page(catalogue.filter(**params["filters"]), params["sort"],
+                                      params["descending"], params["offset"], params["limit"])
     rows = []
-    for key, data in metadata.items():
-        # Tentative de retrouver le fichier d'origine
-        original_path = data.get("path")
-        if original_path and not Path(original_path).exists():
-            # fallback: chercher par stem dans corpus
-            for f in UPLOAD_DIR.glob("*"):
-                if f.stem == key:
-                    original_path = str(f)
-                    break
-        # Date import
-        if original_path and Path(original_path).exists():
-            date_import = datetime.fromtimestamp(Path(original_path).stat().st_mtime).strftime("%Y-%m-%d")
-            size_bytes = Path(original_path).stat().st_size
-        else:
-            date_import = data.get("date_import", "Inconnue")
-            size_bytes = None
+    for i in positions:
+        key, data, found = catalogue.names[i], catalogue.entries[i], catalogue.files[i]
+        # Fichier d'origine (inventaire du corpus) : date et taille réelles
+        original_path = catalogue.paths[i]
+        size_bytes = found["size"] if found else None
 
         # Relative path within corpus for easy serving/downloading
         rel_in_corpus = None
-        try:
-            if original_path and Path(original_path).exists():
+        if found:
+            try:
                 rel_in_corpus = str(Path(original_path).resolve().relative_to(UPLOAD_DIR.resolve())).replace('\\', '/')
-        except Exception:
-            rel_in_corpus = None
-
-        size_mb = (size_bytes / (1024 * 1024)) if isinstance(size_bytes, (int, float)) else None
+            except Exception:
+                rel_in_corpus = None
 
         rows.append({
             "name": key,
-            "date_import": date_import,
+            "date_import": catalogue.dates[i] or "Inconnue",
             "total_tokens_after": data.get("total_tokens_after"),
             "char_count_after": data.get("char_count_after") or data.get("char_count_before"),
             "type": data.get("type"),
@@ -435,46 +512,28 @@ def list_documents():
             "status": data.get("status"),
             "corpus_relpath": rel_in_corpus,
             "size_bytes": size_bytes,
-            "size_mb": size_mb
+            "size_mb": (size_bytes / (1024 * 1024)) if size_bytes is not None else None
         })
 
-    # Apply filters if provided
-    def keep(r):
-        if filter_type and (r.get('type') or '').lower() != filter_type:
-            return False
-        if date_from or date_to:
-            d = parse_date(r.get('date_import') or '')
-            if not d:
-                return False
-            if date_from and d < date_from:
-                return False
-            if date_to and d > date_to:
-                return False
-        return True
-
-    filtered_rows = [r for r in rows if keep(r)]
-
-    return jsonify(filtered_rows)
+    response = jsonify(rows)
+    response.headers["X-Total-Count"] = str(total)
+    return response
 
 
-from flask import send_from_directory
-
 @document_bp.route("/data/corpus/<path:filename>")
 def serve_file(filename):
     # Try to find the file by stem (name without extension) if exact match fails
     file_path = UPLOAD_DIR / filename
     if not file_path.exists():
         # Fallback 1: search for exact filename recursively (e.g. in subfolders)
-        found = list(UPLOAD_DIR.rglob(filename))
+        found = find_file(Path(filename).name, UPLOAD_DIR)
         if found:
-            file_path = found[0]
+            file_path = found
         else:
             # Fallback 2: search by stem in corpus
-            stem = Path(filename).stem
-            for f in UPLOAD_DIR.rglob("*"):
-                if f.is_file() and f.stem == stem:
-                    file_path = f
-                    break
+            found = find_file(Path(filename).stem, UPLOAD_DIR, by_stem=True)
+            if found:
+                file_path = found
     
     if not file_path.exists():
         return jsonify({"error": "Fichier non trouvé"}), 404
@@ -493,12 +552,12 @@ def serve_file(filename):
     elif ext in ['.html', '.htm']:
         mimetype = 'text/html'
     
-    # Si c'est un type affichable, on force l'affichage inline
+    # Si c'est un type affichable, on force l'affichage inline (Range / 206 pour les PDF)
     if mimetype:
-        return send_from_directory(file_path.parent, file_path.name, mimetype=mimetype, as_attachment=False)
+        return send_corpus_file(file_path, mimetype=mimetype, as_attachment=False)
     
     # Sinon (docx, xlsx, etc.), ce sera un téléchargement par défaut du navigateur
-    return send_from_directory(file_path.parent, file_path.name, as_attachment=False)
+    return send_corpus_file(file_path, as_attachment=False)
 
 
 # ------------------------------
@@ -511,22 +570,16 @@ def autocomplete():
     if not prefix or len(prefix) < 2:
         return jsonify([])
     
-    metadata_file = Path("data/processed/metadata.json")
-    if not metadata_file.exists():
+    if not metadata_exists():
         return jsonify([])
     
     try:
-        with open(metadata_file, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
+        metadata = current_index().metadata()
     except Exception:
         return jsonify([])
     
     # Collecter tous les mots uniques
-    all_words = set()
-    for doc_data in metadata.values():
-        words_list = doc_data.get("words", [])
-        for w, _ in words_list:
-            all_words.add(w.lower())
+    all_words = _known_words(metadata)
     
     # Filtrer par préfixe exact
     exact_matches = sorted([w for w in all_words if w.startswith(prefix)])[:10]
@@ -572,7 +625,41 @@ def autocomplete():
 @document_bp.route("/documents/download/<path:relpath>", methods=["GET"])
 def download_document(relpath):
     # Sécurise en contraignant au dossier data/corpus
-    return send_from_directory("data/corpus", relpath, as_attachment=True)
+    file_path = safe_join(str(UPLOAD_DIR.resolve()), relpath)
+    if file_path is None or not os.path.isfile(file_path):
+        return jsonify({"error": "Fichier non trouvé"}), 404
+    return send_corpus_file(file_path, as_attachment=True)
+
+
+# ------------------------------
+# 🕸️ Documents similaires (k plus proches voisins TF-IDF)
+# ------------------------------
+@document_bp.route("/documents/similar", methods=["GET"])
+def similar():
+    name = (request.args.get("name") or "").strip()
+    if not name:
+        return jsonify({"error": "Paramètre 'name' requis"}), 400
+    if get_entry(name) is None:
+        return jsonify({"error": "Document inconnu"}), 404
+    try:
+        k = max(1, min(int(request.args.get("k", 10)), 50))
+    except ValueError:
+        return jsonify({"error": "Paramètre 'k' invalide"}), 400
+    return jsonify({"name": name, "similar": similar_documents(name, k)})
+
+
+# ------------------------------
+# 👯 Quasi-doublons (MinHash / LSH)
+# ------------------------------
+@document_bp.route("/duplicates", methods=["GET"])
+def duplicates():
+    """Groupes de quasi-doublons du corpus, ou quasi-doublons d'un document (?name=)."""
+    name = (request.args.get("name") or "").strip()
+    if name:
+        if get_entry(name) is None:
+            return jsonify({"error": "Document inconnu"}), 404
+        return jsonify({"name": name, "threshold": DUPLICATE_THRESHOLD, "duplicates": duplicates_of(name)})
+    return jsonify({"threshold": DUPLICATE_THRESHOLD, "clusters": duplicate_clusters()})
 
 
 # ------------------------------
@@ -585,14 +672,9 @@ def delete_documents():
     if not isinstance(names, list) or not names:
         return jsonify({"error": "Champ 'names' requis (liste)"}), 400
 
-    metadata_file = Path("data/processed/metadata.json")
-    if metadata_file.exists():
-        try:
-            with open(metadata_file, "r", encoding="utf-8") as f:
-                metadata = json.load(f)
-        except Exception:
-            metadata = {}
-    else:
+    try:
+        metadata = load_metadata()
+    except Exception:
         metadata = {}
 
     logs = []
@@ -602,15 +684,12 @@ def delete_documents():
     for name in names:
         try:
             # Supprimer fichiers traités
-            raw_file = Path("data/processed/raw_texts") / f"{name}.txt"
-            clean_file = Path("data/processed/clean_texts") / f"{name}.txt"
-            for p in [raw_file, clean_file]:
-                if p.exists():
-                    try:
-                        p.unlink()
+            for folder in (RAW_DIR, CLEAN_DIR):
+                try:
+                    for p in delete_text(folder, name):
                         logs.append(f"🗑️ Supprimé: {p}")
-                    except Exception as e:
-                        errors.append(f"Impossible de supprimer {p}: {e}")
+                except Exception as e:
+                    errors.append(f"Impossible de supprimer le texte de {name} dans {folder}: {e}")
 
             # Supprimer original dans corpus
             corpus_file = None
@@ -627,10 +706,7 @@ def delete_documents():
                     pass
             # 2) fallback: rechercher par stem direct dans data/corpus (non récursif)
             if not corpus_file:
-                for f in UPLOAD_DIR.glob("**/*"):
-                    if f.is_file() and f.stem == name:
-                        corpus_file = f
-                        break
+                corpus_file = find_file(name, UPLOAD_DIR, by_stem=True)
             if corpus_file and corpus_file.exists():
                 try:
                     corpus_file.unlink()
@@ -638,22 +714,23 @@ def delete_documents():
                 except Exception as e:
                     errors.append(f"Impossible de supprimer {corpus_file}: {e}")
 
-            # Retirer des métadonnées
-            if name in metadata:
-                metadata.pop(name, None)
-                deleted += 1
-            else:
-                logs.append(f"ℹ️ {name} non présent dans metadata.json")
+            # Comptages, métadonnées (journal) et agrégats retirés ensemble
+            with metadata_transaction():
+                entry = get_entry(name)
+                removed_contribs = [document_contribution(name, entry)] if entry is not None else []
+                delete_document_terms(name)
+                if remove_entries([name]):
+                    deleted += 1
+                else:
+                    logs.append(f"ℹ️ {name} non présent dans metadata.json")
+                apply_changes(removed=removed_contribs)
         except Exception as e:
             errors.append(f"Erreur sur {name}: {e}")
 
-    # Sauvegarder metadata.json mis à jour
     try:
-        metadata_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(metadata_file, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=4)
+        bump_generation()
     except Exception as e:
-        errors.append(f"Erreur écriture metadata.json: {e}")
+        errors.append(f"Erreur mise à jour génération: {e}")
 
     return jsonify({
         "deleted": deleted,
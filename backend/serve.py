@@ -0,0 +1,56 @@
+# serve.py
+# Lancement en production avec plusieurs workers :
+#   python serve.py --workers 4 --port 5000
+# gunicorn (processus) sous Linux / macOS, waitress (threads) sous Windows.
+# Les workers partagent l'index de recherche en mémoire mappée (services/recherche_service.py)
+# et le rechargent quand une ingestion publie une nouvelle génération du corpus.
+import argparse
+import os
+import sys
+
+
+def run_gunicorn(app, host, port, workers, threads, timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("timeout", timeout)
+            # Code chargé une seule fois dans le processus maître puis partagé par fork
+            self.cfg.set("preload_app", True)
+
+        def load(self):
+            return app
+
+    Application().run()
+
+
+def run_waitress(app, host, port, threads):
+    from waitress import serve
+    serve(app, host=host, port=port, threads=threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de production de l'API")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "5000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", "2")))
+    parser.add_argument("--timeout", type=int, default=300, help="secondes (les imports volumineux sont longs)")
+    args = parser.parse_args()
+
+    from app import app
+
+    if sys.platform == "win32":
+        # Pas de fork sous Windows : un seul processus, plusieurs threads
+        print(f"🚀 waitress sur http://{args.host}:{args.port} ({args.workers * args.threads} threads)")
+        run_waitress(app, args.host, args.port, args.workers * args.threads)
+    else:
+        print(f"🚀 gunicorn sur http://{args.host}:{args.port} ({args.workers} workers x {args.threads} threads)")
+        run_gunicorn(app, args.host, args.port, args.workers, args.threads, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
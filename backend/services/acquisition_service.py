@@ -1,8 +1,8 @@
 from pathlib import Path
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
-import os, json, shutil
-from bs4 import BeautifulSoup
+import os, json, shutil, time
+from html.parser import HTMLParser
 import docx2txt
 import fitz  # PyMuPDF
 import pdfplumber
@@ -13,60 +13,180 @@ import io
 import pytesseract
 import base64
 
+from services.metadata_service import replace_all
+from services.textes_service import open_writer
+from services.metrics_service import timed, record_stage, enqueue, dequeue
+
+# ---------------------------
+# Lecture en flux (mémoire bornée)
+# ---------------------------
+# Chaque lecteur produit le texte morceau par morceau (ligne, page, bloc HTML) ;
+# info reçoit num_pages et la vignette. Le texte n'est jamais concaténé en entier.
+
+READ_CHUNK = 1024 * 1024
+
+
+def iter_txt(file_path, info):
+    """Lignes sans espaces de début/fin, séparées par \n (comme "\n".join(line.strip() ...))."""
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        info["num_pages"] = 1  # num_pages = 1 pour txt
+        for i, line in enumerate(f):
+            yield line.strip() if i == 0 else "\n" + line.strip()
+
+
+class _HTMLTextParser(HTMLParser):
+    """
+    Texte d'un HTML sans construire de DOM, équivalent à
+    BeautifulSoup(f, 'html.parser').get_text(separator=' ', strip=True) :
+    chaînes sans espaces de début/fin, séparées par un espace, hors script/style/template.
+    """
+    SKIP = {"script", "style", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []       # chaînes prêtes, vidées par iter_html après chaque feed()
+        self._data = []     # texte courant (peut arriver en plusieurs morceaux)
+        self._skip = 0
+        self._first = True
+
+    def _emit(self, text):
+        text = text.strip()
+        if text:
+            self.out.append(text if self._first else " " + text)
+            self._first = False
+
+    def _flush(self):
+        if self._data:
+            self._emit("".join(self._data))
+            self._data = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in self.SKIP:
+            self._skip += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._data.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.startswith("CDATA[") and not self._skip:
+            self._emit(data[len("CDATA["):])
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def iter_html(file_path, info):
+    """Texte d'un fichier HTML/HTM, lu par blocs avec un analyseur incrémental."""
+    parser = _HTMLTextParser()
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            yield from parser.out
+            parser.out.clear()
+    parser.close()
+    yield from parser.out
+    info["num_pages"] = 1
+
+
+def iter_docx(file_path, info):
+    """Texte d'un DOCX puis OCR des images intégrées."""
+    yield docx2txt.process(file_path)
+    info["num_pages"] = 1
+    with ZipFile(file_path) as docx_zip:
+        for item in docx_zip.namelist():
+            # OCR sur les images contenues dans le DOCX
+            if item.startswith("word/media/") and item.lower().endswith((".png", ".jpg", ".jpeg")):
+                image_data = docx_zip.read(item)
+                with timed("ocr", format="docx"):
+                    ocr_text = pytesseract.image_to_string(
+                        Image.open(io.BytesIO(image_data)).convert("L")
+                    )
+                if ocr_text.strip():
+                    yield "\n" + ocr_text
+
+
+def iter_pdf(file_path, info):
+    """Texte page par page (PyMuPDF puis pdfplumber) et vignette de la première page."""
+    with fitz.open(file_path) as doc:
+        for page in doc:
+            yield page.get_text() + "\n"
+        info["num_pages"] = doc.page_count
+        # Générer vignette (PNG base64) de la première page si possible
+        try:
+            page0 = doc.load_page(0)
+            pix = page0.get_pixmap(matrix=fitz.Matrix(1.0, 1.0))
+            img_bytes = pix.tobytes("png")
+            info["thumbnail"] = f"data:image/png;base64,{base64.b64encode(img_bytes).decode('utf-8')}"
+        except Exception:
+            info["thumbnail"] = None
+    # Extraction supplémentaire avec pdfplumber (cache de chaque page libéré après lecture)
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages:
+            yield page.extract_text() or ""
+            page.close()
+
+
+READERS = {".txt": iter_txt, ".html": iter_html, ".htm": iter_html, ".docx": iter_docx, ".pdf": iter_pdf}
+
+
+def _collect(reader, file_path):
+    """Texte complet d'un lecteur ; en cas d'erreur, garde ce qui a déjà été lu."""
+    info = {"num_pages": 0, "thumbnail": None}
+    pieces = []
+    try:
+        for piece in reader(file_path, info):
+            pieces.append(piece)
+    except Exception:
+        pass
+    return "".join(pieces), info
+
+
 # ---------------------------
 # Lecture des fichiers simples
 # ---------------------------
 
 def read_txt(file_path):
     """Lit un fichier texte et retourne son contenu."""
-    try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            text = "\n".join(line.strip() for line in f)
-        return text, 1  # num_pages = 1 pour txt
-    except:
-        return "", 0
+    text, info = _collect(iter_txt, file_path)
+    return text, info["num_pages"]
 
 def read_html(file_path):
     """Lit un fichier HTML/HTM et retourne le texte nettoyé."""
-    try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            text = BeautifulSoup(f, 'html.parser').get_text(separator=' ', strip=True)
-        return text, 1
-    except:
-        return "", 0
+    text, info = _collect(iter_html, file_path)
+    return text, info["num_pages"]
 
 def read_docx_full(file_path):
     """Lit un fichier DOCX et effectue une OCR sur les images intégrées."""
-    text = docx2txt.process(file_path)
-    try:
-        with ZipFile(file_path) as docx_zip:
-            for item in docx_zip.namelist():
-                # OCR sur les images contenues dans le DOCX
-                if item.startswith("word/media/") and item.lower().endswith((".png", ".jpg", ".jpeg")):
-                    image_data = docx_zip.read(item)
-                    ocr_text = pytesseract.image_to_string(
-                        Image.open(io.BytesIO(image_data)).convert("L")
-                    )
-                    if ocr_text.strip():
-                        text += "\n" + ocr_text
-    except:
-        pass
+    text, _ = _collect(iter_docx, file_path)
     return text, 1
 
 def read_pdf_full(file_path):
     """Lit un fichier PDF et retourne tout le texte (via PyMuPDF et pdfplumber)."""
-    text = ""
-    try:
-        # Extraction avec PyMuPDF
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                text += page.get_text() + "\n"
-        # Extraction supplémentaire avec pdfplumber
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-    except:
-        pass
+    text, _ = _collect(iter_pdf, file_path)
     return text, 1
 
 # ---------------------------
@@ -127,92 +247,98 @@ def copy_to_corpus(file_path, corpus_dir):
 # Traitement d'un fichier individuel
 # ---------------------------
 
+class _RawTextWriter:
+    """
+    Écrit le texte au fil de l'eau sans les espaces de début et de fin (comme text.strip())
+    et compte les caractères. keep=True garde aussi les morceaux pour retourner le texte.
+    """
+
+    def __init__(self, f, keep=False):
+        self.f = f
+        self.chars = 0
+        self.pieces = [] if keep else None
+        self._started = False
+        self._pending = ""  # espaces en attente : écrits seulement si du texte suit
+
+    def write(self, piece):
+        if not self._started:
+            piece = piece.lstrip()
+            if not piece:
+                return
+            self._started = True
+        stripped = piece.rstrip()
+        if not stripped:
+            self._pending += piece
+            return
+        self._emit(self._pending + stripped)
+        self._pending = piece[len(stripped):]
+
+    def _emit(self, text):
+        self.f.write(text)
+        self.chars += len(text)
+        if self.pieces is not None:
+            self.pieces.append(text)
+
+
 def process_file(file_path, corpus_dir, output_dir):
     """
     Lit un fichier, extrait le texte, traite les images pour OCR si nécessaire,
     et sauvegarde le texte nettoyé dans output_dir.
     Retourne le nom du fichier et les métadonnées.
+    Le texte est écrit page par page : la mémoire reste bornée même pour de très gros fichiers.
+    """
+    name, meta, _ = _acquire(file_path, corpus_dir, output_dir, keep_text=False)
+    return name, meta
+
+
+def acquire_file(file_path, corpus_dir, output_dir):
     """
+    Comme process_file, mais retourne aussi le texte brut extrait
+    (nom, métadonnées, texte) pour que les étapes suivantes le traitent
+    en mémoire sans relire raw_texts.
+    """
+    return _acquire(file_path, corpus_dir, output_dir, keep_text=True)
+
+
+def _acquire(file_path, corpus_dir, output_dir, keep_text):
+    start = time.perf_counter()
     # Copier dans le corpus
     corpus_file = copy_to_corpus(file_path, corpus_dir)
-
     ext = corpus_file.suffix.lower()
-    text, num_pages = "", 0
-    thumbnail_data = None
+    info = {"num_pages": 0, "thumbnail": None}
 
-    # Lecture selon le type de fichier
-    if ext == ".txt":
-        try:
-            with open(corpus_file, 'r', encoding='utf-8', errors='ignore') as f:
-                text = "\n".join(line.strip() for line in f)
-                num_pages = 1
-        except:
-            pass
-    elif ext in [".html", ".htm"]:
-        try:
-            with open(corpus_file, 'r', encoding='utf-8', errors='ignore') as f:
-                text = BeautifulSoup(f, 'html.parser').get_text(separator=' ', strip=True)
-                num_pages = 1
-        except:
-            pass
-    elif ext == ".docx":
-        try:
-            text = docx2txt.process(corpus_file)
-            num_pages = 1
-            # OCR sur les images dans le DOCX
-            with ZipFile(corpus_file) as docx_zip:
-                for item in docx_zip.namelist():
-                    if item.startswith("word/media/") and item.lower().endswith((".png", ".jpg", ".jpeg")):
-                        image_data = docx_zip.read(item)
-                        ocr_text = pytesseract.image_to_string(
-                            Image.open(io.BytesIO(image_data)).convert("L")
-                        )
-                        if ocr_text.strip():
-                            text += "\n" + ocr_text
-        except:
-            pass
-    elif ext == ".pdf":
-        try:
-            doc = fitz.open(corpus_file)
-            for page in doc:
-                text += page.get_text() + "\n"
-            num_pages = doc.page_count
-            # Générer vignette (PNG base64) de la première page si possible
-            try:
-                page0 = doc.load_page(0)
-                pix = page0.get_pixmap(matrix=fitz.Matrix(1.0, 1.0))
-                img_bytes = pix.tobytes("png")
-                thumbnail_data = f"data:image/png;base64,{base64.b64encode(img_bytes).decode('utf-8')}"
-            except Exception:
-                thumbnail_data = None
-            # Extraction supplémentaire avec pdfplumber
-            with pdfplumber.open(corpus_file) as pdf:
-                for page in pdf.pages:
-                    text += page.extract_text() or ""
-        except:
-            pass
-
-    text = text.strip()
-    char_count_before = len(text)
-
-    # Sauvegarde du texte nettoyé avec le nom complet du fichier + .txt
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_file = output_dir / f"{corpus_file.name}.txt"
+    # Sauvegarde du texte brut sous le nom complet du fichier, compressé par blocs
+    # au fil de la lecture (fichier temporaire puis rename)
+    writer = None
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(text)
-    except:
-        pass
+        with open_writer(output_dir, corpus_file.name) as f:
+            writer = _RawTextWriter(f, keep=keep_text)
+            reader = READERS.get(ext)
+            if reader is not None:
+                try:
+                    # Lecture selon le type de fichier ; en cas d'erreur, garde ce qui a été lu
+                    for piece in reader(corpus_file, info):
+                        writer.write(piece)
+                except Exception:
+                    pass
+    except OSError as e:
+        print(f"⚠️ Écriture du texte brut impossible pour {corpus_file.name}: {e}")
+    # Durée par format (copie + lecture), OCR compris
+    record_stage("acquisition", time.perf_counter() - start, format=ext.lstrip(".") or "unknown")
+
+    text = None
+    if keep_text:
+        text = "".join(writer.pieces) if writer is not None else ""
 
-    # Retourne le nom du fichier complet avec extension et les métadonnées
+    # Retourne le nom du fichier complet avec extension, les métadonnées et le texte
     return corpus_file.name, {
         "type": ext.replace(".", ""),
-        "num_pages": num_pages,
-        "char_count_before": char_count_before,
+        "num_pages": info["num_pages"],
+        "char_count_before": writer.chars if writer is not None else 0,
         "path": str(corpus_file),
-        "thumbnail": thumbnail_data,
+        "thumbnail": info["thumbnail"],
         "size_bytes": corpus_file.stat().st_size
-    }
+    }, text
 
 # ---------------------------
 # Lecture complète du corpus
@@ -244,15 +370,21 @@ def read_corpus(base_path="data/import", corpus_dir="data/corpus", output_path="
                 extracted = extract_archive(fpath, base_path / f"extracted_{fpath.stem}")
                 all_files.extend([p for p in extracted if p.suffix.lower() in supported_ext])
 
+    def run(f):
+        try:
+            return process_file(f, corpus_dir, output_dir)
+        finally:
+            dequeue("acquisition")
+
     results = {}
     # Traitement parallèle des fichiers
+    enqueue("acquisition", len(all_files))
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for name, data in executor.map(lambda f: process_file(f, corpus_dir, output_dir), all_files):
+        for name, data in executor.map(run, all_files):
             results[name] = data
 
-    # Sauvegarde des métadonnées en JSON
-    with open("data/processed/metadata.json", "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=4)
+    # Sauvegarde des métadonnées (nouvel instantané complet)
+    replace_all(results)
 
     print(f"✅ Corpus traité avec {len(results)} fichiers")
     return results
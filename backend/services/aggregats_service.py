@@ -0,0 +1,277 @@
+# aggregats_service.py
+# Agrégats du corpus maintenus de façon incrémentale (ingestion / suppression)
+from pathlib import Path
+from collections import Counter
+import json
+import os
+import threading
+import numpy as np
+
+from services.vocabulaire_service import document_counts
+from services.metadata_service import load_metadata, metadata_version, transaction
+from services.verrou_service import tmp_path
+from services.metrics_service import cache_hit, cache_miss
+
+AGGREGATES_FILE = Path("data/processed/aggregates.json")
+TOTALS_FILE = Path("data/processed/term_totals.npy")
+METADATA_FILE = Path("data/processed/metadata.json")
+
+# Nombre de termes gardés triés en permanence (les endpoints en demandent 50)
+TOP_K = 200
+
+_lock = threading.Lock()
+_state = None
+_state_stamp = None
+
+
+# ---------------------------
+# Contributions d'un document
+# ---------------------------
+
+def document_contribution(name, entry):
+    """
+    Part d'un document dans les agrégats. À calculer AVANT de remplacer ou
+    supprimer ses comptages binaires.
+    """
+    ids, counts = document_counts(name, entry)
+    return {
+        "ids": np.asarray(ids, dtype=np.int64),
+        "counts": np.asarray(counts, dtype=np.int64),
+        "type": entry.get("type", "inconnu"),
+        "size": entry.get("size", entry.get("size_bytes", 0)) or 0,
+        "date": entry.get("date_import"),
+    }
+
+
+# ---------------------------
+# État persistant
+# ---------------------------
+
+def _metadata_stamp():
+    """Version du journal des métadonnées (pour détecter une écriture hors de ce module)."""
+    return metadata_version(METADATA_FILE)
+
+
+def _empty_state():
+    return {
+        "num_files": 0,
+        "total_words": 0,
+        "total_size": 0,
+        "types": Counter(),
+        "dates": Counter(),
+        "top": [],
+        "totals": np.zeros(0, dtype=np.int64),
+        "metadata_stamp": None,
+    }
+
+
+def _file_stamp():
+    # os.replace crée un nouvel inode : détecte aussi une écriture d'un autre worker
+    try:
+        st = AGGREGATES_FILE.stat()
+        return (st.st_ino, st.st_mtime_ns)
+    except OSError:
+        return None
+
+
+def _save(state):
+    """Écrit l'état sur disque (fichiers temporaires + rename) et le garde en cache. Appelé sous transaction."""
+    global _state, _state_stamp
+    AGGREGATES_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_path(TOTALS_FILE)
+    with open(tmp, "wb") as f:
+        np.save(f, state["totals"])
+    os.replace(tmp, TOTALS_FILE)
+
+    payload = {k: v for k, v in state.items() if k != "totals"}
+    payload["top"] = [int(i) for i in state["top"]]
+    tmp = tmp_path(AGGREGATES_FILE)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp, AGGREGATES_FILE)
+    _state, _state_stamp = state, _file_stamp()
+
+
+def _load():
+    """
+    Charge l'état (depuis le cache si le fichier n'a pas changé). Appelé sous _lock.
+    Retourne None si les agrégats n'existent pas encore ou sont illisibles.
+    """
+    global _state, _state_stamp
+    stamp = _file_stamp()
+    if stamp == _state_stamp:
+        return _state
+    state = None
+    if stamp is not None:
+        try:
+            with open(AGGREGATES_FILE, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            state = _empty_state()
+            state.update(payload)
+            state["types"] = Counter(payload.get("types", {}))
+            state["dates"] = Counter(payload.get("dates", {}))
+            state["totals"] = np.load(TOTALS_FILE)
+        except Exception as e:
+            print(f"⚠️ Agrégats illisibles, reconstruction: {e}")
+            state = None
+    _state, _state_stamp = state, stamp
+    return state
+
+
+# ---------------------------
+# Top-k
+# ---------------------------
+
+def _full_top(totals):
+    """Top-k complet : argpartition O(V) puis tri des k candidats."""
+    nonzero = int(np.count_nonzero(totals))
+    k = min(TOP_K, nonzero)
+    if k == 0:
+        return []
+    cand = np.argpartition(-totals, k - 1)[:k]
+    return _sort_ids(totals, cand)
+
+
+def _sort_ids(totals, ids):
+    ids = np.asarray(sorted(set(int(i) for i in ids)), dtype=np.int64)
+    ids = ids[totals[ids] > 0]
+    order = np.lexsort((ids, -totals[ids]))
+    return [int(i) for i in ids[order][:TOP_K]]
+
+
+# ---------------------------
+# Mise à jour
+# ---------------------------
+
+def _grow(state, size):
+    totals = state["totals"]
+    if len(totals) < size:
+        grown = np.zeros(max(size, 2 * len(totals)), dtype=np.int64)
+        grown[:len(totals)] = totals
+        state["totals"] = grown
+
+
+def apply_changes(removed=(), added=()):
+    """
+    Applique des contributions retirées (documents supprimés ou remplacés)
+    et ajoutées (nouvelles versions). Coût proportionnel aux documents modifiés,
+    sauf le recalcul du top-k après un retrait (O(V) vectorisé).
+    """
+    removed, added = list(removed), list(added)
+    if not removed and not added:
+        return
+    with transaction(), _lock:
+        state = _load()
+        if state is None:
+            # État absent ou illisible : le prochain accès le reconstruira
+            return
+        # Copie : l'état publié est lu sans verrou
+        state = dict(state, totals=state["totals"].copy(), top=list(state["top"]),
+                     types=Counter(state["types"]), dates=Counter(state["dates"]))
+        changed = []
+        for contrib, sign in [(c, -1) for c in removed] + [(c, 1) for c in added]:
+            ids, counts = contrib["ids"], contrib["counts"]
+            if len(ids):
+                _grow(state, int(ids.max()) + 1)
+                state["totals"][ids] += sign * counts
+                if sign > 0:
+                    changed.append(ids)
+            state["num_files"] += sign
+            state["total_words"] += sign * int(counts.sum())
+            state["total_size"] += sign * int(contrib["size"])
+            state["types"][contrib["type"]] += sign
+            if contrib["date"]:
+                state["dates"][contrib["date"]] += sign
+        state["types"] = +state["types"]
+        state["dates"] = +state["dates"]
+
+        if removed:
+            state["top"] = _full_top(state["totals"])
+        elif changed:
+            # Seuls les termes modifiés ont augmenté : ils sont les seuls à pouvoir entrer dans le top
+            state["top"] = _sort_ids(state["totals"], list(state["top"]) + np.concatenate(changed).tolist())
+
+        state["metadata_stamp"] = _metadata_stamp()
+        _save(state)
+
+
+def rebuild(metadata):
+    """Reconstruit tous les agrégats à partir des métadonnées (reprocess, migration)."""
+    state = _empty_state()
+    all_ids, all_counts = [], []
+    for name, entry in metadata.items():
+        contrib = document_contribution(name, entry)
+        all_ids.append(contrib["ids"])
+        all_counts.append(contrib["counts"])
+        state["num_files"] += 1
+        state["total_size"] += int(contrib["size"])
+        state["types"][contrib["type"]] += 1
+        if contrib["date"]:
+            state["dates"][contrib["date"]] += 1
+    if all_ids:
+        totals = np.bincount(np.concatenate(all_ids), weights=np.concatenate(all_counts))
+        state["totals"] = totals.astype(np.int64)
+    state["total_words"] = int(state["totals"].sum())
+    state["top"] = _full_top(state["totals"])
+    with transaction(), _lock:
+        state["metadata_stamp"] = _metadata_stamp()
+        _save(state)
+    return state
+
+
+def _fresh():
+    """État chargé s'il correspond à la version courante des métadonnées, sinon None."""
+    with _lock:
+        state = _load()
+    if state is not None and state.get("metadata_stamp") == _metadata_stamp():
+        return state
+    return None
+
+
+def _current(metadata_path=METADATA_FILE):
+    """État à jour ; reconstruit si absent ou si les métadonnées ont été écrites ailleurs."""
+    # Lecture sans le verrou inter-processus : l'état publié n'est jamais modifié en place
+    state = _fresh()
+    if state is None:
+        # La reconstruction se fait dans la transaction : une écriture en cours
+        # (métadonnées + apply_changes) ne peut pas être comptée deux fois ni perdue
+        with transaction():
+            # Vérifié à nouveau : l'écriture attendue a pu mettre les agrégats à jour
+            state = _fresh()
+            if state is None:
+                cache_miss("aggregates")
+                return rebuild(load_metadata(metadata_path))
+    cache_hit("aggregates")
+    return state
+
+
+# ---------------------------
+# Lecture (O(k))
+# ---------------------------
+
+def corpus_summary(k=50, num_types=5, metadata_path=METADATA_FILE):
+    """
+    Retourne les agrégats du corpus sans parcourir les documents :
+    top k mots, nombre de fichiers, total de mots, taille, dernier import, top types.
+    """
+    from services.vocabulaire_service import get_terms
+
+    state = _current(metadata_path)
+    top_ids = state["top"][:k]
+    totals = state["totals"]
+    top_words = [(word, int(totals[i])) for word, i in zip(get_terms(top_ids), top_ids)]
+    dates = [d for d, n in state["dates"].items() if n > 0]
+    return {
+        "top_words": top_words,
+        "num_files": state["num_files"],
+        "total_words": state["total_words"],
+        "total_size": state["total_size"],
+        "last_import_date": max(dates) if dates else None,
+        "top_types": state["types"].most_common(num_types),
+    }
+
+
+def live_term_ids():
+    """Ids des termes présents dans au moins un document du corpus."""
+    state = _current()
+    return np.flatnonzero(state["totals"] > 0)
@@ -0,0 +1,123 @@
+# cache_service.py
+# Cache des résultats de requêtes (LRU + TTL, borné en mémoire), clé = paramètres normalisés
+# + génération du corpus : une ingestion / suppression rend les anciennes entrées inutilisables.
+# Les requêtes les plus fréquentes sont recalculées en arrière-plan après chaque ingestion.
+from collections import Counter, OrderedDict
+import os
+import threading
+import time
+
+from services.generation_service import current_generation, on_new_generation
+from services.metrics_service import cache_hit, cache_miss, gauge_add
+
+# Bornes par défaut : mémoire (Mo), nombre d'entrées, durée de vie (s)
+MAX_MB = float(os.environ.get("QUERY_CACHE_MB", "64"))
+MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_ENTRIES", "1000"))
+TTL = float(os.environ.get("QUERY_CACHE_TTL", "600"))
+# Nombre de requêtes populaires recalculées après une ingestion (0 = désactivé)
+WARM_TOP = int(os.environ.get("QUERY_CACHE_WARM_TOP", "20"))
+# Requêtes distinctes suivies pour la popularité (les moins fréquentes sont oubliées au-delà)
+POPULARITY_MAX = 2000
+
+_caches = []
+_app = None
+
+
+class ResultCache:
+    """
+    Résultats sérialisés (bytes) par (génération, paramètres).
+    compute(params) -> bytes est appelé sur un miss (dans un contexte d'application Flask).
+    """
+
+    def __init__(self, name, compute, max_bytes=None, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.name = name
+        self.compute = compute
+        self.max_bytes = max_bytes if max_bytes is not None else int(MAX_MB * 1024 * 1024)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (génération, params) -> (bytes, créé à)
+        self._bytes = 0
+        self._popularity = Counter()   # params -> nombre de requêtes
+        _caches.append(self)
+
+    def get(self, params):
+        """Retourne (bytes, hit) pour la génération courante du corpus."""
+        key = (current_generation(), params)
+        now = time.monotonic()
+        with self._lock:
+            self._popularity[params] += 1
+            if len(self._popularity) > POPULARITY_MAX:
+                self._popularity = Counter(dict(self._popularity.most_common(POPULARITY_MAX // 2)))
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                cache_hit(self.name)
+                return entry[0], True
+        cache_miss(self.name)
+        body = self.compute(params)
+        self.put(key, body)
+        return body, False
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (body, time.monotonic())
+            self._bytes += len(body)
+            gauge_add("cache_entries", 1, cache=self.name)
+            gauge_add("cache_bytes", len(body), cache=self.name)
+            # Éviction LRU jusqu'à respecter les deux bornes
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+            gauge_add("cache_entries", -1, cache=self.name)
+            gauge_add("cache_bytes", -len(entry[0]), cache=self.name)
+
+    def drop_older(self, generation):
+        """Libère les entrées des générations précédentes (plus jamais servies)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] < generation]:
+                self._drop(key)
+
+    def popular(self, n):
+        with self._lock:
+            return [params for params, _ in self._popularity.most_common(n)]
+
+    def warm(self, n=WARM_TOP):
+        """Recalcule les n requêtes les plus fréquentes pour la génération courante."""
+        for params in self.popular(n):
+            key = (current_generation(), params)
+            with self._lock:
+                if key in self._entries:
+                    continue
+            try:
+                if _app is not None:
+                    with _app.app_context():
+                        body = self.compute(params)
+                else:
+                    body = self.compute(params)
+            except Exception as e:
+                print(f"⚠️ Erreur préchauffage cache '{self.name}' {params}: {e}")
+                continue
+            self.put(key, body)
+
+
+def init_app(app):
+    """Application utilisée pour le contexte des recalculs en arrière-plan."""
+    global _app
+    _app = app
+
+
+@on_new_generation
+def _invalidate_and_warm(generation):
+    """Après une ingestion / suppression : libère l'ancienne génération et recalcule les requêtes populaires."""
+    for cache in _caches:
+        cache.drop_older(generation)
+        if WARM_TOP > 0:
+            threading.Thread(target=cache.warm, name=f"cache-warm-{cache.name}-{generation}", daemon=True).start()
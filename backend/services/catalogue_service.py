@@ -0,0 +1,220 @@
+# catalogue_service.py
+# Liste des documents (/api/documents, /api/admin/files) paginée, triée et filtrée côté serveur.
+# Construit une fois par vue de l'index et version de l'inventaire du corpus (pas de stat() par
+# requête) : colonnes par document, ordres de tri pré-calculés, index des types, dates et tailles
+# triées (filtres par intervalle = recherche dichotomique) et index de trigrammes des noms de fichiers
+# (recherche par sous-chaîne sans parcourir les métadonnées).
+from pathlib import Path
+from datetime import datetime
+import os
+import threading
+import weakref
+import numpy as np
+
+from services.inventaire_service import list_files_versioned
+
+CORPUS_DIR = Path("data/corpus")
+SORTS = ("name", "date", "size", "type", "words", "pages")
+# Taille de page maximale (limit) acceptée
+MAX_LIMIT = 1000
+
+_lock = threading.Lock()
+_by_view = weakref.WeakKeyDictionary()  # IndexView -> Catalogue
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Catalogue:
+    """Colonnes et index des documents d'une vue de l'index."""
+
+    def __init__(self, view, files, inventory_version):
+        self.inventory_version = inventory_version
+        self.names = list(view.names)
+        self.entries = list(view.entries)
+        by_path = {os.path.abspath(f["path"]): f for f in files}
+        by_name, by_stem = {}, {}
+        for f in files:
+            by_name.setdefault(f["name"], f)
+            by_stem.setdefault(os.path.splitext(f["name"])[0], f)
+
+        # Fichier d'origine dans data/corpus : chemin des métadonnées, sinon nom exact, sinon nom sans extension
+        self.files, self.exact_files, self.paths = [], [], []
+        for name, entry in zip(self.names, self.entries):
+            path = entry.get("path")
+            found = by_path.get(os.path.abspath(path)) if path else None
+            exact = found or by_name.get(name)
+            self.exact_files.append(exact)
+            self.files.append(exact or by_stem.get(name))
+            # Chemin affiché : celui des métadonnées s'il existe encore, sinon celui de l'inventaire
+            self.paths.append(path if found or not self.files[-1] else self.files[-1]["path"])
+
+        n = len(self.names)
+        self.lower = [name.lower() for name in self.names]
+        self.types = np.array([(e.get("type") or "").lower() for e in self.entries], dtype=object)
+        self.dates = np.array([f["date"] if f else str(e.get("date_import") or "")
+                               for f, e in zip(self.files, self.entries)], dtype=object)
+        self.dated = np.array([d[:4].isdigit() for d in self.dates], dtype=bool)
+        self.sizes = np.array([f["size"] if f else (_int(e.get("size")) or -1)
+                               for f, e in zip(self.files, self.entries)], dtype=np.int64)
+        self.words = np.array([_int(e.get("total_tokens_after")) or 0 for e in self.entries], dtype=np.int64)
+        self.pages = np.array([_int(e.get("num_pages")) or 0 for e in self.entries], dtype=np.int64)
+
+        # Index : valeur de type -> positions ; dates et tailles triées (intervalles par searchsorted)
+        self.by_type = {}
+        for i, t in enumerate(self.types):
+            self.by_type.setdefault(t, []).append(i)
+        self.by_type = {t: np.array(p, dtype=np.int64) for t, p in self.by_type.items()}
+        self.date_order = np.argsort(self.dates.astype(str), kind="stable") if n else np.zeros(0, dtype=np.int64)
+        self.sorted_dates = self.dates.astype(str)[self.date_order] if n else np.zeros(0, dtype=str)
+        self.size_order = np.argsort(self.sizes, kind="stable")
+        self.sorted_sizes = self.sizes[self.size_order]
+
+        # Index des noms : trigramme -> positions
+        grams = {}
+        for i, name in enumerate(self.lower):
+            for gram in _trigrams(name):
+                grams.setdefault(gram, []).append(i)
+        self.grams = {g: np.array(p, dtype=np.int64) for g, p in grams.items()}
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    # ---------------------------
+    # Filtres
+    # ---------------------------
+
+    def _matching_names(self, q):
+        """Positions des noms contenant q (insensible à la casse)."""
+        q = q.lower()
+        if len(q) < 3:
+            return np.array([i for i, name in enumerate(self.lower) if q in name], dtype=np.int64)
+        postings = sorted((self.grams.get(g, np.zeros(0, dtype=np.int64)) for g in _trigrams(q)), key=len)
+        candidates = postings[0]
+        for other in postings[1:]:
+            candidates = np.intersect1d(candidates, other, assume_unique=True)
+        # Les trigrammes ne garantissent pas l'ordre : vérification sur les seuls candidats
+        return np.array([i for i in candidates.tolist() if q in self.lower[i]], dtype=np.int64)
+
+    @staticmethod
+    def _range(order, sorted_values, low, high):
+        lo = np.searchsorted(sorted_values, low, side="left") if low is not None else 0
+        hi = np.searchsorted(sorted_values, high, side="right") if high is not None else len(order)
+        return order[lo:hi]
+
+    def filter(self, q=None, types=None, date_from=None, date_to=None, size_min=None, size_max=None, text_view=None):
+        """
+        Masque des documents retenus (ET entre les filtres, OU entre les types demandés).
+        text_view : vue de l'index dont est issu le catalogue ; q cherche alors aussi dans le texte des documents.
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        def keep(positions):
+            selected = np.zeros(len(self), dtype=bool)
+            selected[positions] = True
+            mask[:] &= selected
+
+        if q:
+            matches = self._matching_names(q)
+            if text_view is not None:
+                matches = np.union1d(matches, np.asarray(text_view.containing(q.lower(), blob="lower"), dtype=np.int64))
+            keep(matches)
+        if types:
+            keep(np.concatenate([self.by_type.get(t.lower(), np.zeros(0, dtype=np.int64)) for t in types]))
+        if date_from or date_to:
+            keep(self._range(self.date_order, self.sorted_dates, date_from, date_to))
+            # Dates inconnues exclues dès qu'un intervalle de dates est demandé
+            mask &= self.dated
+        if size_min is not None or size_max is not None:
+            keep(self._range(self.size_order, self.sorted_sizes, size_min if size_min is not None else 0, size_max))
+        return mask
+
+    # ---------------------------
+    # Tri et pagination
+    # ---------------------------
+
+    def order(self, sort):
+        """Positions triées par la colonne (égalités départagées par le nom), calculées au premier usage."""
+        cached = self._orders.get(sort)
+        if cached is None:
+            by_name = np.array(self.lower, dtype=object)
+            column = {"name": by_name, "date": self.dates, "size": self.sizes, "type": self.types,
+                      "words": self.words, "pages": self.pages}[sort]
+            cached = self._orders[sort] = np.lexsort((by_name.astype(str), column.astype(str)
+                                                      if column.dtype == object else column))
+        return cached
+
+    def page(self, mask, sort="name", descending=False, offset=0, limit=None):
+        """(positions de la page, nombre total de documents retenus)."""
+        order = self.order(sort)
+        if descending:
+            order = order[::-1]
+        selected = order[mask[order]]
+        end = None if limit is None else offset + limit
+        return selected[offset:end].tolist(), len(selected)
+
+
+def catalogue_for(view, corpus_dir=CORPUS_DIR):
+    """Catalogue de la vue, reconstruit si l'inventaire du corpus a changé (fichier ajouté, réécrit, supprimé)."""
+    files, version = list_files_versioned(corpus_dir)
+    catalogue = _by_view.get(view)
+    if catalogue is None or catalogue.inventory_version != version:
+        with _lock:
+            catalogue = _by_view.get(view)
+            if catalogue is None or catalogue.inventory_version != version:
+                catalogue = _by_view[view] = Catalogue(view, files, version)
+    return catalogue
+
+
+def parse_params(args, default_sort="name"):
+    """
+    Paramètres de liste communs : q, type / types, date_from, date_to, size_min, size_max,
+    sort, order (asc / desc), limit, offset. ValueError si l'un d'eux est invalide.
+    """
+    def integer(key, minimum=0):
+        value = (args.get(key) or "").strip()
+        if not value:
+            return None
+        if not value.lstrip("-").isdigit() or int(value) < minimum:
+            raise ValueError(f"Paramètre '{key}' invalide")
+        return int(value)
+
+    def date(key):
+        # Date invalide ignorée (comme auparavant)
+        value = (args.get(key) or "").strip()
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d") if value else None
+        except ValueError:
+            return None
+
+    types = ",".join(args.getlist("type") + args.getlist("types"))
+    sort = (args.get("sort") or default_sort).strip().lower()
+    order = (args.get("order") or "asc").strip().lower()
+    if sort not in SORTS:
+        raise ValueError(f"Tri inconnu '{sort}' (attendu: {', '.join(SORTS)})")
+    if order not in ("asc", "desc"):
+        raise ValueError("Paramètre 'order' attendu: asc ou desc")
+    limit = integer("limit", minimum=1)
+    return {
+        "filters": {
+            "q": (args.get("q") or "").strip(),
+            "types": [t.strip().lower() for t in types.split(",") if t.strip()],
+            "date_from": date("date_from"),
+            "date_to": date("date_to"),
+            "size_min": integer("size_min"),
+            "size_max": integer("size_max"),
+        },
+        "sort": sort,
+        "descending": order == "desc",
+        "offset": integer("offset") or 0,
+        "limit": min(limit, MAX_LIMIT) if limit is not None else None,
+    }
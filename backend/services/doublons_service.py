@@ -0,0 +1,435 @@
+# doublons_service.py
+# Quasi-doublons (PDF réexporté, copie .htm / .html, version légèrement modifiée) :
+# signature MinHash des 3-grammes de mots du texte nettoyé, calculée à l'extraction
+# (entrée "minhash" des métadonnées), et index LSH par bandes : un nouveau document
+# n'est comparé qu'aux documents qui partagent au moins une bande de sa signature
+# (recherche dans des tables de hachage, pas de parcours du corpus).
+#
+# Les paires au-dessus de DUPLICATE_THRESHOLD (Jaccard estimé) forment des groupes
+# (composantes connexes). L'index suit le journal des métadonnées (changed_since).
+from pathlib import Path
+import base64
+import json
+import os
+import threading
+import zlib
+import numpy as np
+
+from services.metadata_service import changed_since, load_metadata, metadata_version
+from services.verrou_service import file_lock, tmp_path
+from services.metrics_service import cache_hit, cache_miss
+from services.textes_service import document_text
+
+DUPLICATES_LOG = Path("data/processed/duplicates.log")
+_LEGACY_FILE = Path("data/processed/duplicates.json")
+
+# Jaccard (estimé) à partir duquel deux documents sont des quasi-doublons
+THRESHOLD = float(os.environ.get("DUPLICATE_THRESHOLD", "0.8"))
+NUM_PERM = 128
+SHINGLE = 3
+# Shingles hachés par bloc (mémoire : CHUNK x NUM_PERM entiers)
+CHUNK = 4096
+# Lignes de journal tolérées au-delà de 2 par document indexé avant compactage
+COMPACT_RECORDS = 1000
+
+# Permutations h -> (a * h + b) mod p, a et b tirés uniformément dans [1, p) (p premier de Mersenne)
+_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(1)  # graine fixe : signatures comparables entre processus et entre runs
+_A = _rng.randint(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+# a = a_hi * 2^32 + a_lo : les produits partiels tiennent dans 64 bits (hachages < 2^32)
+_A_HI = _A >> np.uint64(32)
+_A_LO = _A & np.uint64(0xFFFFFFFF)
+# Version de la famille de hachage, enregistrée avec les signatures : une signature d'une autre
+# version n'est pas comparable et est recalculée
+HASH_VERSION = 2
+
+_lock = threading.Lock()
+_state = None
+
+
+# ---------------------------
+# Signatures
+# ---------------------------
+
+def _bands(threshold, num_perm=NUM_PERM):
+    """
+    (bandes, lignes par bande) : deux documents de Jaccard s partagent une bande avec une
+    probabilité 1 - (1 - s^r)^b, qui bascule autour de (1/b)^(1/r) : on le place juste
+    sous le seuil pour manquer peu de vrais doublons.
+    """
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - (threshold - 0.1)))
+
+
+BANDS, ROWS = _bands(THRESHOLD)
+
+
+def _mod_prime(x):
+    """x mod 2^61 - 1 pour x < 2^64 (uint64) : 2^61 = 1 modulo p, pas de division."""
+    x = (x & np.uint64(_PRIME)) + (x >> np.uint64(61))
+    return np.where(x >= np.uint64(_PRIME), x - np.uint64(_PRIME), x)
+
+
+def _permute(hashes):
+    """
+    (a * h + b) mod p pour chaque hachage h < 2^32 et chaque permutation (len(hashes) x NUM_PERM),
+    en uint64 sans dépassement : a * h = a_hi * h * 2^32 + a_lo * h, et t * 2^32 mod p se
+    réduit en (t >> 29) + ((t mod 2^29) << 32).
+    """
+    h = hashes[:, None]
+    high = h * _A_HI  # < 2^61
+    shifted = (high >> np.uint64(29)) + ((high & np.uint64((1 << 29) - 1)) << np.uint64(32))
+    return _mod_prime(_mod_prime(h * _A_LO) + shifted + _B)
+
+
+def shingles(tokens):
+    """3-grammes de mots (le texte entier s'il a moins de 3 mots)."""
+    tokens = list(tokens)
+    width = min(SHINGLE, len(tokens))
+    return {" ".join(tokens[i:i + width]) for i in range(len(tokens) - width + 1)} if tokens else set()
+
+
+def minhash(items):
+    """Signature MinHash (NUM_PERM x uint32) d'un ensemble de chaînes ; None s'il est vide."""
+    if not items:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in items), dtype=np.uint64, count=len(items))
+    sig = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), CHUNK):
+        sig = np.minimum(sig, _permute(hashes[start:start + CHUNK]).min(axis=0))
+    return (sig & np.uint64(0xFFFFFFFF)).astype("<u4")
+
+
+def signature(tokens):
+    """Signature MinHash des 3-grammes de mots ; None si le texte est vide."""
+    return minhash(shingles(tokens))
+
+
+def encode(sig):
+    return f"{HASH_VERSION}:" + base64.b64encode(sig.tobytes()).decode("ascii") if sig is not None else None
+
+
+def decode(value):
+    """Signature enregistrée ; None si absente ou calculée avec une autre famille de hachage."""
+    version, _, data = (value or "").rpartition(":")
+    if version != str(HASH_VERSION):
+        return None
+    return np.frombuffer(base64.b64decode(data), dtype="<u4")
+
+
+def text_signature(clean_text):
+    """Signature du texte nettoyé (même découpage à l'extraction et pour les anciennes entrées)."""
+    return encode(signature(clean_text.lower().split()))
+
+
+def _entry_signature(name, entry):
+    sig = decode(entry.get("minhash"))
+    if sig is None:
+        # Anciennes entrées (sans signature ou d'une autre version) : calculée depuis le texte nettoyé
+        context = document_text(name, entry)
+        sig = signature(context.lower().split()) if context else None
+    return sig
+
+
+def jaccard(sig_a, sig_b):
+    """Jaccard estimé : proportion de minima égaux."""
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+
+# ---------------------------
+# Index LSH
+# ---------------------------
+
+class LSHIndex:
+    """Tables (une par bande) : clé de bande -> noms des documents."""
+
+    def __init__(self):
+        self.tables = [{} for _ in range(BANDS)]
+        self.signatures = {}
+
+    def _keys(self, sig):
+        return [sig[b * ROWS:(b + 1) * ROWS].tobytes() for b in range(BANDS)]
+
+    def candidates(self, sig):
+        found = set()
+        for table, key in zip(self.tables, self._keys(sig)):
+            found.update(table.get(key, ()))
+        return found
+
+    def add(self, name, sig):
+        self.signatures[name] = sig
+        for table, key in zip(self.tables, self._keys(sig)):
+            table.setdefault(key, set()).add(name)
+
+    def remove(self, name):
+        sig = self.signatures.pop(name, None)
+        if sig is None:
+            return
+        for table, key in zip(self.tables, self._keys(sig)):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(name)
+                if not bucket:
+                    del table[key]
+
+    def query(self, sig, exclude=None):
+        """{nom: Jaccard estimé} des documents indexés au-dessus du seuil."""
+        matches = {}
+        for other in self.candidates(sig):
+            if other != exclude:
+                score = jaccard(sig, self.signatures[other])
+                if score >= THRESHOLD:
+                    matches[other] = round(score, 4)
+        return matches
+
+
+# ---------------------------
+# État persistant : journal en ajout seul (l'index LSH est reconstruit en mémoire au chargement)
+#
+#   {"op": "base", "v": 12, "threshold": 0.8, "hash": 2}      en-tête (version des métadonnées)
+#   {"op": "add", "name": "doc.pdf", "sig": "...", "pairs": {"copie.pdf": 0.93}}
+#   {"op": "remove", "name": "doc.pdf"}
+#   {"op": "version", "v": 14}                                 fin d'un lot de modifications
+#
+# Un import n'ajoute que ses lignes ; les autres processus ne relisent que la fin du journal.
+# Le journal est réécrit (compactage) quand il dépasse COMPACT_RECORDS + 2 x documents indexés.
+# ---------------------------
+
+def _apply_log(state, data):
+    """Applique les lignes complètes d'un morceau de journal ; retourne le nombre d'octets consommés."""
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # Ligne tronquée par un arrêt brutal : ignorée
+            continue
+        op = record.get("op")
+        if op == "base":
+            if record.get("threshold") != THRESHOLD:
+                raise ValueError("seuil modifié")
+            if record.get("hash") != HASH_VERSION:
+                raise ValueError("famille de hachage modifiée")
+            state["version"] = record["v"]
+        elif op == "add":
+            _insert(state, record["name"], decode(record["sig"]), record.get("pairs", {}))
+        elif op == "remove":
+            _remove(state, record["name"])
+        elif op == "version":
+            state["version"] = record["v"]
+        state["records"] += 1
+    return end
+
+
+def _empty_state(version=None):
+    return {"version": version, "lsh": LSHIndex(), "pairs": {}, "ino": None, "offset": 0, "records": 0}
+
+
+def _copy(state):
+    """Copie modifiable d'un état publié : paires copiées (l'état publié est lu sans verrou), groupes à recalculer."""
+    state = dict(state, pairs=dict(state["pairs"]))
+    state.pop("representatives", None)
+    return state
+
+
+def _load():
+    """État à jour du journal, en ne lisant que les lignes ajoutées depuis le dernier chargement. Sous _lock."""
+    global _state
+    try:
+        st = DUPLICATES_LOG.stat()
+    except OSError:
+        _state = None
+        return None
+    state = _state
+    if state is not None and state["ino"] == st.st_ino and st.st_size == state["offset"]:
+        return state
+    if state is None or state["ino"] != st.st_ino or st.st_size < state["offset"]:
+        # Journal remplacé (compactage, reconstruction) : tout relire
+        state = _empty_state()
+        state["ino"] = st.st_ino
+    else:
+        state = _copy(state)
+    try:
+        with open(DUPLICATES_LOG, "rb") as f:
+            f.seek(state["offset"])
+            state["offset"] += _apply_log(state, f.read(st.st_size - state["offset"]))
+        if state["version"] is None:
+            raise ValueError("en-tête manquant")
+    except Exception as e:
+        print(f"⚠️ Index des doublons illisible, reconstruction: {e}")
+        state = None
+    _state = state
+    return state
+
+
+def _append(state, records):
+    """Ajoute les enregistrements d'un lot au journal (une écriture). Sous file_lock("duplicates")."""
+    payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+    with open(DUPLICATES_LOG, "ab") as f:
+        if f.tell() > state["offset"]:
+            # Fin de journal incomplète (arrêt brutal) : repartir sur une nouvelle ligne
+            payload = b"\n" + payload
+        f.write(payload)
+        state["offset"] = f.tell()
+    state["records"] += len(records)
+
+
+def _write_log(state):
+    """Réécrit le journal depuis l'état (reconstruction, compactage). Sous file_lock("duplicates")."""
+    DUPLICATES_LOG.parent.mkdir(parents=True, exist_ok=True)
+    records = [{"op": "base", "v": state["version"], "threshold": THRESHOLD, "hash": HASH_VERSION}]
+    records += [{"op": "add", "name": name, "sig": encode(sig), "pairs": state["pairs"].get(name, {})}
+                for name, sig in state["lsh"].signatures.items()]
+    tmp = tmp_path(DUPLICATES_LOG)
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, DUPLICATES_LOG)
+    st = DUPLICATES_LOG.stat()
+    state.update(ino=st.st_ino, offset=st.st_size, records=len(records))
+    # Ancien format (fichier JSON réécrit à chaque modification)
+    if _LEGACY_FILE.exists():
+        _LEGACY_FILE.unlink()
+
+
+def _insert(state, name, sig, matches):
+    # Copie des listes de paires modifiées : un état publié reste inchangé
+    pairs = state["pairs"]
+    for other, score in matches.items():
+        pairs[name] = {**pairs.get(name, {}), other: score}
+        pairs[other] = {**pairs.get(other, {}), name: score}
+    state["lsh"].add(name, sig)
+
+
+def _add(state, name, entry):
+    """Indexe un document ; retourne la ligne du journal correspondante (None s'il n'a pas de texte)."""
+    sig = _entry_signature(name, entry)
+    if sig is None:
+        return None
+    matches = state["lsh"].query(sig, exclude=name)
+    _insert(state, name, sig, matches)
+    return {"op": "add", "name": name, "sig": encode(sig), "pairs": matches}
+
+
+def _remove(state, name):
+    state["lsh"].remove(name)
+    pairs = state["pairs"]
+    for other in pairs.pop(name, {}):
+        linked = {n: score for n, score in pairs.get(other, {}).items() if n != name}
+        if linked:
+            pairs[other] = linked
+        else:
+            pairs.pop(other, None)
+
+
+def rebuild(metadata, version=0):
+    state = _empty_state(version)
+    for name, entry in metadata.items():
+        _add(state, name, entry)
+    return state
+
+
+def update_duplicates():
+    """Intègre les modifications des métadonnées depuis la dernière version (coût par document modifié)."""
+    global _state
+    # Chemin rapide sans verrou : les paires d'un état publié ne sont jamais modifiées
+    state = _state
+    if state is not None and state["version"] == metadata_version():
+        cache_hit("duplicates")
+        return state
+    with file_lock("duplicates"), _lock:
+        state = _load()
+        version, changes = changed_since(state["version"] if state else 0,
+                                         known=list(state["lsh"].signatures) if state else ())
+        if state is not None and changes is not None and version == state["version"]:
+            cache_hit("duplicates")
+            return state
+        cache_miss("duplicates")
+        if state is None or changes is None:
+            state = rebuild(load_metadata(), version)
+            _write_log(state)
+            _state = state
+            return state
+        # Les tables LSH sont modifiées en place : forcer la relecture du journal si l'écriture échoue
+        _state = None
+        state = _copy(state)
+        records = []
+        for name in changes:
+            if name in state["lsh"].signatures:
+                _remove(state, name)
+                records.append({"op": "remove", "name": name})
+        for name, entry in changes.items():
+            if entry is not None:
+                record = _add(state, name, entry)
+                if record is not None:
+                    records.append(record)
+        state["version"] = version
+        records.append({"op": "version", "v": version})
+        if state["records"] + len(records) > COMPACT_RECORDS + 2 * len(state["lsh"].signatures):
+            _write_log(state)
+        else:
+            _append(state, records)
+        _state = state
+        return state
+
+
+# ---------------------------
+# Lecture
+# ---------------------------
+
+def _listing(pairs):
+    return [{"name": other, "jaccard": score} for other, score in sorted(pairs.items(), key=lambda p: (-p[1], p[0]))]
+
+
+def duplicates_of(name):
+    """Quasi-doublons d'un document : [{"name", "jaccard"}], les plus proches d'abord."""
+    return _listing(update_duplicates()["pairs"].get(name, {}))
+
+
+def duplicates_of_many(names):
+    """{nom: quasi-doublons} de plusieurs documents (lot importé) : une seule mise à jour de l'index."""
+    pairs = update_duplicates()["pairs"]
+    return {name: _listing(pairs.get(name, {})) for name in names}
+
+
+def _clusters(pairs):
+    seen, clusters = set(), []
+    for start in sorted(pairs):
+        if start in seen:
+            continue
+        stack, cluster = [start], []
+        seen.add(start)
+        while stack:
+            name = stack.pop()
+            cluster.append(name)
+            for other in pairs.get(name, {}):
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        clusters.append(sorted(cluster))
+    return clusters
+
+
+def duplicate_clusters():
+    """Groupes de quasi-doublons (composantes connexes, au moins 2 documents), triés par nom."""
+    return _clusters(update_duplicates()["pairs"])
+
+
+def representatives():
+    """
+    {nom: représentant de son groupe} (le nom le plus court, comme la déduplication de la recherche).
+    Calculé une fois par état de l'index (appelé à chaque recherche).
+    """
+    state = update_duplicates()
+    mapping = state.get("representatives")
+    if mapping is None:
+        mapping = {}
+        for cluster in _clusters(state["pairs"]):
+            keep = min(cluster, key=lambda n: (len(n), n))
+            for name in cluster:
+                mapping[name] = keep
+        state["representatives"] = mapping
+    return mapping
@@ -4,12 +4,16 @@ from pathlib import Path
 import json
 from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
-import re
+from services.nettoyage_service import tokenize
+from services.vocabulaire_service import detach_terms
+from services.textes_service import RAW_DIR, read_text, list_texts, detach_text
+from services.metadata_service import load_metadata, metadata_exists, upsert
+from services.metrics_service import timed, enqueue, dequeue
 
 # Simple regex-based tokenizer (no NLTK dependency for Python 3.14 compatibility)
 def simple_tokenize(text):
-    """Simple word tokenizer using regex"""
-    return re.findall(r'\b\w+\b', text.lower())
+    """Simple word tokenizer using a precompiled regex"""
+    return tokenize(text)
 
 
 # -------------------------------
@@ -20,22 +24,20 @@ def extract_from_text(file_path):
     Lit un fichier texte, tokenize et calcule les statistiques complètes
     
     Arguments :
-    - file_path : chemin vers le fichier texte
+    - file_path : dossier du stockage des textes nettoyés / nom du document
     
     Retour :
     - tuple (nom fichier sans extension, dictionnaire avec les statistiques)
     """
     try:
-        # Lecture du texte original et nettoyé
-        with open(file_path, "r", encoding="utf-8") as f:
-            clean_text = f.read()
-
-        # On retrouve le chemin du texte original
-        original_file = Path("data/processed/raw_texts") / file_path.name
-        if original_file.exists():
-            with open(original_file, "r", encoding="utf-8") as f:
-                original_text = f.read()
-        else:
+        # Lecture du texte nettoyé (stockage compressé : dossier + nom du document)
+        clean_text = read_text(file_path.parent, file_path.name)
+        if clean_text is None:
+            raise FileNotFoundError(file_path)
+
+        # On retrouve le texte original (même nom dans raw_texts)
+        original_text = read_text(RAW_DIR, file_path.name)
+        if original_text is None:
             original_text = clean_text  # Fallback si on ne trouve pas l'original
 
         # Stats sur le texte original
@@ -97,11 +99,10 @@ def extract_corpus(
     output_path = Path(output_file)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Lecture du JSON existant (si présent) pour fusionner avec les nouvelles données
-    if output_path.exists():
+    # Lecture des métadonnées existantes (si présentes) pour fusionner avec les nouvelles données
+    if metadata_exists(output_path):
         try:
-            with open(output_path, "r", encoding="utf-8") as f:
-                existing_data = json.load(f)
+            existing_data = load_metadata(output_path)
             print(f"🔄 Fichier JSON existant chargé ({len(existing_data)} fichiers).")
         except Exception:
             print("⚠️ Erreur lecture JSON existant — réinitialisation.")
@@ -109,25 +110,35 @@ def extract_corpus(
     else:
         existing_data = {}
 
-    # Liste des fichiers texte à traiter
-    files = [f for f in input_path.glob("*.txt")]
+    # Liste des textes à traiter (stockage compressé)
+    files = [input_path / name for name in list_texts(input_path)]
     results = {}
 
+    def run(f):
+        try:
+            with timed("extraction"):
+                return extract_from_text(f)
+        finally:
+            dequeue("extraction")
+
     # Traitement parallèle avec ThreadPoolExecutor pour accélérer l'extraction
+    enqueue("extraction", len(files))
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for name, data in executor.map(lambda f: extract_from_text(f), files):
+        for name, data in executor.map(run, files):
             results[name] = data
 
-    # Fusion : mise à jour ou ajout des résultats dans le JSON existant
+    # Fusion : mise à jour ou ajout des résultats dans les métadonnées existantes
+    # (mots et bigrammes vont dans le stockage binaire du vocabulaire)
     for name, data in results.items():
         if name in existing_data:
             existing_data[name].update(data)
         else:
             existing_data[name] = data
+        detach_terms(name, existing_data[name])
+        detach_text(name, existing_data[name], input_path)
 
-    # Sauvegarde des résultats fusionnés
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(existing_data, f, ensure_ascii=False, indent=4)
+    # Sauvegarde : seules les entrées modifiées sont ajoutées au journal
+    upsert({name: existing_data[name] for name in results}, output_path)
 
     print(f"\n✅ Résultats fusionnés sauvegardés dans {output_file}\n")
 
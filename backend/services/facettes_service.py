@@ -0,0 +1,116 @@
+# facettes_service.py
+# Facettes de recherche (type, mois d'import, langue, nombre de pages) calculées depuis l'index :
+# un bitset (np.packbits, 1 bit par document) par valeur de facette, construit une fois par vue.
+# Les filtres types= / dates= deviennent un ET / OU de bitsets appliqué avant la recherche textuelle,
+# et les comptages des résultats sont des popcounts de (bitset de la valeur & bitset des résultats).
+import threading
+import weakref
+import numpy as np
+
+FACETS = ("type", "date", "lang", "pages")
+# Tranches du nombre de pages : (borne haute incluse, libellé)
+PAGE_RANGES = ((1, "1"), (10, "2-10"), (50, "11-50"), (None, "51+"))
+UNKNOWN = "inconnu"
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_lock = threading.Lock()
+_by_view = weakref.WeakKeyDictionary()  # IndexView -> Facets
+
+
+def doc_type(name, entry):
+    """Extension du fichier (comme le type affiché dans les résultats), sinon le type des métadonnées."""
+    parts = name.rsplit(".", 1)
+    return (parts[1] if len(parts) > 1 else entry.get("type") or "unknown").lower()
+
+
+def _pages_bucket(num_pages):
+    try:
+        pages = int(num_pages)
+    except (TypeError, ValueError):
+        return UNKNOWN
+    if pages < 1:
+        return UNKNOWN
+    for upper, label in PAGE_RANGES:
+        if upper is None or pages <= upper:
+            return label
+
+
+def _values(name, entry):
+    date = str(entry.get("date_import") or "")
+    return {
+        "type": doc_type(name, entry),
+        "date": date[:7] if date[:4].isdigit() else UNKNOWN,  # AAAA-MM
+        "lang": entry.get("lang") or UNKNOWN,
+        "pages": _pages_bucket(entry.get("num_pages")),
+    }
+
+
+# ---------------------------
+# Bitsets
+# ---------------------------
+
+def to_bits(positions, size):
+    mask = np.zeros(size, dtype=bool)
+    mask[np.asarray(positions, dtype=np.int64)] = True
+    return np.packbits(mask)
+
+
+def to_positions(bits, size):
+    return np.flatnonzero(np.unpackbits(bits, count=size))
+
+
+def popcount(bits):
+    return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+
+class Facets:
+    """Bitsets par valeur de facette pour une vue de l'index."""
+
+    def __init__(self, view):
+        self.size = len(view)
+        positions = {facet: {} for facet in FACETS}
+        for i, (name, entry) in enumerate(zip(view.names, view.entries)):
+            for facet, value in _values(name, entry).items():
+                positions[facet].setdefault(value, []).append(i)
+        self.bits = {facet: {value: to_bits(pos, self.size) for value, pos in values.items()}
+                     for facet, values in positions.items()}
+
+    def allowed(self, **selected):
+        """
+        Bitset des documents acceptés par les filtres (OU dans une facette, ET entre facettes),
+        ex. allowed(type=["pdf", "docx"], date=["2025-01"]). None si aucun filtre.
+        """
+        result = None
+        for facet, values in selected.items():
+            if not values:
+                continue
+            bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+            for value in values:
+                value_bits = self.bits[facet].get(value)
+                if value_bits is not None:
+                    bits |= value_bits
+            result = bits if result is None else result & bits
+        return result
+
+    def counts(self, result_bits):
+        """{facette: {valeur: nb de résultats}} (valeurs sans résultat omises)."""
+        counts = {}
+        for facet, values in self.bits.items():
+            counts[facet] = {}
+            for value, bits in values.items():
+                n = popcount(bits & result_bits)
+                if n:
+                    counts[facet][value] = n
+        return counts
+
+
+def facets_for(view):
+    """Facettes de la vue (construites au premier appel, libérées avec la vue)."""
+    facets = _by_view.get(view)
+    if facets is None:
+        with _lock:
+            facets = _by_view.get(view)
+            if facets is None:
+                facets = _by_view[view] = Facets(view)
+    return facets
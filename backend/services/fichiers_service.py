@@ -0,0 +1,228 @@
+# fichiers_service.py
+# Envoi des fichiers du corpus : requêtes partielles (Range / 206) pour que les lecteurs
+# PDF puissent se déplacer sans tout télécharger, GET conditionnels (ETag / Last-Modified
+# -> 304) et délégation optionnelle de l'envoi au serveur web frontal :
+#   FILE_OFFLOAD=x-sendfile   -> en-tête X-Sendfile (Apache mod_xsendfile, lighttpd)
+#   FILE_OFFLOAD=x-accel      -> en-tête X-Accel-Redirect (nginx), avec X_ACCEL_PREFIX
+#                                = location interne qui pointe sur data/corpus
+from pathlib import Path
+from urllib.parse import quote, urlencode
+import codecs
+import html
+import os
+
+from flask import Response, current_app, request, stream_with_context
+from werkzeug.utils import send_file
+
+CORPUS_DIR = Path("data/corpus")
+FILE_OFFLOAD = os.environ.get("FILE_OFFLOAD", "").lower()  # "", "x-sendfile", "x-accel"
+X_ACCEL_PREFIX = os.environ.get("X_ACCEL_PREFIX", "/protected-corpus/")
+# Taille d'une page du visualiseur TXT (octets, coupée en fin de ligne, ou dans une ligne plus longue)
+TXT_PAGE_BYTES = int(os.environ.get("TXT_PAGE_BYTES", str(256 * 1024)))
+READ_CHUNK = 64 * 1024
+
+
+def send_corpus_file(path, mimetype=None, as_attachment=False, download_name=None):
+    """
+    Envoie un fichier avec Range / 206, ETag, Last-Modified et If-None-Match / If-Modified-Since.
+    Le corps est lu par morceaux (wsgi.file_wrapper : sendfile() sous gunicorn), jamais chargé
+    en entier. Le chemin est résolu depuis le dossier courant (comme le reste des services),
+    pas depuis le dossier de l'application comme send_from_directory.
+    """
+    path = Path(path).resolve()
+    offload = FILE_OFFLOAD in ("x-sendfile", "x-accel")
+    accel_path = None
+    if FILE_OFFLOAD == "x-accel":
+        try:
+            accel_path = X_ACCEL_PREFIX.rstrip("/") + "/" + quote(path.relative_to(CORPUS_DIR.resolve()).as_posix())
+        except ValueError:
+            offload = False  # hors du corpus : pas de location interne nginx correspondante
+
+    response = send_file(
+        str(path), request.environ,
+        mimetype=mimetype, as_attachment=as_attachment, download_name=download_name,
+        # Délégué : le serveur web gère lui-même les Range ; ici seulement ETag / 304
+        conditional=not offload, use_x_sendfile=offload,
+        response_class=current_app.response_class,
+    )
+    if offload:
+        if accel_path:
+            del response.headers["X-Sendfile"]
+            response.headers["X-Accel-Redirect"] = accel_path
+        response = response.make_conditional(request.environ)
+    return response
+
+
+# ---------------------------
+# Visualiseur TXT paginé
+# ---------------------------
+
+def _boundary(f, offset, size, page_bytes):
+    """
+    Début de la page qui commence vers offset : début de la ligne suivante si un saut de ligne
+    tombe dans [offset - 1, offset - 1 + page_bytes), sinon coupure à offset (ligne plus longue
+    qu'une page) reculée au début d'un caractère UTF-8.
+    """
+    if offset <= 0:
+        return 0
+    if offset >= size:
+        return size
+    f.seek(offset - 1)
+    remaining = page_bytes
+    while remaining > 0:
+        chunk = f.read(min(READ_CHUNK, remaining))
+        if not chunk:
+            break
+        pos = chunk.find(b"\n")
+        if pos != -1:
+            return f.tell() - len(chunk) + pos + 1
+        remaining -= len(chunk)
+    # Pas de fin de ligne : pas d'octet de continuation (10xxxxxx) en début de page
+    f.seek(max(offset - 3, 0))
+    head = f.read(offset - f.tell() + 1)
+    cut = offset
+    while cut > offset - 3 and cut > 0 and 0x80 <= head[cut - offset - 1] < 0xC0:
+        cut -= 1
+    return cut
+
+
+def _page_bounds(path, page, page_bytes):
+    """
+    Octets [début, fin) de la page et nombre de pages : une page commence au début d'une ligne,
+    la ligne qui chevauche une limite reste sur la page précédente, sauf si elle est plus longue
+    qu'une page (coupée alors à page_bytes). Une page fait donc au plus ~2 x page_bytes.
+    """
+    size = path.stat().st_size
+    num_pages = max(1, -(-size // page_bytes))
+    with open(path, "rb") as f:
+        # Dernière page vide si l'avant-dernière va jusqu'à la fin du fichier
+        if num_pages > 1 and _boundary(f, (num_pages - 1) * page_bytes, size, page_bytes) >= size:
+            num_pages -= 1
+        page = min(max(page, 0), num_pages - 1)
+        start = _boundary(f, page * page_bytes, size, page_bytes)
+        end = size if page == num_pages - 1 else _boundary(f, (page + 1) * page_bytes, size, page_bytes)
+        return page, start, max(start, end), num_pages
+
+
+def _detect_encoding(path):
+    """UTF-8 si le début du fichier se décode, sinon latin-1 (comme l'ancien visualiseur)."""
+    with open(path, "rb") as f:
+        head = f.read(READ_CHUNK)
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Un caractère multi-octets coupé en fin de lecture n'est pas une erreur
+        if e.start < len(head) - 3 or len(head) < READ_CHUNK:
+            return "latin-1"
+    return "utf-8"
+
+
+def txt_viewer_response(path, title, page=0, page_bytes=TXT_PAGE_BYTES):
+    """Page HTML d'un fichier texte, envoyée par morceaux : seule la page demandée est lue."""
+    path = Path(path)
+    page, start, end, num_pages = _page_bounds(path, page, page_bytes)
+    encoding = _detect_encoding(path)
+    title = html.escape(title)
+
+    def link(p, label):
+        args = request.args.to_dict()
+        args["page"] = p
+        return f'<a href="?{html.escape(urlencode(args))}">{label}</a>'
+
+    nav = []
+    if page > 0:
+        nav.append(link(page - 1, "← Précédente"))
+    nav.append(f"Page {page + 1} / {num_pages}")
+    if page < num_pages - 1:
+        nav.append(link(page + 1, "Suivante →"))
+    nav_html = f'<div class="nav">{" · ".join(nav)}</div>' if num_pages > 1 else ""
+
+    def generate():
+        yield _TXT_HEAD.format(title=title, nav=nav_html)
+        # Décodage incrémental : un caractère UTF-8 peut être coupé entre deux morceaux
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(READ_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield html.escape(decoder.decode(chunk))
+            yield html.escape(decoder.decode(b"", final=True))
+        yield _TXT_TAIL.format(nav=nav_html)
+
+    return Response(stream_with_context(generate()), content_type="text/html; charset=utf-8")
+
+
+_TXT_HEAD = """
+<!DOCTYPE html>
+<html lang="fr">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <style>
+        body {{
+            font-family: 'Courier New', monospace;
+            max-width: 1000px;
+            margin: 20px auto;
+            padding: 30px;
+            background: #f5f5f5;
+        }}
+        .container {{
+            background: white;
+            padding: 40px;
+            border-radius: 8px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }}
+        h1 {{
+            color: #333;
+            border-bottom: 2px solid #667eea;
+            padding-bottom: 10px;
+            font-size: 20px;
+        }}
+        pre {{
+            white-space: pre-wrap;
+            word-wrap: break-word;
+            line-height: 1.6;
+            color: #333;
+            font-size: 14px;
+        }}
+        .nav {{
+            margin: 15px 0;
+            font-size: 14px;
+            color: #555;
+        }}
+        .nav a {{
+            color: #667eea;
+        }}
+        .close-btn {{
+            background: #667eea;
+            color: white;
+            padding: 10px 20px;
+            border: none;
+            border-radius: 5px;
+            cursor: pointer;
+            font-size: 14px;
+            margin-top: 20px;
+        }}
+        .close-btn:hover {{
+            background: #5568d3;
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>📄 {title}</h1>
+        {nav}
+        <pre>"""
+
+_TXT_TAIL = """</pre>
+        {nav}
+        <button class="close-btn" onclick="window.close()">Fermer</button>
+    </div>
+</body>
+</html>
+"""
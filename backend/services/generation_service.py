@@ -0,0 +1,63 @@
+# generation_service.py
+# Numéro de génération du corpus : incrémenté à chaque ingestion / suppression
+from pathlib import Path
+import os
+import threading
+
+from services.verrou_service import file_lock, tmp_path
+
+GENERATION_FILE = Path("data/processed/generation")
+
+_lock = threading.Lock()
+_cached = (None, 0)  # (signature du fichier, génération)
+_listeners = []
+
+
+def _stamp():
+    """Signature du fichier : chaque publication le remplace (nouvel inode)."""
+    try:
+        st = GENERATION_FILE.stat()
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def current_generation():
+    """Génération courante du corpus (0 si aucune ingestion n'a encore eu lieu)."""
+    global _cached
+    stamp = _stamp()
+    if stamp is not None and stamp == _cached[0]:
+        return _cached[1]
+    try:
+        generation = int(GENERATION_FILE.read_text(encoding="utf-8").strip() or 0)
+    except (OSError, ValueError):
+        generation = 0
+    _cached = (stamp, generation)
+    return generation
+
+
+def bump_generation():
+    """
+    Publie une nouvelle génération (après une modification du corpus)
+    et prévient les abonnés de ce processus. Retourne la nouvelle génération.
+    """
+    global _cached
+    with _lock, file_lock("generation"):
+        generation = current_generation() + 1
+        GENERATION_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = tmp_path(GENERATION_FILE)
+        tmp.write_text(str(generation), encoding="utf-8")
+        os.replace(tmp, GENERATION_FILE)
+        _cached = (_stamp(), generation)
+    for listener in list(_listeners):
+        try:
+            listener(generation)
+        except Exception as e:
+            print(f"⚠️ Erreur abonné génération {generation}: {e}")
+    return generation
+
+
+def on_new_generation(listener):
+    """Abonne une fonction appelée avec le numéro de chaque nouvelle génération."""
+    _listeners.append(listener)
+    return listener
@@ -0,0 +1,129 @@
+# inventaire_service.py
+# Inventaire du corpus : parcours os.scandir (un seul stat par fichier), mis en cache
+# par dossier et rafraîchi en ne re-parcourant que les dossiers modifiés.
+# Un fichier réécrit sur place ne change pas la signature de son dossier : invalidate() le
+# signale dans ce processus, et une nouvelle génération du corpus (publiée par n'importe quel
+# worker après une ingestion) fait relire tout l'inventaire dans les autres.
+from pathlib import Path
+from datetime import datetime
+import os
+import threading
+
+from services.generation_service import current_generation
+from services.metrics_service import cache_hit, cache_miss
+
+_lock = threading.Lock()
+# base -> {dossier: {"stamp": ..., "files": [...], "subdirs": [...]}}
+_trees = {}
+_scans = 0  # incrémenté à chaque dossier relu : les caches dérivés de l'inventaire le comparent
+_generations = {}  # base -> génération du corpus lors du dernier parcours
+
+
+def _dir_stamp(path):
+    """Signature d'un dossier : change quand une entrée y est ajoutée, supprimée ou renommée."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino)
+
+
+def _scan_dir(path, stamp):
+    """Liste un dossier avec os.scandir ; chaque fichier n'est stat() qu'une fois."""
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        ext = os.path.splitext(entry.name)[1].lower().replace(".", "") or "inconnu"
+                        files.append({
+                            "name": entry.name,
+                            "path": entry.path,
+                            "type": ext,
+                            "size": st.st_size,
+                            "mtime": st.st_mtime,
+                            "date": datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d"),
+                        })
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return {"stamp": stamp, "files": files, "subdirs": subdirs}
+
+
+def _refresh(base):
+    """Met à jour l'arbre en cache : seuls les dossiers dont la signature a changé sont relus."""
+    global _scans
+    generation = current_generation()
+    # Nouvelle génération (éventuellement publiée par un autre worker) : tout relire
+    old = _trees.get(base, {}) if _generations.get(base) == generation else {}
+    _generations[base] = generation
+    tree = {}
+    stack = [base]
+    while stack:
+        path = stack.pop()
+        stamp = _dir_stamp(path)
+        if stamp is None:
+            continue
+        node = old.get(path)
+        if node is None or node["stamp"] != stamp:
+            cache_miss("inventory")
+            node = _scan_dir(path, stamp)
+            _scans += 1
+        else:
+            cache_hit("inventory")
+        tree[path] = node
+        stack.extend(node["subdirs"])
+    if tree.keys() != old.keys():
+        _scans += 1  # dossier supprimé
+    _trees[base] = tree
+    return tree
+
+
+def _base_key(base_dir):
+    return os.path.normpath(str(base_dir))
+
+
+def list_files_versioned(base_dir="data/corpus"):
+    """(fichiers du corpus, version de l'inventaire) : la version change dès qu'un dossier est relu."""
+    base = _base_key(base_dir)
+    with _lock:
+        tree = _refresh(base)
+        return [f for node in tree.values() for f in node["files"]], _scans
+
+
+def list_files(base_dir="data/corpus"):
+    """Retourne les fichiers du corpus (dictionnaires name, path, type, size, mtime, date)."""
+    base = _base_key(base_dir)
+    with _lock:
+        tree = _refresh(base)
+        return [f for node in tree.values() for f in node["files"]]
+
+
+def find_file(name, base_dir="data/corpus", by_stem=False):
+    """Cherche un fichier du corpus par nom exact (ou par nom sans extension). Retourne un Path ou None."""
+    key = "stem" if by_stem else "name"
+    for f in list_files(base_dir):
+        candidate = os.path.splitext(f["name"])[0] if key == "stem" else f["name"]
+        if candidate == name:
+            return Path(f["path"])
+    return None
+
+
+def invalidate(path=None, base_dir="data/corpus"):
+    """
+    Force la relecture d'un dossier (ou de tout l'inventaire si path=None).
+    Utile quand un fichier est réécrit sur place : le dossier ne change pas de signature.
+    """
+    base = _base_key(base_dir)
+    with _lock:
+        if path is None:
+            _trees.pop(base, None)
+            return
+        tree = _trees.get(base)
+        if tree:
+            tree.pop(os.path.normpath(str(path)), None)
@@ -0,0 +1,420 @@
+# metadata_service.py
+# Métadonnées : instantané metadata.json + journal de modifications en ajout seul
+#
+# Chaque modification ajoute une ligne JSON au journal (metadata.log) :
+#   {"op": "upsert", "v": 12, "name": "doc.pdf", "data": {...}}
+#   {"op": "delete", "v": 13, "name": "doc.pdf"}
+# La lecture applique le journal sur l'instantané. Un compactage en arrière-plan
+# réécrit l'instantané (fichier temporaire + rename) puis vide le journal, qui ne
+# garde qu'une ligne {"op": "base", "v": N} pour conserver le numéro de version.
+#
+# Les écritures se font sous un verrou de fichier (plusieurs workers possibles).
+# Chaque entrée a une version (celle de sa dernière modification) : update()
+# calcule hors verrou puis n'enregistre que si les entrées lues n'ont pas changé.
+from pathlib import Path
+from contextlib import contextmanager
+import json
+import os
+import threading
+
+from services.verrou_service import file_lock, tmp_path
+from services.metrics_service import timed
+
+METADATA_FILE = Path("data/processed/metadata.json")
+
+# Compactage dès que le journal dépasse ce nombre d'enregistrements ou cette taille
+COMPACT_RECORDS = int(os.environ.get("METADATA_COMPACT_RECORDS", "500"))
+COMPACT_BYTES = int(os.environ.get("METADATA_COMPACT_BYTES", str(64 * 1024 * 1024)))
+# Nombre de tentatives d'update() en cas de modification concurrente
+UPDATE_RETRIES = 10
+
+_lock = threading.RLock()
+_caches = {}  # chemin de l'instantané -> état chargé
+_compacting = set()
+
+
+class VersionConflict(Exception):
+    """Des entrées ont été modifiées par un autre worker depuis leur lecture."""
+
+    def __init__(self, names):
+        super().__init__(f"Modification concurrente : {', '.join(sorted(names))}")
+        self.names = names
+
+
+def _log_path(path):
+    return Path(path).with_suffix(".log")
+
+
+def _versions_path(path):
+    # Versions des entrées de l'instantané : {"v": version de base, "versions": {nom: version}}
+    return Path(path).with_suffix(".versions.json")
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+# ---------------------------
+# Lecture
+# ---------------------------
+
+def _apply_records(cache, data):
+    """Applique les lignes complètes d'un morceau de journal ; retourne le nombre d'octets consommés."""
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # Ligne tronquée par un arrêt brutal : ignorée
+            continue
+        op = record.get("op")
+        version = record.get("v", 0)
+        if op == "upsert":
+            cache["data"][record["name"]] = record["data"]
+            cache["versions"][record["name"]] = version
+            cache["records"] += 1
+        elif op == "delete":
+            cache["data"].pop(record["name"], None)
+            cache["versions"][record["name"]] = version
+            cache["records"] += 1
+        elif op == "base":
+            cache["base"] = version
+        cache["version"] = max(cache["version"], version)
+    return end
+
+
+def _state(path=METADATA_FILE):
+    """Retourne l'état à jour (instantané + journal), en ne lisant que la fin du journal ajoutée. Sous _lock."""
+    key = str(path)
+    log_path = _log_path(path)
+    cache = _caches.get(key)
+    snapshot_stamp = _stamp(path)
+    log_stamp = _stamp(log_path)
+    log_ino = log_stamp[0] if log_stamp else None
+
+    # Instantané ou journal remplacés (compactage) : tout relire
+    if cache is None or cache["snapshot_stamp"] != snapshot_stamp or cache["log_ino"] not in (None, log_ino):
+        cache = {"snapshot_stamp": snapshot_stamp, "log_ino": log_ino, "data": {}, "versions": {},
+                 "snapshot_versions": None, "base": 0, "offset": 0, "records": 0, "version": 0}
+        if snapshot_stamp is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    cache["data"] = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Erreur lecture {path}: {e}")
+            try:
+                with open(_versions_path(path), "r", encoding="utf-8") as f:
+                    cache["snapshot_versions"] = json.load(f)
+            except (OSError, ValueError):
+                pass
+        _caches[key] = cache
+
+    cache["log_ino"] = log_ino
+    log_size = log_stamp[2] if log_stamp else 0
+    if log_size < cache["offset"]:
+        # Journal tronqué : relire depuis l'instantané
+        _caches.pop(key, None)
+        return _state(path)
+    if log_size > cache["offset"]:
+        with open(log_path, "rb") as f:
+            f.seek(cache["offset"])
+            cache["offset"] += _apply_records(cache, f.read(log_size - cache["offset"]))
+    return cache
+
+
+def load_metadata(path=METADATA_FILE):
+    """Retourne toutes les métadonnées {nom: entrée} (copies modifiables des entrées)."""
+    with _lock:
+        data = _state(path)["data"]
+        return {name: dict(entry) for name, entry in data.items()}
+
+
+def get_entry(name, path=METADATA_FILE):
+    """Retourne l'entrée d'un document (copie) ou None."""
+    with _lock:
+        entry = _state(path)["data"].get(name)
+        return dict(entry) if entry is not None else None
+
+
+def metadata_exists(path=METADATA_FILE):
+    return Path(path).exists() or _log_path(path).exists()
+
+
+def metadata_version(path=METADATA_FILE):
+    """Numéro de version croissant, incrémenté à chaque modification."""
+    with _lock:
+        return _state(path)["version"]
+
+
+def _snapshot_versions(cache):
+    """Versions exactes des entrées de l'instantané, si le fichier correspond bien à cet instantané."""
+    sidecar = cache["snapshot_versions"]
+    if sidecar and sidecar.get("v") == cache["base"]:
+        return sidecar.get("versions", {})
+    return None
+
+
+def _entry_version(cache, name):
+    version = cache["versions"].get(name)
+    if version is not None:
+        return version
+    # Entrées venant de l'instantané : version exacte, sinon version de base (elle augmente à chaque compactage)
+    exact = _snapshot_versions(cache)
+    return exact.get(name, cache["base"]) if exact is not None else cache["base"]
+
+
+def changed_since(version, known=(), path=METADATA_FILE):
+    """
+    Entrées modifiées après version : (version courante, {nom: entrée ou None si supprimée}).
+    known : noms que l'appelant croit présents (permet de repérer les suppressions
+    intégrées dans l'instantané par un compactage). Retourne (version, None) si
+    les versions de l'instantané sont inconnues : tout est à relire.
+    """
+    with _lock:
+        cache = _state(path)
+        names = {name for name, v in cache["versions"].items() if v > version}
+        if cache["base"] > version:
+            exact = _snapshot_versions(cache)
+            if exact is None:
+                return cache["version"], None
+            names.update(name for name, v in exact.items() if v > version)
+            names.update(name for name in known if name not in cache["data"])
+        changes = {}
+        for name in names:
+            entry = cache["data"].get(name)
+            changes[name] = dict(entry) if entry is not None else None
+        return cache["version"], changes
+
+
+def read_versioned(names=None, path=METADATA_FILE):
+    """
+    Retourne ({nom: entrée ou None}, {nom: version}) pour les noms demandés
+    (tout le corpus si names=None), à utiliser avec update().
+    """
+    with _lock:
+        cache = _state(path)
+        if names is None:
+            names = list(cache["data"])
+        entries = {}
+        for name in names:
+            entry = cache["data"].get(name)
+            entries[name] = dict(entry) if entry is not None else None
+        return entries, {name: _entry_version(cache, name) for name in names}
+
+
+# ---------------------------
+# Écriture
+# ---------------------------
+
+@contextmanager
+def transaction():
+    """
+    Regroupe une écriture des métadonnées et les mises à jour qui en dépendent
+    (agrégats) : aucune autre écriture ni reconstruction ne s'intercale, y compris
+    depuis un autre processus (verrou de fichier).
+    Le verrou de fichier est pris d'abord : l'attente d'un autre worker (jusqu'à LOCK_TIMEOUT)
+    ne bloque pas les lectures de ce processus, qui ne prennent que _lock.
+    """
+    with file_lock("metadata"), _lock:
+        yield
+
+
+def _append(path, records):
+    """Ajoute des enregistrements au journal (une écriture + fsync). Sous transaction."""
+    cache = _state(path)
+    log_path = _log_path(path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    lines = []
+    for record in records:
+        cache["version"] += 1
+        record["v"] = cache["version"]
+        lines.append(json.dumps(record, ensure_ascii=False))
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+    with timed("metadata_write"), open(log_path, "ab") as f:
+        if f.tell() > cache["offset"]:
+            # Fin de journal incomplète (arrêt brutal) : repartir sur une nouvelle ligne
+            payload = b"\n" + payload
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    # Les enregistrements sont appliqués en mémoire en relisant ce qui vient d'être écrit
+    _state(path)
+    _maybe_compact(path)
+
+
+def _check_versions(cache, expected):
+    """Lève VersionConflict si une entrée a changé depuis sa lecture. Sous transaction."""
+    stale = [name for name, version in expected.items() if _entry_version(cache, name) != version]
+    if stale:
+        raise VersionConflict(stale)
+
+
+def upsert(entries, path=METADATA_FILE, expected=None):
+    """
+    Ajoute ou remplace des entrées {nom: entrée}. Coût proportionnel aux entrées modifiées.
+    expected : {nom: version} lue avec read_versioned() ; VersionConflict si elle a changé.
+    """
+    if not entries:
+        return
+    with transaction():
+        if expected:
+            _check_versions(_state(path), expected)
+        _append(path, [{"op": "upsert", "name": name, "data": entry} for name, entry in entries.items()])
+
+
+def remove(names, path=METADATA_FILE, expected=None):
+    """Supprime des entrées ; retourne la liste des noms effectivement présents."""
+    with transaction():
+        cache = _state(path)
+        if expected:
+            _check_versions(cache, expected)
+        present = [name for name in names if name in cache["data"]]
+        if present:
+            _append(path, [{"op": "delete", "name": name} for name in present])
+        return present
+
+
+def update(compute, names=None, on_commit=None, retries=UPDATE_RETRIES, path=METADATA_FILE):
+    """
+    Mise à jour optimiste : compute(entrées) est appelé hors verrou et retourne
+    {nom: nouvelle entrée, ou None pour supprimer}. Les changements ne sont
+    enregistrés que si ces entrées n'ont pas été modifiées entre-temps ; sinon
+    on relit et on recommence. on_commit(avant, changements) est appelé dans la
+    transaction (mise à jour des agrégats). Retourne les changements enregistrés.
+    """
+    for _ in range(retries):
+        entries, versions = read_versioned(names, path)
+        changes = compute(entries)
+        if not changes:
+            return {}
+        try:
+            with transaction():
+                cache = _state(path)
+                _check_versions(cache, {name: versions[name] for name in changes if name in versions})
+                before = {name: entries.get(name) for name in changes}
+                upserts = {name: entry for name, entry in changes.items() if entry is not None}
+                deletes = [name for name, entry in changes.items() if entry is None]
+                if upserts:
+                    upsert(upserts, path)
+                if deletes:
+                    remove(deletes, path)
+                if on_commit:
+                    on_commit(before, changes)
+            return changes
+        except VersionConflict as e:
+            print(f"🔁 Métadonnées modifiées par un autre worker, nouvel essai ({e})")
+    raise VersionConflict(list(changes))
+
+
+def replace_all(metadata, path=METADATA_FILE):
+    """Remplace toutes les métadonnées (retraitement complet du corpus)."""
+    with transaction():
+        version = _state(path)["version"] + 1
+        versions = {name: version for name in metadata}
+        with timed("metadata_write"):
+            _install_snapshot(path, _dump_snapshot(path, metadata, versions, version), version)
+
+
+# ---------------------------
+# Compactage
+# ---------------------------
+
+def _dump_snapshot(path, metadata, versions, version):
+    """Sérialise un instantané et ses versions dans des fichiers temporaires ; retourne leurs chemins."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_path(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp_versions = tmp_path(_versions_path(path))
+    with open(tmp_versions, "w", encoding="utf-8") as f:
+        json.dump({"v": version, "versions": versions}, f, ensure_ascii=False)
+    return tmp, tmp_versions
+
+
+def _install_snapshot(path, tmps, version, tail=b""):
+    """
+    Remplace l'instantané et ses versions (rename atomique) puis le journal par une
+    ligne de base suivie de tail (enregistrements postérieurs à l'instantané). Sous transaction.
+    """
+    tmp, tmp_versions = tmps
+    os.replace(tmp_versions, _versions_path(path))
+    os.replace(tmp, path)
+    log_path = _log_path(path)
+    tmp = tmp_path(log_path)
+    with open(tmp, "wb") as f:
+        f.write((json.dumps({"op": "base", "v": version}) + "\n").encode("utf-8") + tail)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, log_path)
+    _caches.pop(str(path), None)
+
+
+def _records_after(path, version):
+    """Lignes du journal dont la version est postérieure à version. Sous transaction."""
+    log_path = _log_path(path)
+    if not log_path.exists():
+        return b""
+    with open(log_path, "rb") as f:
+        data = f.read()
+    kept = []
+    for line in data[:data.rfind(b"\n") + 1].split(b"\n"):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("op") != "base" and record.get("v", 0) > version:
+            kept.append(line + b"\n")
+    return b"".join(kept)
+
+
+def compact(path=METADATA_FILE):
+    """
+    Intègre le journal dans un nouvel instantané. L'instantané est sérialisé
+    hors verrou ; les modifications arrivées entre-temps restent dans le journal.
+    """
+    with _lock:
+        cache = _state(path)
+        if cache["records"] == 0:
+            return False
+        data = dict(cache["data"])
+        versions = {name: _entry_version(cache, name) for name in data}
+        version = cache["version"]
+        snapshot_stamp = cache["snapshot_stamp"]
+    tmps = _dump_snapshot(path, data, versions, version)
+    with transaction():
+        if _stamp(path) != snapshot_stamp:
+            # Instantané remplacé entre-temps (replace_all) : ce compactage est obsolète
+            for tmp in tmps:
+                os.remove(tmp)
+            return False
+        _install_snapshot(path, tmps, version, _records_after(path, version))
+    return True
+
+
+def _maybe_compact(path):
+    """Lance un compactage en arrière-plan si le journal est devenu trop long. Sous _lock."""
+    cache = _caches.get(str(path))
+    if cache is None or str(path) in _compacting:
+        return
+    if cache["records"] < COMPACT_RECORDS and cache["offset"] < COMPACT_BYTES:
+        return
+    _compacting.add(str(path))
+
+    def run():
+        try:
+            compact(path)
+        except Exception as e:
+            print(f"⚠️ Erreur compactage métadonnées: {e}")
+        finally:
+            _compacting.discard(str(path))
+
+    threading.Thread(target=run, name="metadata-compaction", daemon=True).start()
@@ -0,0 +1,300 @@
+# metrics_service.py
+# Métriques au format texte Prometheus (/api/metrics) et en-tête Server-Timing
+#
+# - pipeline_stage_duration_seconds : durée des étapes (acquisition par format, OCR, spaCy,
+#   extraction, écriture des métadonnées)
+# - http_request_duration_seconds / http_response_size_bytes : par endpoint
+# - cache_requests_total : hits / misses des caches (index, statistiques, agrégats, inventaire,
+#   résultats de recherche) ; cache_entries / cache_bytes pour les caches de résultats
+# - queue_depth : fichiers en attente de traitement
+#
+# Chaque processus (worker gunicorn) garde ses métriques en mémoire et les publie
+# régulièrement dans data/processed/metrics/<pid>.json ; /api/metrics additionne
+# les processus vivants (fichiers récents).
+from pathlib import Path
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+from services.verrou_service import tmp_path
+
+METRICS_DIR = Path("data/processed/metrics")
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+# Un processus qui n'a rien publié depuis ce délai est considéré comme arrêté
+STALE_AFTER = 3 * FLUSH_INTERVAL
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+HELP = {
+    "pipeline_stage_duration_seconds": ("histogram", "Durée des étapes du pipeline d'ingestion"),
+    "http_request_duration_seconds": ("histogram", "Latence des requêtes HTTP par endpoint"),
+    "http_response_size_bytes": ("histogram", "Taille des réponses HTTP par endpoint"),
+    "http_requests_in_flight": ("gauge", "Requêtes HTTP en cours de traitement"),
+    "cache_requests_total": ("counter", "Accès aux caches (result=hit|miss)"),
+    "cache_entries": ("gauge", "Entrées présentes dans les caches de résultats"),
+    "cache_bytes": ("gauge", "Mémoire occupée par les caches de résultats (octets)"),
+    "queue_depth": ("gauge", "Éléments en attente de traitement par file"),
+}
+
+_lock = threading.Lock()
+_counters = {}    # (nom, labels) -> valeur
+_gauges = {}      # (nom, labels) -> valeur
+_histograms = {}  # (nom, labels) -> {"buckets": bornes, "counts": [...], "sum": s, "count": n}
+_pid = None       # processus propriétaire de l'état (remis à zéro après un fork)
+_local = threading.local()  # durées de la requête en cours (Server-Timing)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _ensure_process():
+    """Après un fork (gunicorn preload), repartir d'un état vide et relancer la publication."""
+    global _pid
+    if _pid == os.getpid():
+        return
+    with _lock:
+        if _pid == os.getpid():
+            return
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+        _pid = os.getpid()
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+# ---------------------------
+# Enregistrement
+# ---------------------------
+
+def inc(name, value=1, **labels):
+    _ensure_process()
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge_add(name, delta, **labels):
+    _ensure_process()
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+
+
+def observe(name, value, buckets=DURATION_BUCKETS, **labels):
+    _ensure_process()
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": list(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(hist["buckets"]):
+            if value <= bound:
+                hist["counts"][i] += 1
+                break
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+def record_stage(stage, seconds, **labels):
+    """Durée d'une étape du pipeline ; ajoutée aussi au Server-Timing de la requête en cours."""
+    observe("pipeline_stage_duration_seconds", seconds, stage=stage, **labels)
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        total, count = timings.get(stage, (0.0, 0))
+        timings[stage] = (total + seconds, count + 1)
+
+
+@contextmanager
+def timed(stage, **labels):
+    """Mesure la durée du bloc comme étape du pipeline (voir record_stage)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, **labels)
+
+
+def cache_hit(cache):
+    inc("cache_requests_total", cache=cache, result="hit")
+
+
+def cache_miss(cache):
+    inc("cache_requests_total", cache=cache, result="miss")
+
+
+def enqueue(queue, size=1):
+    """Éléments ajoutés à une file de traitement (profondeur exposée en gauge)."""
+    gauge_add("queue_depth", size, queue=queue)
+
+
+def dequeue(queue, size=1):
+    gauge_add("queue_depth", -size, queue=queue)
+
+
+# ---------------------------
+# Requêtes HTTP (Flask)
+# ---------------------------
+
+def init_app(app):
+    """Latence et taille des réponses par endpoint + en-tête Server-Timing."""
+    from flask import request
+
+    @app.before_request
+    def _start_request():
+        _local.timings = {}
+        _local.start = time.perf_counter()
+        gauge_add("http_requests_in_flight", 1)
+
+    @app.after_request
+    def _end_request(response):
+        start = getattr(_local, "start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.url_rule.rule if request.url_rule else "not_found"
+        labels = {"endpoint": endpoint, "method": request.method}
+        observe("http_request_duration_seconds", elapsed, status=response.status_code, **labels)
+        if response.content_length is not None:
+            observe("http_response_size_bytes", response.content_length, buckets=SIZE_BUCKETS, **labels)
+
+        parts = [f"{stage};dur={total * 1000:.1f}" + (f';desc="x{count}"' if count > 1 else "")
+                 for stage, (total, count) in (_local.timings or {}).items()]
+        parts.append(f"app;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+    @app.teardown_request
+    def _teardown_request(exc):
+        if getattr(_local, "start", None) is not None:
+            gauge_add("http_requests_in_flight", -1)
+        _local.timings = None
+        _local.start = None
+
+
+# ---------------------------
+# Publication entre processus
+# ---------------------------
+
+def _snapshot():
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "counters": [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+            "gauges": [[name, dict(labels), value] for (name, labels), value in _gauges.items()],
+            "histograms": [[name, dict(labels), dict(hist, counts=list(hist["counts"]))]
+                           for (name, labels), hist in _histograms.items()],
+        }
+
+
+def flush():
+    """Publie l'état de ce processus (fichier temporaire + rename)."""
+    path = METRICS_DIR / f"{os.getpid()}.json"
+    try:
+        METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = tmp_path(path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ Erreur publication des métriques: {e}")
+
+
+def _flush_loop():
+    pid = os.getpid()
+    while _pid == pid:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+def _collect():
+    """Additionne l'état de tous les processus vivants (celui-ci compris, à jour)."""
+    own = _snapshot()
+    states = [own]
+    now = time.time()
+    for path in METRICS_DIR.glob("*.json") if METRICS_DIR.exists() else []:
+        if path.stem == str(own["pid"]):
+            continue
+        try:
+            if now - path.stat().st_mtime > STALE_AFTER:
+                path.unlink()
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                states.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+
+    counters, gauges, histograms = {}, {}, {}
+    for state in states:
+        for name, labels, value in state["counters"]:
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in state["gauges"]:
+            key = _key(name, labels)
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, hist in state["histograms"]:
+            key = _key(name, labels)
+            merged = histograms.get(key)
+            if merged is None or merged["buckets"] != hist["buckets"]:
+                histograms[key] = dict(hist, counts=list(hist["counts"]))
+                continue
+            merged["counts"] = [a + b for a, b in zip(merged["counts"], hist["counts"])]
+            merged["sum"] += hist["sum"]
+            merged["count"] += hist["count"]
+    return counters, gauges, histograms, len(states)
+
+
+# ---------------------------
+# Format texte Prometheus
+# ---------------------------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Toutes les métriques (tous processus) au format d'exposition texte Prometheus 0.0.4."""
+    _ensure_process()
+    counters, gauges, histograms, processes = _collect()
+    by_name = {}
+    for kind, series in (("counter", counters), ("gauge", gauges), ("histogram", histograms)):
+        for (name, labels), value in series.items():
+            by_name.setdefault(name, (kind, []))[1].append((labels, value))
+
+    lines = [
+        "# HELP metrics_processes Processus dont les métriques sont agrégées",
+        "# TYPE metrics_processes gauge",
+        f"metrics_processes {processes}",
+    ]
+    for name in sorted(by_name):
+        kind, series = by_name[name]
+        lines.append(f"# HELP {name} {HELP.get(name, (kind, name))[1]}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(series, key=lambda s: s[0]):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value["buckets"], value["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', _number(float(bound)))])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {value['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(float(value['sum']))}")
+            lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
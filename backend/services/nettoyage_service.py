@@ -0,0 +1,131 @@
+# nettoyage_service.py
+# Nettoyage de texte rapide : motifs précompilés et tables str.translate
+import re
+
+# Taille des morceaux traités à la fois (en caractères)
+CHUNK_SIZE = 1 << 20
+
+# Tokeniseur équivalent à r'\b\w+\b' (compilé une seule fois)
+_WORD_RE = re.compile(r"\w+")
+
+
+def _is_kept(ch):
+    """Caractères conservés par le nettoyage (équivalent de [a-zà-ÿ])."""
+    return "a" <= ch <= "z" or "à" <= ch <= "ÿ"
+
+
+class _CleanTable(dict):
+    """
+    Table pour str.translate : met en minuscules et remplace tout caractère
+    non alphabétique par un espace. Les points de code sont calculés à la
+    première rencontre puis mis en cache.
+    """
+
+    def __missing__(self, code):
+        lowered = chr(code).lower()
+        value = "".join(ch if _is_kept(ch) else " " for ch in lowered)
+        self[code] = value
+        return value
+
+
+_CLEAN_TABLE = _CleanTable()
+# Pré-remplissage ASCII + Latin-1 (cas le plus fréquent)
+for _code in range(256):
+    _CLEAN_TABLE[_code]
+
+
+# ---------------------------
+# Découpage en morceaux
+# ---------------------------
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    """
+    Découpe une chaîne ou un fichier texte ouvert en morceaux de chunk_size
+    caractères, sans jamais charger le fichier en entier.
+    """
+    if hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+
+
+# ---------------------------
+# Nettoyage
+# ---------------------------
+
+def normalize_chars(text):
+    """Minuscules + remplacement des caractères non alphabétiques, en une passe."""
+    return text.translate(_CLEAN_TABLE)
+
+
+def iter_words(source, chunk_size=CHUNK_SIZE):
+    """
+    Produit les mots nettoyés (minuscules, lettres uniquement) d'une chaîne
+    ou d'un fichier, morceau par morceau. Un mot coupé en fin de morceau est
+    recollé au début du morceau suivant.
+    """
+    carry = ""
+    for chunk in iter_chunks(source, chunk_size):
+        chunk = chunk.translate(_CLEAN_TABLE)
+        words = chunk.split()
+        if not words:
+            # Morceau composé uniquement d'espaces : le mot en attente est complet
+            if carry:
+                yield carry
+                carry = ""
+            continue
+        if carry:
+            if chunk[0] == " ":
+                yield carry
+            else:
+                words[0] = carry + words[0]
+            carry = ""
+        if chunk[-1] != " ":
+            carry = words.pop()
+        yield from words
+    if carry:
+        yield carry
+
+
+def iter_clean_tokens(source, stopwords=frozenset(), min_len=3, chunk_size=CHUNK_SIZE):
+    """Mots nettoyés, sans mots vides et d'au moins min_len caractères."""
+    for word in iter_words(source, chunk_size):
+        if len(word) >= min_len and word not in stopwords:
+            yield word
+
+
+def clean_tokens(source, stopwords=frozenset(), min_len=3, chunk_size=CHUNK_SIZE):
+    """Liste des tokens nettoyés (voir iter_clean_tokens)."""
+    return list(iter_clean_tokens(source, stopwords, min_len, chunk_size))
+
+
+def collapse_text(source, chunk_size=CHUNK_SIZE):
+    """Texte en minuscules, lettres uniquement, mots séparés par un seul espace."""
+    return " ".join(iter_words(source, chunk_size))
+
+
+# ---------------------------
+# Tokenisation simple
+# ---------------------------
+
+def tokenize(text):
+    """Tokens \\w+ en minuscules (sans copie intégrale du texte en minuscules)."""
+    return [t.lower() for t in _WORD_RE.findall(text)]
+
+
+def count_tokens(source, chunk_size=CHUNK_SIZE):
+    """Nombre de tokens \\w+ d'une chaîne ou d'un fichier, sans construire la liste."""
+    total = 0
+    ends_in_word = False
+    for chunk in iter_chunks(source, chunk_size):
+        total += sum(1 for _ in _WORD_RE.finditer(chunk))
+        # Un mot à cheval sur deux morceaux ne compte qu'une fois
+        if ends_in_word and _WORD_RE.match(chunk):
+            total -= 1
+        ends_in_word = _WORD_RE.match(chunk[-1]) is not None
+    return total
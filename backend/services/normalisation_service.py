@@ -1,7 +1,6 @@
 # normalisation_service.py
 import os
 from pathlib import Path
-import re
 import stopwordsiso
 from langdetect import detect, DetectorFactory
 from concurrent.futures import ThreadPoolExecutor
@@ -11,6 +10,9 @@ import io
 import pytesseract
 import pdfplumber
 import json
+from services.nettoyage_service import iter_clean_tokens, collapse_text
+from services.metrics_service import timed
+from services.textes_service import read_text, write_text, list_texts
 
 # Initialisation
 DetectorFactory.seed = 0
@@ -62,36 +64,34 @@ def get_spacy_model(lang_code: str):
         return nlp_en
     return nlp_fr
 
-def clean_text(text: str, lemmatize: bool = True) -> str:
+def normalize_tokens(text: str, lemmatize: bool = True, lang: str = None) -> list:
     """
-    Cleans and normalizes text:
+    Cleans and normalizes text, returning the list of kept tokens:
     - lowercase conversion
     - removal of non-alphabetic characters
     - tokenization and lemmatization (if spacy available)
     - stopword removal
     - preservation of technical acronyms
+    The language is detected unless already known (lang).
     """
     if not text or len(text.strip()) == 0:
-        return ""
+        return []
 
-    lang = detect_language(text)
+    if lang is None:
+        lang = detect_language(text)
     nlp = get_spacy_model(lang)
 
-    # Step 1: Lowercase
-    text = text.lower()
-
-    # Step 2: Clean non-alphabetic characters
-    text = re.sub(r"[^a-zà-ÿ\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-
-    # Fallback to simple regex cleaning if spacy unavailable
+    # Fallback to simple cleaning if spacy unavailable:
+    # lowercase, character filtering and stopword/length filtering in one pass
     if nlp is None:
-        tokens = text.split()
-        tokens = [t for t in tokens if t not in STOPWORDS and len(t) > 2]
-        return " ".join(tokens)
+        return list(iter_clean_tokens(text, STOPWORDS, min_len=3))
+
+    # Step 1 + 2: Lowercase and clean non-alphabetic characters (translate table)
+    text = collapse_text(text)
 
     # Step 3: Tokenization and lemmatization with spaCy
-    doc = nlp(text)
+    with timed("spacy", lang=lang):
+        doc = nlp(text)
     tokens = []
     for token in doc:
         lemma = token.lemma_ if lemmatize else token.text
@@ -109,7 +109,11 @@ def clean_text(text: str, lemmatize: bool = True) -> str:
 
         tokens.append(lemma)
 
-    return " ".join(tokens)
+    return tokens
+
+def clean_text(text: str, lemmatize: bool = True) -> str:
+    """Cleans and normalizes text (see normalize_tokens)."""
+    return " ".join(normalize_tokens(text, lemmatize=lemmatize))
 
 def read_pdf_with_ocr(pdf_path: Path) -> str:
     """
@@ -136,7 +140,8 @@ def read_pdf_with_ocr(pdf_path: Path) -> str:
                         x0, y0, x1, y1 = image["bbox"]
                         im = page.to_image()
                         cropped = im.crop((x0, y0, x1, y1))
-                        ocr_text = pytesseract.image_to_string(cropped)
+                        with timed("ocr", format="pdf"):
+                            ocr_text = pytesseract.image_to_string(cropped)
                         if ocr_text.strip():
                             text += "\n" + ocr_text
                 except Exception:
@@ -155,20 +160,17 @@ def process_file(file_path: Path, output_dir: Path, lemmatize=True):
     """
     try:
         ext = file_path.suffix.lower()
-        if ext == ".pdf":
+        if ext == ".pdf" and file_path.is_file():
             raw_text = read_pdf_with_ocr(file_path)
         else:
-            with open(file_path, "r", encoding="utf-8") as f:
-                raw_text = f.read()
+            # Raw text from the compressed store (directory + document name)
+            raw_text = read_text(file_path.parent, file_path.name) or ""
 
         clean = clean_text(raw_text, lemmatize=lemmatize)
         lang = detect_language(raw_text)
-        output_file = output_dir / file_path.name
 
-        # Save normalized text
-        output_dir.mkdir(parents=True, exist_ok=True)
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(clean)
+        # Save normalized text (compressed store)
+        write_text(output_dir, file_path.name, clean)
 
         print(f"Processed {file_path.name} ({lang.upper()}): {len(clean.split())} tokens")
         return file_path.name, clean
@@ -191,7 +193,7 @@ def normalize_corpus(input_dir="data/processed/raw_texts",
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    files = list(input_path.glob("*"))
+    files = [input_path / name for name in list_texts(input_path)] + list(input_path.glob("*.pdf"))
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         for file_path in files:
             process_file(file_path, output_path, lemmatize=lemmatize)
@@ -0,0 +1,118 @@
+# pipeline_service.py
+# Étape fusionnée normalisation + extraction : chaque document n'est tokenisé qu'une fois
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+from services.nettoyage_service import tokenize, count_tokens
+from services.normalisation_service import normalize_tokens, detect_language
+from services.vocabulaire_service import detach_terms
+from services.doublons_service import text_signature
+from services.metadata_service import load_metadata, metadata_exists, upsert
+from services.textes_service import read_text, list_texts, detach_text
+from services.metrics_service import timed, enqueue, dequeue
+
+
+# -------------------------------
+# Traitement d'un document en mémoire
+# -------------------------------
+def normalize_and_extract(name, raw_text, lemmatize=True):
+    """
+    Nettoie le texte brut déjà en mémoire et calcule les statistiques d'extraction
+    à partir de la même liste de tokens. Le texte nettoyé ("context") est enregistré
+    dans le stockage compressé par detach_text, avec l'entrée de métadonnées.
+
+    Arguments :
+    - name : nom du document (avec extension)
+    - raw_text : texte brut issu de l'acquisition
+
+    Retour :
+    - dictionnaire au format de extract_from_text (+ langue détectée)
+    """
+    with timed("normalisation"):
+        lang = detect_language(raw_text) if raw_text.strip() else "unknown"
+        tokens = normalize_tokens(raw_text, lemmatize=lemmatize, lang=lang)
+        clean_text = " ".join(tokens)
+
+    with timed("extraction"):
+        # Les tokens nettoyés sont déjà des mots simples : simple_tokenize(clean_text)
+        # revient à les mettre en minuscules (sauf cas rare d'un caractère non alphabétique)
+        tokens_after = []
+        for token in tokens:
+            if token.isalpha():
+                tokens_after.append(token.lower())
+            else:
+                tokens_after.extend(tokenize(token))
+
+        word_freq = Counter(tokens_after)
+        bigram_freq = Counter(zip(tokens_after, tokens_after[1:]))
+
+        return {
+            "context": clean_text,
+            "total_tokens_before": count_tokens(raw_text),
+            "total_tokens_after": len(tokens_after),
+            "char_count_before": len(raw_text),
+            "char_count_after": len(clean_text),
+            "words": [(word, count) for word, count in word_freq.items()],
+            "bigrams": [(" ".join(bigram), count) for bigram, count in bigram_freq.items()],
+            "lang": lang,
+            # Signature MinHash (détection des quasi-doublons)
+            "minhash": text_signature(clean_text),
+        }
+
+
+# -------------------------------
+# Traitement d'un dossier de textes bruts
+# -------------------------------
+def normalize_extract_corpus(
+    input_dir="data/processed/raw_texts",
+    output_dir="data/processed/clean_texts",
+    meta_file="data/processed/metadata.json",
+    max_workers=4,
+    lemmatize=True
+):
+    """
+    Remplace normalize_corpus + extract_corpus : chaque texte brut est lu une
+    seule fois, normalisé et extrait en mémoire, puis fusionné dans meta_file.
+    Les clés sont les noms de documents stockés dans raw_texts (textes compressés).
+    """
+    input_path = Path(input_dir)
+    meta_path = Path(meta_file)
+
+    def run(name):
+        try:
+            raw_text = read_text(input_path, name) or ""
+            return name, normalize_and_extract(name, raw_text, lemmatize=lemmatize)
+        except Exception as e:
+            print(f"❌ Erreur normalisation/extraction {name}: {e}")
+            return name, {}
+        finally:
+            dequeue("pipeline")
+
+    names = list_texts(input_path)
+    results = {}
+    enqueue("pipeline", len(names))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, data in executor.map(run, names):
+            results[name] = data
+
+    if metadata_exists(meta_path):
+        try:
+            existing_data = load_metadata(meta_path)
+        except Exception:
+            existing_data = {}
+    else:
+        existing_data = {}
+
+    for name, data in results.items():
+        entry = existing_data.setdefault(name, {})
+        entry.update(data)
+        detach_terms(name, entry)
+        # Texte nettoyé : stockage compressé (output_dir)
+        detach_text(name, entry, output_dir)
+
+    upsert({name: existing_data[name] for name in results}, meta_path)
+
+    print(f"✅ Normalisation + extraction terminées pour {len(results)} fichiers")
+    return existing_data
@@ -0,0 +1,334 @@
+# profiling_service.py
+# Profilage à la demande d'une requête ou d'un traitement d'ingestion :
+# cProfile (ou échantillonnage de pile) + tracemalloc pour la mémoire.
+#
+# Activation :
+#   - requête admin avec ?profile=1 (cProfile) ou ?profile=sample (échantillonnage)
+#   - PROFILE_ENDPOINTS="/api/search,/api/upload" (ou "*") : toutes les requêtes de ces endpoints
+#   - PROFILE_JOBS=1 : traitements d'ingestion complets (reprocess_all), par échantillonnage
+#     de tous les threads (le travail est fait dans des ThreadPoolExecutor)
+# Les profils sont écrits dans data/profiles/<id>.{json,txt,prof|collapsed}.
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILES_DIR = Path("data/profiles")
+PROFILE_ENDPOINTS = {e.strip() for e in os.environ.get("PROFILE_ENDPOINTS", "").split(",") if e.strip()}
+PROFILE_JOBS = os.environ.get("PROFILE_JOBS", "").lower() in ("1", "true", "yes")
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "cprofile")  # cprofile | sample
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))  # profils conservés (les plus anciens sont supprimés)
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+TOP_N = 40
+
+ADMIN_TOKEN = "fake-jwt-admin"  # jeton renvoyé par /api/login pour le rôle admin
+PROFILE_ID = re.compile(r"^[\w.-]+$")
+
+# cProfile ne peut pas être imbriqué : un seul profil à la fois par processus
+_cprofile_lock = threading.Lock()
+_local = threading.local()
+# tracemalloc est global : arrêté seulement quand le dernier profil se termine
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False  # tracemalloc démarré par ce module (pas par PYTHONTRACEMALLOC)
+
+
+def is_admin(request):
+    """Requête authentifiée avec le jeton admin (en-tête Authorization: Bearer ...)."""
+    auth = request.headers.get("Authorization", "")
+    return auth.startswith("Bearer ") and auth[len("Bearer "):].strip() == ADMIN_TOKEN
+
+
+# ---------------------------
+# Profileur par échantillonnage
+# ---------------------------
+
+class StackSampler:
+    """
+    Relève la pile d'un thread (ou de tous si thread_id=None) à intervalle régulier.
+    Faible surcoût : utilisable en production.
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}  # pile "module:fonction;..." -> nombre d'échantillons
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = {self.thread_id: frames.get(self.thread_id)}
+            names = {t.ident: t.name for t in threading.enumerate()} if self.thread_id is None else {}
+            for ident, frame in frames.items():
+                if frame is None or ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).stem}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if self.thread_id is None:
+                    # Threads d'un même pool regroupés (ThreadPoolExecutor-0_3 -> ThreadPoolExecutor-0)
+                    stack.append(re.sub(r"_\d+$", "", names.get(ident, str(ident))))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """Format « collapsed stacks » (flamegraph.pl, speedscope)."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items(), key=lambda s: -s[1]))
+
+    def summary(self):
+        """Fonctions les plus présentes dans les échantillons (temps inclusif)."""
+        inclusive = {}
+        for stack, count in self.stacks.items():
+            for name in {func.rsplit(":", 1)[0] for func in stack.split(";")}:
+                inclusive[name] = inclusive.get(name, 0) + count
+        # Pourcentage des piles relevées (une par thread et par relevé)
+        total = max(sum(self.stacks.values()), 1)
+        lines = [f"{self.samples} relevés toutes les {self.interval * 1000:.1f} ms, {total} piles", ""]
+        for name, count in sorted(inclusive.items(), key=lambda s: -s[1])[:TOP_N]:
+            lines.append(f"{100 * count / total:6.1f}%  {name}")
+        return "\n".join(lines)
+
+
+# ---------------------------
+# Profil d'un bloc de code
+# ---------------------------
+
+def _profile_id(label):
+    slug = re.sub(r"[^\w.-]+", "_", label).strip("_")[:60] or "profil"
+    return f"{datetime.now():%Y%m%d_%H%M%S_%f}_{slug}_{os.getpid()}"
+
+
+def _memory_report(before, after):
+    lines = ["Allocations (tracemalloc, différence avant/après, top lignes) :"]
+    for stat in after.compare_to(before, "lineno")[:TOP_N]:
+        lines.append(f"  {stat}")
+    return "\n".join(lines)
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            _tracing_started = True
+        _tracing_users += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+def _prune():
+    """Ne garde que les PROFILE_KEEP profils les plus récents."""
+    metas = sorted(PROFILES_DIR.glob("*.json"), key=lambda p: p.name, reverse=True)
+    for meta in metas[PROFILE_KEEP:]:
+        for path in PROFILES_DIR.glob(f"{meta.stem}.*"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+@contextmanager
+def profiled(label, mode=None, info=None, all_threads=False):
+    """
+    Profile le bloc (cProfile ou échantillonnage + tracemalloc) et enregistre le résultat.
+    all_threads : échantillonne tous les threads (pools de traitement compris).
+    Retourne (via as) un dictionnaire dont "id" est rempli à la fin ; None si un profil
+    est déjà en cours dans ce thread (les profils ne s'imbriquent pas).
+    """
+    if getattr(_local, "active", False):
+        yield None
+        return
+    mode = "sample" if all_threads else (mode or PROFILE_MODE)
+    if mode not in ("cprofile", "sample"):
+        mode = "cprofile"
+    profiler = None
+    if mode == "cprofile":
+        if not _cprofile_lock.acquire(blocking=False):
+            # Un autre thread est déjà profilé avec cProfile : échantillonnage à la place
+            mode = "sample"
+        else:
+            profiler = cProfile.Profile()
+    if mode == "sample":
+        profiler = StackSampler(None if all_threads else threading.get_ident())
+
+    _start_tracing()
+    mem_before = tracemalloc.take_snapshot()
+
+    result = {"id": None, "label": label, "mode": mode}
+    _local.active = True
+    start = time.perf_counter()
+    try:
+        if mode == "cprofile":
+            profiler.enable()
+        else:
+            profiler.start()
+        yield result
+    finally:
+        if mode == "cprofile":
+            profiler.disable()
+        else:
+            profiler.stop()
+        elapsed = time.perf_counter() - start
+        _local.active = False
+        mem_after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _stop_tracing()
+        if mode == "cprofile":
+            _cprofile_lock.release()
+        try:
+            result["id"] = _save(label, mode, profiler, elapsed, peak, mem_before, mem_after, info)
+        except Exception as e:
+            print(f"⚠️ Erreur enregistrement du profil {label}: {e}")
+
+
+def _save(label, mode, profiler, elapsed, peak, mem_before, mem_after, info):
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    profile_id = _profile_id(label)
+    base = PROFILES_DIR / profile_id
+
+    if mode == "cprofile":
+        profiler.dump_stats(str(base) + ".prof")
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats("cumulative").print_stats(TOP_N)
+        report = out.getvalue()
+        data_file = f"{profile_id}.prof"
+    else:
+        with open(str(base) + ".collapsed", "w", encoding="utf-8") as f:
+            f.write(profiler.collapsed())
+        report = profiler.summary()
+        data_file = f"{profile_id}.collapsed"
+
+    with open(str(base) + ".txt", "w", encoding="utf-8") as f:
+        f.write(f"{label} — {mode} — {elapsed * 1000:.1f} ms — pic mémoire {peak / 1e6:.1f} Mo\n\n")
+        f.write(report)
+        f.write("\n\n")
+        f.write(_memory_report(mem_before, mem_after))
+
+    meta = {
+        "id": profile_id,
+        "label": label,
+        "mode": mode,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "duration_ms": round(elapsed * 1000, 1),
+        "peak_memory_bytes": peak,
+        "pid": os.getpid(),
+        "files": [f"{profile_id}.txt", data_file],
+        "info": info or {},
+    }
+    with open(str(base) + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    _prune()
+    print(f"🔬 Profil {profile_id} enregistré ({elapsed * 1000:.0f} ms, {mode})")
+    return profile_id
+
+
+@contextmanager
+def job(label):
+    """Profile un traitement d'ingestion si PROFILE_JOBS est activé (sinon ne fait rien)."""
+    if not PROFILE_JOBS:
+        yield None
+        return
+    with profiled(f"job_{label}", all_threads=True) as result:
+        yield result
+
+
+# ---------------------------
+# Requêtes HTTP (Flask)
+# ---------------------------
+
+def _requested_mode(request):
+    flag = (request.args.get("profile") or "").lower()
+    if flag and is_admin(request):
+        return "sample" if flag == "sample" else "cprofile"
+    if request.url_rule is not None and ("*" in PROFILE_ENDPOINTS or request.url_rule.rule in PROFILE_ENDPOINTS):
+        return PROFILE_MODE
+    return None
+
+
+def init_app(app):
+    """Profile les requêtes demandées (?profile=1 admin, ou PROFILE_ENDPOINTS)."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        mode = _requested_mode(request)
+        if mode is None:
+            return
+        ctx = profiled(f"{request.method} {request.path}", mode, info={"url": request.full_path})
+        g._profile = (ctx, ctx.__enter__())
+
+    @app.after_request
+    def _end_profile(response):
+        profile = g.pop("_profile", None)
+        if profile is not None:
+            ctx, result = profile
+            ctx.__exit__(None, None, None)
+            if result and result["id"]:
+                response.headers["X-Profile-Id"] = result["id"]
+        return response
+
+    @app.teardown_request
+    def _teardown_profile(exc):
+        # Requête terminée par une exception : after_request n'a pas été appelé
+        profile = g.pop("_profile", None)
+        if profile is not None:
+            profile[0].__exit__(None, None, None)
+
+
+# ---------------------------
+# Consultation
+# ---------------------------
+
+def list_profiles():
+    """Profils enregistrés, du plus récent au plus ancien."""
+    if not PROFILES_DIR.exists():
+        return []
+    profiles = []
+    for path in sorted(PROFILES_DIR.glob("*.json"), key=lambda p: p.name, reverse=True):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_file(filename):
+    """Chemin d'un fichier de profil (None si le nom est invalide ou absent)."""
+    if not PROFILE_ID.match(filename or "") or filename.startswith("."):
+        return None
+    path = PROFILES_DIR / filename
+    return path if path.is_file() else None
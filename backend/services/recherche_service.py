@@ -1,2 +1,575 @@
 # recherche_service.py
-# Placeholder for search-related functionality
+# Index de recherche par segments, partagé entre workers en mémoire mappée (mmap).
+#
+# Chaque lot d'imports écrit un petit segment immuable ; une suppression (ou le
+# remplacement d'un document) est notée comme « tombstone » dans le manifeste.
+# Les segments sont interrogés ensemble ; un fusionneur en arrière-plan regroupe
+# les petits segments par paliers de taille (size-tiered). Le coût d'une ingestion
+# reste proportionnel au lot, la latence des requêtes reste stable.
+#
+# data/processed/index/
+#   manifest.json   {"generation", "version", "next_id", "segments": [{"id", "docs"}],
+#                    "tombstones": {id: [positions]}}
+#   seg_<id>/
+#     docs.json     noms + métadonnées sans le texte (instantané léger)
+#     offsets.npy   début de chaque document dans chaque blob (int64, 3 x (n + 1))
+#     context.bin   textes nettoyés (UTF-8), séparés par un octet nul
+#     lower.bin     mêmes textes en minuscules
+#     compact.bin   minuscules sans espaces (modes contains / starts_with / ends_with)
+#     terms.json    termes du segment, triés (mots \w+ des textes en minuscules)
+#     postings.npy  positions locales des documents de chaque terme, triées (int32)
+#     postings_offsets.npy  début des postings de chaque terme (int64, nb termes + 1)
+from pathlib import Path
+import bisect
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import threading
+import numpy as np
+
+from services.generation_service import current_generation, on_new_generation
+from services.metadata_service import changed_since, load_metadata
+from services.metrics_service import cache_hit, cache_miss
+from services.textes_service import document_text
+from services.verrou_service import file_lock, tmp_path
+
+INDEX_DIR = Path("data/processed/index")
+MANIFEST_FILE = INDEX_DIR / "manifest.json"
+BLOBS = ("context", "lower", "compact")
+# Jamais copiés dans docs.json : texte (blobs), aperçu base64 et signature MinHash (métadonnées)
+_METADATA_ONLY = ("context", "thumbnail", "minhash")
+_SEP = b"\x00"
+_TOKEN = re.compile(r"\w+")
+
+# Fusion dès que MERGE_FACTOR segments sont dans le même palier de taille
+MERGE_FACTOR = int(os.environ.get("INDEX_MERGE_FACTOR", "4"))
+# Un segment dont plus de cette part des documents est supprimée est réécrit
+MAX_DELETED_RATIO = 0.5
+# Préfiltre (type / date) : textes lus document par document s'il reste moins de 1/8 du corpus,
+# sinon un seul find() sur tout le blob est plus rapide
+PREFILTER_RATIO = 8
+
+# Mise à jour de l'index en arrière-plan dès qu'une génération est publiée (désactivable)
+BACKGROUND_BUILD = os.environ.get("INDEX_BACKGROUND_BUILD", "1").lower() not in ("0", "false", "no")
+
+_lock = threading.Lock()
+_segments = {}     # id -> Segment ouvert (partagé entre les vues successives)
+_current = None    # IndexView de ce processus
+_merging = threading.Lock()
+
+
+# ---------------------------
+# Segments
+# ---------------------------
+
+def _segment_dir(seg_id):
+    return INDEX_DIR / f"seg_{seg_id:06d}"
+
+
+def _write_segment_files(directory, names, entries, contexts):
+    """Écrit les fichiers d'un segment dans directory (qui ne doit pas exister)."""
+    directory.mkdir(parents=True)
+    offsets = {blob: [0] for blob in BLOBS}
+    files = {blob: open(directory / f"{blob}.bin", "wb") for blob in BLOBS}
+    postings = {}
+    try:
+        for local, context in enumerate(contexts):
+            lower = context.lower()
+            for blob, text in (("context", context), ("lower", lower), ("compact", lower.replace(" ", ""))):
+                data = text.encode("utf-8") + _SEP
+                files[blob].write(data)
+                offsets[blob].append(offsets[blob][-1] + len(data))
+            for term in set(_TOKEN.findall(lower)):
+                postings.setdefault(term, []).append(local)
+    finally:
+        for f in files.values():
+            f.close()
+
+    np.save(directory / "offsets.npy", np.array([offsets[blob] for blob in BLOBS], dtype=np.int64))
+    terms, term_offsets, flat = _pack_postings(postings)
+    np.save(directory / "postings.npy", flat)
+    np.save(directory / "postings_offsets.npy", term_offsets)
+    with open(directory / "terms.json", "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    with open(directory / "docs.json", "w", encoding="utf-8") as f:
+        json.dump({"names": list(names), "entries": list(entries)}, f, ensure_ascii=False)
+    return {"docs": len(names)}
+
+
+def tokenize(text):
+    """Mots indexés d'un texte (mêmes règles que les postings des segments)."""
+    return _TOKEN.findall(text.lower())
+
+
+def _pack_postings(postings):
+    """{terme: [positions croissantes]} -> (termes triés, débuts (int64), positions concaténées (int32))."""
+    terms = sorted(postings)
+    lengths = np.fromiter((len(postings[t]) for t in terms), dtype=np.int64, count=len(terms))
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=term_offsets[1:])
+    flat = np.fromiter((local for t in terms for local in postings[t]), dtype=np.int32, count=int(term_offsets[-1]))
+    return terms, term_offsets, flat
+
+
+def write_segment(seg_id, names, entries, contexts):
+    """Écrit un segment immuable (dossier temporaire puis rename)."""
+    tmp = tmp_path(_segment_dir(seg_id))
+    shutil.rmtree(tmp, ignore_errors=True)
+    info = _write_segment_files(tmp, names, entries, contexts)
+    _publish_segment(tmp, seg_id)
+    return dict(info, id=seg_id)
+
+
+def _publish_segment(tmp, seg_id):
+    """
+    Renomme le dossier temporaire en segment seg_id. Sous verrou 'index' : seg_id (next_id)
+    n'est pas encore publié, un dossier existant est donc un orphelin laissé par un
+    écrivain interrompu (processus arrêté avant d'écrire le manifeste).
+    """
+    target = _segment_dir(seg_id)
+    if target.exists():
+        shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+
+def _index_entry(entry):
+    """Entrée gardée dans docs.json : sans le texte ni les champs lourds lus dans les métadonnées."""
+    return {key: value for key, value in entry.items() if key not in _METADATA_ONLY}
+
+
+def _split_entries(metadata):
+    """Sépare les textes (blobs) du reste des métadonnées (docs.json)."""
+    names, entries, contexts = [], [], []
+    for name, entry in metadata.items():
+        names.append(name)
+        # Texte nettoyé : stockage compressé (clean_texts), ou 'context' des anciennes entrées
+        contexts.append(document_text(name, entry))
+        entries.append(_index_entry(entry))
+    return names, entries, contexts
+
+
+class Segment:
+    """Segment ouvert en lecture seule (blobs en mmap)."""
+
+    def __init__(self, seg_id):
+        directory = _segment_dir(seg_id)
+        self.id = seg_id
+        with open(directory / "docs.json", "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        self.names = docs["names"]
+        self.entries = docs["entries"]
+        self._offsets = dict(zip(BLOBS, np.load(directory / "offsets.npy", mmap_mode="r")))
+        self._blobs = {}
+        for blob in BLOBS:
+            with open(directory / f"{blob}.bin", "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                # mmap refuse les fichiers vides
+                self._blobs[blob] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if (directory / "terms.json").exists():
+            with open(directory / "terms.json", "r", encoding="utf-8") as f:
+                self.terms = json.load(f)
+            self._term_offsets = np.load(directory / "postings_offsets.npy", mmap_mode="r")
+            self._postings = np.load(directory / "postings.npy", mmap_mode="r")
+        else:
+            # Segment écrit avant l'ajout des postings : construits en mémoire
+            postings = {}
+            for local in range(len(self.names)):
+                for term in set(_TOKEN.findall(self.text(local, "lower"))):
+                    postings.setdefault(term, []).append(local)
+            self.terms, self._term_offsets, self._postings = _pack_postings(postings)
+        self._term_ids = {term: i for i, term in enumerate(self.terms)}
+
+    def text(self, local, blob="context"):
+        offsets = self._offsets[blob]
+        return self._blobs[blob][int(offsets[local]):int(offsets[local + 1]) - 1].decode("utf-8")
+
+    def postings(self, term):
+        """Positions locales (triées) des documents contenant le terme."""
+        i = self._term_ids.get(term)
+        if i is None:
+            return self._postings[:0]
+        return self._postings[int(self._term_offsets[i]):int(self._term_offsets[i + 1])]
+
+    def _prefix_range(self, prefix):
+        # Les termes qui commencent par prefix sont contigus dans la liste triée
+        lo = bisect.bisect_left(self.terms, prefix)
+        hi = bisect.bisect_left(self.terms, prefix + "\U0010ffff", lo)
+        return lo, hi
+
+    def prefix_postings(self, prefix):
+        """Positions locales (triées, sans doublon) des documents ayant un terme commençant par prefix."""
+        lo, hi = self._prefix_range(prefix)
+        return np.unique(self._postings[int(self._term_offsets[lo]):int(self._term_offsets[hi])])
+
+    def frequency(self, term=None, prefix=None):
+        """Longueur des postings (avant tombstones), pour ordonner l'exécution d'une requête."""
+        if prefix is not None:
+            lo, hi = self._prefix_range(prefix)
+        else:
+            lo = self._term_ids.get(term)
+            if lo is None:
+                return 0
+            hi = lo + 1
+        return int(self._term_offsets[hi] - self._term_offsets[lo])
+
+    def containing(self, needle, blob="compact", only=None):
+        """
+        Positions des documents contenant needle (parcours find() du blob mappé).
+        only : positions locales à tester (préfiltre) ; find() limité à chacun de ces documents.
+        """
+        data = self._blobs[blob]
+        offsets = self._offsets[blob]
+        if only is not None:
+            return [local for local in only
+                    if data.find(needle, int(offsets[local]), int(offsets[local + 1]) - 1) >= 0]
+        found = []
+        pos = data.find(needle)
+        while pos >= 0:
+            local = int(np.searchsorted(offsets, pos, side="right")) - 1
+            found.append(local)
+            # Document suivant : inutile de compter toutes les occurrences ici
+            pos = data.find(needle, int(offsets[local + 1]))
+        return found
+
+    def starting_with(self, prefix, blob="compact", only=None):
+        # Un document plus court que prefix inclut le séparateur dans la tranche : pas de faux positif
+        data, starts = self._blobs[blob], self._offsets[blob][:-1].tolist()
+        return [local for local in (range(len(starts)) if only is None else only)
+                if data[starts[local]:starts[local] + len(prefix)] == prefix]
+
+    def ending_with(self, suffix, blob="compact", only=None):
+        data, offsets = self._blobs[blob], self._offsets[blob].tolist()
+        return [local for local in (range(len(self.names)) if only is None else only)
+                if offsets[local + 1] - 1 - offsets[local] >= len(suffix)
+                and data[offsets[local + 1] - 1 - len(suffix):offsets[local + 1] - 1] == suffix]
+
+
+def _open_segment(seg_id):
+    segment = _segments.get(seg_id)
+    if segment is None:
+        segment = _segments[seg_id] = Segment(seg_id)
+    return segment
+
+
+# ---------------------------
+# Manifeste
+# ---------------------------
+
+def _manifest_stamp():
+    try:
+        st = MANIFEST_FILE.stat()
+        return (st.st_ino, st.st_mtime_ns)
+    except OSError:
+        return None
+
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(manifest):
+    """Publie le manifeste (rename atomique) et supprime les segments qui n'y sont plus. Sous verrou 'index'."""
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_path(MANIFEST_FILE)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, MANIFEST_FILE)
+    live = {_segment_dir(s["id"]).name for s in manifest["segments"]}
+    for path in INDEX_DIR.iterdir():
+        # Un worker peut encore lire un ancien segment : sous POSIX, ses pages restent valides
+        if path.name.startswith("seg_") and path.name not in live and not path.name.endswith(".tmp"):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _live_positions(manifest):
+    """{nom: (id du segment, position)} des documents non supprimés."""
+    live = {}
+    for seg in manifest["segments"]:
+        dead = set(manifest["tombstones"].get(str(seg["id"]), []))
+        for local, name in enumerate(_open_segment(seg["id"]).names):
+            if local not in dead:
+                live[name] = (seg["id"], local)
+    return live
+
+
+def _drop_empty_segments(manifest):
+    """Retire les segments dont tous les documents sont supprimés."""
+    kept = []
+    for seg in manifest["segments"]:
+        dead = manifest["tombstones"].get(str(seg["id"]), [])
+        if len(dead) < seg["docs"]:
+            kept.append(seg)
+        else:
+            manifest["tombstones"].pop(str(seg["id"]), None)
+    manifest["segments"] = kept
+
+
+def _full_rebuild(manifest, generation, version):
+    """Un seul segment avec tout le corpus (premier index, ou versions des entrées inconnues)."""
+    seg_id = manifest["next_id"] if manifest else 1
+    names, entries, contexts = _split_entries(load_metadata())
+    segments = [write_segment(seg_id, names, entries, contexts)] if names else []
+    return {"generation": generation, "version": version, "next_id": seg_id + 1,
+            "segments": segments, "tombstones": {}}
+
+
+def update_index():
+    """
+    Intègre dans l'index les modifications des métadonnées depuis sa dernière mise à jour :
+    un nouveau segment pour les documents ajoutés ou modifiés, des tombstones pour les
+    anciennes versions et les suppressions. Coût proportionnel aux documents modifiés.
+    """
+    generation = current_generation()
+    with file_lock("index"):
+        manifest = _read_manifest()
+        if manifest and manifest["generation"] >= generation:
+            return manifest
+        live = _live_positions(manifest) if manifest else {}
+        version, changes = changed_since(manifest["version"] if manifest else 0, known=live)
+        if manifest is None or changes is None:
+            manifest = _full_rebuild(manifest, generation, version)
+        else:
+            manifest = dict(manifest, generation=generation, version=version,
+                            tombstones={k: list(v) for k, v in manifest["tombstones"].items()})
+            for name in changes:
+                if name in live:
+                    seg_id, local = live[name]
+                    manifest["tombstones"].setdefault(str(seg_id), []).append(local)
+            added = {name: entry for name, entry in changes.items() if entry is not None}
+            if added:
+                seg_id = manifest["next_id"]
+                manifest["next_id"] += 1
+                manifest["segments"] = manifest["segments"] + [write_segment(seg_id, *_split_entries(added))]
+            _drop_empty_segments(manifest)
+        _write_manifest(manifest)
+    if _pick_merge(manifest):
+        _schedule_merge()
+    return manifest
+
+
+# ---------------------------
+# Fusion (size-tiered)
+# ---------------------------
+
+def _tier(docs):
+    return int(math.log(max(docs, 1), MERGE_FACTOR)) if MERGE_FACTOR > 1 else 0
+
+
+def _pick_merge(manifest):
+    """Segments à fusionner : MERGE_FACTOR segments d'un même palier, ou un segment trop troué."""
+    tiers = {}
+    for seg in manifest["segments"]:
+        dead = len(manifest["tombstones"].get(str(seg["id"]), []))
+        if seg["docs"] and dead / seg["docs"] > MAX_DELETED_RATIO:
+            return [seg["id"]]
+        tiers.setdefault(_tier(seg["docs"] - dead), []).append(seg["id"])
+    for tier in sorted(tiers):
+        if len(tiers[tier]) >= MERGE_FACTOR:
+            return tiers[tier][:MERGE_FACTOR]
+    return None
+
+
+def merge_segments():
+    """
+    Fusionne des segments tant que la politique le demande. Le nouveau segment est
+    écrit hors verrou ; les suppressions arrivées pendant l'écriture sont reportées.
+    Retourne le nombre de fusions.
+    """
+    merges = 0
+    while True:
+        manifest = _read_manifest()
+        picked = _pick_merge(manifest) if manifest else None
+        if not picked:
+            return merges
+        dead = {seg_id: set(manifest["tombstones"].get(str(seg_id), [])) for seg_id in picked}
+        names, entries, contexts, origin = [], [], [], []
+        for seg_id in picked:
+            segment = _open_segment(seg_id)
+            for local, name in enumerate(segment.names):
+                if local not in dead[seg_id]:
+                    names.append(name)
+                    # Segments écrits avant _METADATA_ONLY : champs lourds retirés à la fusion
+                    entries.append(_index_entry(segment.entries[local]))
+                    contexts.append(segment.text(local))
+                    origin.append((seg_id, local))
+        tmp = tmp_path(INDEX_DIR / "seg_merge")
+        shutil.rmtree(tmp, ignore_errors=True)
+        info = _write_segment_files(tmp, names, entries, contexts)
+
+        with file_lock("index"):
+            manifest = _read_manifest()
+            if not set(picked) <= {s["id"] for s in manifest["segments"]}:
+                # Segments déjà fusionnés par un autre worker
+                shutil.rmtree(tmp, ignore_errors=True)
+                continue
+            seg_id = manifest["next_id"]
+            manifest["next_id"] += 1
+            _publish_segment(tmp, seg_id)
+            # Documents supprimés pendant la fusion
+            new_position = {pos: i for i, pos in enumerate(origin)}
+            tombstones = [new_position[(sid, local)]
+                          for sid in picked
+                          for local in manifest["tombstones"].get(str(sid), [])
+                          if (sid, local) in new_position]
+            first = next(i for i, s in enumerate(manifest["segments"]) if s["id"] in picked)
+            segments = [s for s in manifest["segments"] if s["id"] not in picked]
+            segments.insert(first, dict(info, id=seg_id))
+            manifest["segments"] = segments
+            for sid in picked:
+                manifest["tombstones"].pop(str(sid), None)
+            if tombstones:
+                manifest["tombstones"][str(seg_id)] = tombstones
+            _drop_empty_segments(manifest)
+            _write_manifest(manifest)
+        merges += 1
+        print(f"🧩 Segments {picked} fusionnés dans {seg_id} ({len(names)} documents)")
+
+
+def _schedule_merge():
+    """Lance la fusion en arrière-plan (un seul fusionneur par processus)."""
+    def run():
+        if not _merging.acquire(blocking=False):
+            return
+        try:
+            merge_segments()
+        except Exception as e:
+            print(f"⚠️ Erreur fusion des segments: {e}")
+        finally:
+            _merging.release()
+
+    threading.Thread(target=run, name="index-merge", daemon=True).start()
+
+
+# ---------------------------
+# Lecture
+# ---------------------------
+
+class IndexView:
+    """Vue de l'index pour un manifeste : segments interrogés ensemble, tombstones filtrés."""
+
+    def __init__(self, manifest, stamp):
+        self.stamp = stamp
+        self.generation = manifest["generation"]
+        self.names, self.entries = [], []
+        self._docs = []       # position globale -> (segment, position locale)
+        self._parts = []      # (segment, position locale -> position globale ou -1)
+        for seg in manifest["segments"]:
+            segment = _open_segment(seg["id"])
+            dead = set(manifest["tombstones"].get(str(seg["id"]), []))
+            to_global = np.full(len(segment.names), -1, dtype=np.int64)
+            for local, name in enumerate(segment.names):
+                if local in dead:
+                    continue
+                to_global[local] = len(self._docs)
+                self._docs.append((segment, local))
+                self.names.append(name)
+                self.entries.append(segment.entries[local])
+            self._parts.append((segment, to_global))
+
+    def __len__(self):
+        return len(self.names)
+
+    def metadata(self):
+        """Instantané {nom: entrée} sans le texte."""
+        return dict(zip(self.names, self.entries))
+
+    def text(self, i, blob="context"):
+        segment, local = self._docs[i]
+        return segment.text(local, blob)
+
+    def _collect(self, method, value, blob, candidates=None):
+        value = value.encode("utf-8")
+        if candidates is not None and len(candidates) * PREFILTER_RATIO < len(self):
+            # Peu de candidats (filtres type / date appliqués avant) : seuls leurs textes sont lus
+            by_segment = {}
+            for i in candidates:
+                segment, local = self._docs[i]
+                by_segment.setdefault(segment.id, (segment, {}))[1][local] = i
+            found = []
+            for segment, to_global in by_segment.values():
+                found.extend(to_global[local] for local in getattr(segment, method)(value, blob, only=list(to_global)))
+            return sorted(found)
+        found = []
+        for segment, to_global in self._parts:
+            found.extend(int(to_global[local]) for local in getattr(segment, method)(value, blob))
+        found = [i for i in found if i >= 0]
+        if candidates is not None:
+            allowed = set(candidates)
+            found = [i for i in found if i in allowed]
+        return found
+
+    def containing(self, needle, blob="compact", candidates=None):
+        return self._collect("containing", needle, blob, candidates)
+
+    def _global_postings(self, method, value):
+        # Positions globales croissantes : segments dans l'ordre, positions locales triées
+        parts = []
+        for segment, to_global in self._parts:
+            local = getattr(segment, method)(value)
+            if len(local):
+                mapped = to_global[local]
+                parts.append(mapped[mapped >= 0])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def postings(self, term):
+        """Positions globales (triées) des documents contenant le terme (mot entier)."""
+        return self._global_postings("postings", term)
+
+    def prefix_postings(self, prefix):
+        """Positions globales (triées) des documents ayant un terme qui commence par prefix."""
+        return self._global_postings("prefix_postings", prefix)
+
+    def frequency(self, term=None, prefix=None):
+        """Estimation du nombre de documents (tombstones compris), sans lire les postings."""
+        return sum(segment.frequency(term, prefix) for segment, _ in self._parts)
+
+    def starting_with(self, prefix, blob="compact", candidates=None):
+        return self._collect("starting_with", prefix, blob, candidates)
+
+    def ending_with(self, suffix, blob="compact", candidates=None):
+        return self._collect("ending_with", suffix, blob, candidates)
+
+
+def current_index():
+    """Index à jour pour la génération courante ; vue rechargée quand le manifeste change."""
+    global _current
+    view = _current
+    if view is not None and view.generation >= current_generation() and view.stamp == _manifest_stamp():
+        cache_hit("search_index")
+        return view
+    cache_miss("search_index")
+    with _lock:
+        for attempt in range(3):
+            manifest = _read_manifest()
+            if manifest is None or manifest["generation"] < current_generation():
+                update_index()
+            stamp = _manifest_stamp()
+            if _current is not None and _current.stamp == stamp:
+                return _current
+            try:
+                _current = IndexView(_read_manifest(), stamp)
+                break
+            except FileNotFoundError:
+                # Segment supprimé par une fusion entre la lecture du manifeste et son ouverture
+                if attempt == 2:
+                    raise
+        # Segments qui ne sont plus référencés : libérés avec les anciennes vues
+        referenced = {segment.id for segment, _ in _current._parts}
+        for seg_id in list(_segments):
+            if seg_id not in referenced:
+                _segments.pop(seg_id, None)
+        return _current
+
+
+@on_new_generation
+def _update_in_background(generation):
+    """Après une ingestion, met l'index à jour pour que la première recherche soit rapide."""
+    if BACKGROUND_BUILD:
+        threading.Thread(target=current_index, name=f"index-update-{generation}", daemon=True).start()
@@ -0,0 +1,357 @@
+# requete_service.py
+# Langage de requête booléen pour /api/search?mode=query, exécuté sur les postings de l'index :
+#
+#   abeille AND miel            ET (aussi implicite : abeille miel)
+#   abeille OR ruche            OU
+#   NOT robot, -robot           SAUF
+#   "miel de fleurs"            phrase (mots consécutifs)
+#   poll*                       préfixe
+#   type:pdf                    filtre sur le type de fichier
+#   date>2025-01-01             filtre sur la date d'import (>, >=, <, <=, ou date:2025-01 pour un préfixe)
+#   (abeille OR ruche) AND NOT type:html
+#
+# Les opérateurs s'écrivent en majuscules ; and / or / not en minuscules sont refusés (erreur 400)
+# plutôt que cherchés comme des mots, "and" entre guillemets pour le mot. La requête est compilée en arbre ;
+# un ET évalue d'abord l'opérande le plus sélectif puis filtre ce petit ensemble de candidats
+# avec les suivants (recherche dichotomique dans les postings : saut des positions inutiles),
+# sans jamais parcourir le texte des documents, sauf pour vérifier les phrases.
+import re
+import numpy as np
+
+from services.facettes_service import doc_type
+from services.normalisation_service import STOPWORDS
+from services.recherche_service import tokenize
+
+_LEXER = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"?|([^\s()"]+))')
+_FIELD = re.compile(r"^(type|date)(:|>=|<=|>|<)(.+)$", re.IGNORECASE)
+_EMPTY = np.empty(0, dtype=np.int64)
+_OPERATORS = ("AND", "OR", "NOT")
+
+
+class QuerySyntaxError(ValueError):
+    """Requête mal formée (message affichable à l'utilisateur)."""
+
+
+# ---------------------------
+# Opérations sur les postings (tableaux triés de positions)
+# ---------------------------
+
+def _intersect(small, big):
+    """Éléments de small présents dans big : une recherche dichotomique par candidat."""
+    if not len(small) or not len(big):
+        return _EMPTY
+    pos = np.searchsorted(big, small)
+    found = pos < len(big)
+    found[found] = big[pos[found]] == small[found]
+    return small[found]
+
+
+def _difference(candidates, removed):
+    if not len(candidates) or not len(removed):
+        return candidates
+    pos = np.searchsorted(removed, candidates)
+    present = pos < len(removed)
+    present[present] = removed[pos[present]] == candidates[present]
+    return candidates[~present]
+
+
+# ---------------------------
+# Arbre de la requête
+# ---------------------------
+
+class Node:
+    def estimate(self, view):
+        """Nombre de documents attendu (ordre d'exécution des ET)."""
+        return len(view)
+
+    def evaluate(self, view):
+        """Positions (triées) des documents qui satisfont le nœud."""
+        return self.filter(view, np.arange(len(view), dtype=np.int64))
+
+    def filter(self, view, candidates):
+        """Candidats (triés) qui satisfont le nœud."""
+        return _intersect(candidates, self.evaluate(view))
+
+    def terms(self):
+        """Mots recherchés positivement (comptage des occurrences, extrait)."""
+        return []
+
+
+class Term(Node):
+    def __init__(self, term):
+        self.term = term
+
+    def estimate(self, view):
+        return view.frequency(term=self.term)
+
+    def evaluate(self, view):
+        return view.postings(self.term)
+
+    def terms(self):
+        return [self.term]
+
+
+class Prefix(Node):
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def estimate(self, view):
+        return view.frequency(prefix=self.prefix)
+
+    def evaluate(self, view):
+        return view.prefix_postings(self.prefix)
+
+    def terms(self):
+        return [self.prefix]
+
+
+class Phrase(Node):
+    """Mots consécutifs : documents contenant tous les mots, puis vérification dans le texte."""
+
+    def __init__(self, words):
+        self.words = words
+        self.pattern = re.compile(r"(?<!\w)" + r"\W+".join(re.escape(w) for w in words) + r"(?!\w)")
+
+    def estimate(self, view):
+        return min(view.frequency(term=w) for w in self.words)
+
+    def evaluate(self, view):
+        first, *rest = sorted(self.words, key=lambda w: view.frequency(term=w))
+        return self.filter(view, view.postings(first), rest)
+
+    def filter(self, view, candidates, words=None):
+        for word in self.words if words is None else words:
+            candidates = _intersect(candidates, view.postings(word))
+        if len(self.words) == 1:
+            return candidates
+        return np.array([i for i in candidates.tolist() if self.pattern.search(view.text(i, "lower"))],
+                        dtype=np.int64)
+
+    def terms(self):
+        return [" ".join(self.words)]
+
+
+class Field(Node):
+    """type:pdf, date>2025-01-01 : filtre sur les métadonnées de l'index (pas de postings)."""
+
+    def __init__(self, name, op, value):
+        self.name, self.op, self.value = name, op, value
+
+    def _match(self, name, entry):
+        if self.name == "type":
+            # Même type que la facette "type" (extension, sinon type des métadonnées)
+            return doc_type(name, entry) == self.value
+        date = str(entry.get("date_import") or "")
+        if not date[:1].isdigit():
+            return False
+        if self.op == ":":
+            return date.startswith(self.value)
+        # Dates ISO : l'ordre des chaînes est l'ordre chronologique (comparaison sur la précision donnée)
+        date = date[:len(self.value)]
+        return {">": date > self.value, ">=": date >= self.value,
+                "<": date < self.value, "<=": date <= self.value}[self.op]
+
+    def filter(self, view, candidates):
+        names, entries = view.names, view.entries
+        return np.array([i for i in candidates.tolist() if self._match(names[i], entries[i])], dtype=np.int64)
+
+
+class Not(Node):
+    def __init__(self, child):
+        self.child = child
+
+    def filter(self, view, candidates):
+        return _difference(candidates, self.child.filter(view, candidates))
+
+
+class And(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, view):
+        positives = [c for c in self.children if not isinstance(c, Not)]
+        return min((c.estimate(view) for c in positives), default=len(view))
+
+    def _plan(self, view):
+        # Plus sélectif d'abord ; les NOT à la fin (ils ne font que retirer des candidats)
+        positives = sorted((c for c in self.children if not isinstance(c, Not)), key=lambda c: c.estimate(view))
+        return positives + [c for c in self.children if isinstance(c, Not)]
+
+    def evaluate(self, view):
+        plan = self._plan(view)
+        if isinstance(plan[0], Not):
+            return self.filter(view, np.arange(len(view), dtype=np.int64))
+        return self._run(view, plan[0].evaluate(view), plan[1:])
+
+    def filter(self, view, candidates):
+        return self._run(view, candidates, self._plan(view))
+
+    @staticmethod
+    def _run(view, candidates, plan):
+        for child in plan:
+            if not len(candidates):
+                break
+            candidates = child.filter(view, candidates)
+        return candidates
+
+    def terms(self):
+        return [t for c in self.children for t in c.terms()]
+
+
+class Or(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, view):
+        return min(sum(c.estimate(view) for c in self.children), len(view))
+
+    def evaluate(self, view):
+        return np.unique(np.concatenate([c.evaluate(view) for c in self.children]))
+
+    def filter(self, view, candidates):
+        return np.unique(np.concatenate([c.filter(view, candidates) for c in self.children]))
+
+    def terms(self):
+        return [t for c in self.children for t in c.terms()]
+
+
+# ---------------------------
+# Analyse
+# ---------------------------
+
+def _tokens(text):
+    pos, tokens = 0, []
+    while pos < len(text):
+        match = _LEXER.match(text, pos)
+        if not match or match.end() == pos:
+            break
+        pos = match.end()
+        lpar, rpar, phrase, word = match.groups()
+        if lpar:
+            tokens.append(("(", None))
+        elif rpar:
+            tokens.append((")", None))
+        elif phrase is not None:
+            tokens.append(("phrase", phrase))
+        elif word in _OPERATORS:
+            tokens.append((word, None))
+        elif word.upper() in _OPERATORS:
+            # « chat and chien » cherchait le mot and : aucun résultat, sans explication
+            raise QuerySyntaxError(f"Opérateur '{word}' : les opérateurs s'écrivent en majuscules "
+                                   f"({', '.join(_OPERATORS)}) ; \"{word}\" entre guillemets pour chercher le mot")
+        elif word == "-":
+            # -"phrase", -(a OR b)
+            tokens.append(("NOT", None))
+        elif word:
+            tokens.append(("word", word))
+    return tokens
+
+
+class _Parser:
+    """
+    requete := ou
+    ou      := et ("OR" et)*
+    et      := unaire (["AND"] unaire)*
+    unaire  := ("NOT" | "-") unaire | "(" ou ")" | phrase | filtre | mot | préfixe*
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise QuerySyntaxError("Requête vide")
+        node = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise QuerySyntaxError("Parenthèse fermante en trop" if self.peek() == ")" else "Requête mal formée")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_unary()]
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.take()
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_unary(self):
+        kind = self.peek()
+        if kind is None:
+            raise QuerySyntaxError("Opérande manquant en fin de requête")
+        kind, value = self.take()
+        if kind == "NOT":
+            return Not(self.parse_unary())
+        if kind == "(":
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise QuerySyntaxError("Parenthèse non fermée")
+            self.take()
+            return node
+        if kind == "phrase":
+            return _phrase(tokenize(value))
+        if kind == "word":
+            return _word(value)
+        raise QuerySyntaxError(f"Opérateur {kind} inattendu")
+
+
+def _word(value):
+    if value.startswith("-") and len(value) > 1:
+        return Not(_word(value[1:]))
+    field = _FIELD.match(value)
+    if field:
+        name, op, arg = field.group(1).lower(), field.group(2), field.group(3).lower()
+        if name == "type" and op != ":":
+            raise QuerySyntaxError("Le filtre type s'écrit type:pdf")
+        if name == "date" and not re.match(r"^\d{4}(-\d{2}(-\d{2})?)?$", arg):
+            raise QuerySyntaxError("Date attendue au format AAAA-MM-JJ (ou AAAA-MM, AAAA)")
+        return Field(name, op, arg.lstrip("."))
+    if value.endswith("*"):
+        words = tokenize(value[:-1])
+        if len(words) != 1:
+            raise QuerySyntaxError(f"Préfixe invalide: {value}")
+        return Prefix(words[0])
+    words = tokenize(value)
+    if not words:
+        raise QuerySyntaxError(f"Terme invalide: {value}")
+    # l'abeille, mots-clés : plusieurs mots de l'index -> phrase
+    return Term(words[0]) if len(words) == 1 else _phrase(words)
+
+
+def _phrase(words):
+    # Le texte indexé est nettoyé (mots vides et mots de moins de 3 lettres retirés) :
+    # la phrase l'est aussi, sinon "miel de fleurs" ne trouverait jamais "miel fleurs"
+    words = [w for w in words if len(w) >= 3 and w not in STOPWORDS] or words
+    if not words:
+        raise QuerySyntaxError("Phrase vide")
+    return Term(words[0]) if len(words) == 1 else Phrase(words)
+
+
+def parse_query(text):
+    """Compile une requête en arbre exécutable ; QuerySyntaxError si elle est mal formée."""
+    return _Parser(_tokens(text)).parse()
+
+
+def execute(node, view, candidates=None):
+    """
+    Positions (triées) des documents de l'index qui satisfont la requête,
+    limitées aux candidats (positions triées, ex. filtres de facettes) s'ils sont donnés.
+    """
+    if candidates is None:
+        return node.evaluate(view)
+    return node.filter(view, np.asarray(candidates, dtype=np.int64))
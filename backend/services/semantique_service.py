@@ -0,0 +1,249 @@
+# semantique_service.py
+# Recherche sémantique (LSA) pour /api/search?mode=semantic, entièrement locale (CPU) :
+# SVD tronquée de la matrice TF-IDF documents x termes construite depuis les comptages de mots.
+# Les vecteurs des documents (float32, normalisés) sont dans un fichier ouvert en mmap, classés
+# par produits scalaires NumPy par blocs. Les documents importés après l'ajustement sont projetés
+# sur les concepts existants (« fold-in ») et ajoutés en fin de fichier ; le modèle est réajusté
+# quand le corpus a trop grandi depuis (REFIT_GROWTH).
+from pathlib import Path
+import json
+import os
+import threading
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import svds
+
+from services.vocabulaire_service import document_counts, term_ids
+from services.metadata_service import changed_since, load_metadata, metadata_version
+from services.nettoyage_service import tokenize
+from services.normalisation_service import normalize_tokens
+from services.verrou_service import file_lock, tmp_path
+from services.metrics_service import cache_hit, cache_miss, timed
+
+SEMANTIC_DIR = Path("data/processed/semantic")
+MODEL_FILE = SEMANTIC_DIR / "model.npz"      # idf et composantes (termes x concepts)
+VECTORS_FILE = SEMANTIC_DIR / "vectors.f32"  # vecteurs des documents, lignes de DIM float32
+STATE_FILE = SEMANTIC_DIR / "state.json"     # noms des lignes, lignes retirées, version des métadonnées
+
+# Nombre de concepts, résultats retournés, score minimal
+DIM = int(os.environ.get("SEMANTIC_DIM", "100"))
+TOP_N = int(os.environ.get("SEMANTIC_TOP", "50"))
+MIN_SCORE = float(os.environ.get("SEMANTIC_MIN_SCORE", "0.1"))
+DOCS_PER_CONCEPT = 4
+MIN_CONCEPTS = 8
+# Réajustement quand le nombre de lignes dépasse REFIT_GROWTH x celui de l'ajustement
+REFIT_GROWTH = float(os.environ.get("SEMANTIC_REFIT_GROWTH", "2"))
+# Lignes lues à la fois lors du classement
+BLOCK = 65536
+# En dessous de cette taille (documents x termes), SVD dense exacte plutôt que svds
+DENSE_MAX = 4_000_000
+
+_lock = threading.Lock()
+_state = None
+_state_stamp = None
+
+
+# ---------------------------
+# Modèle
+# ---------------------------
+
+def _tf_matrix(names, metadata):
+    rows, cols, vals = [], [], []
+    for row, name in enumerate(names):
+        ids, counts = document_counts(name, metadata[name])
+        keep = np.asarray(counts) > 0
+        rows.append(np.full(int(keep.sum()), row, dtype=np.int64))
+        cols.append(np.asarray(ids, dtype=np.int64)[keep])
+        vals.append(1 + np.log(np.asarray(counts, dtype=np.float32)[keep]))
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    width = int(cols.max()) + 1 if len(cols) else 0
+    return sp.csr_matrix((np.concatenate(vals) if vals else np.zeros(0, dtype=np.float32),
+                          (np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64), cols)),
+                         shape=(len(names), width), dtype=np.float32)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+def _fit(tf):
+    """SVD tronquée de la matrice TF-IDF : (idf, composantes termes x concepts, vecteurs documents)."""
+    n, width = tf.shape
+    df = np.bincount(tf.indices, minlength=width)
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    tfidf = tf @ sp.diags(idf)
+    # Au moins DOCS_PER_CONCEPT documents par concept : sinon la SVD reproduit les documents
+    # un à un au lieu de regrouper les mots employés dans les mêmes contextes. Petit corpus :
+    # au moins MIN_CONCEPTS (au plus n - 1) concepts, un seul ne garderait que la direction
+    # dominante et la plupart des requêtes n'y auraient aucune composante
+    k = min(DIM, width, max(1, n // DOCS_PER_CONCEPT, min(n - 1, MIN_CONCEPTS))) if n else 0
+    if k == 0:
+        return idf, np.zeros((width, 0), dtype=np.float32), np.zeros((n, 0), dtype=np.float32)
+    if n * width <= DENSE_MAX or k >= min(n, width) - 1:
+        _, _, vt = np.linalg.svd(tfidf.toarray(), full_matrices=False)
+        components = vt[:k].T
+    else:
+        _, _, vt = svds(tfidf.astype(np.float64), k=k, random_state=0)
+        components = vt.T
+    components = np.ascontiguousarray(components, dtype=np.float32)
+    return idf, components, _normalize(tfidf @ components)
+
+
+def _fold_in(idf, components, ids, counts):
+    """Vecteur d'un document ou d'une requête dans l'espace des concepts (termes inconnus du modèle ignorés)."""
+    ids, counts = np.asarray(ids, dtype=np.int64), np.asarray(counts, dtype=np.float32)
+    keep = (ids < len(idf)) & (counts > 0)
+    ids, counts = ids[keep], counts[keep]
+    vector = ((1 + np.log(counts)) * idf[ids]) @ components[ids]
+    return _normalize(vector[None, :])[0]
+
+
+# ---------------------------
+# État persistant
+# ---------------------------
+
+def _file_stamp():
+    try:
+        st = STATE_FILE.stat()
+        return (st.st_ino, st.st_mtime_ns)
+    except OSError:
+        return None
+
+
+def _write_state(state):
+    global _state, _state_stamp
+    payload = {k: state[k] for k in ("version", "names", "removed", "fitted_rows", "dim")}
+    tmp = tmp_path(STATE_FILE)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp, STATE_FILE)
+    _state, _state_stamp = None, None
+
+
+def _open_vectors(rows, dim):
+    if rows == 0 or dim == 0:
+        return np.zeros((rows, dim), dtype=np.float32)
+    return np.memmap(VECTORS_FILE, dtype=np.float32, mode="r", shape=(rows, dim))
+
+
+def _load():
+    """État courant (modèle, noms, vecteurs en mmap) ; None s'il n'existe pas ou est illisible."""
+    global _state, _state_stamp
+    stamp = _file_stamp()
+    if stamp == _state_stamp:
+        return _state
+    state = None
+    if stamp is not None:
+        try:
+            with open(STATE_FILE, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            model = np.load(MODEL_FILE)
+            state["idf"], state["components"] = model["idf"], model["components"]
+            state["vectors"] = _open_vectors(len(state["names"]), state["dim"])
+            state["removed"] = set(state["removed"])
+        except Exception as e:
+            print(f"⚠️ Modèle sémantique illisible, réajustement: {e}")
+            state = None
+    _state, _state_stamp = state, stamp
+    return state
+
+
+def rebuild(metadata, version=0):
+    """Ajuste le modèle sur tout le corpus et réécrit les vecteurs (appelé sous file_lock("semantic"))."""
+    names = list(metadata)
+    with timed("semantic_fit"):
+        idf, components, vectors = _fit(_tf_matrix(names, metadata))
+    SEMANTIC_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_path(MODEL_FILE)
+    with open(tmp, "wb") as f:
+        np.savez(f, idf=idf, components=components)
+    os.replace(tmp, MODEL_FILE)
+    tmp = tmp_path(VECTORS_FILE)
+    vectors.tofile(tmp)
+    os.replace(tmp, VECTORS_FILE)
+    _write_state({"version": version, "names": names, "removed": [], "fitted_rows": len(names),
+                  "dim": components.shape[1]})
+
+
+def _apply(state, version, changes):
+    """Anciennes lignes marquées retirées ; documents ajoutés / modifiés projetés et ajoutés en fin de fichier."""
+    rows = {name: i for i, name in enumerate(state["names"]) if i not in state["removed"]}
+    removed = set(state["removed"]) | {rows[name] for name in changes if name in rows}
+    added = [(name, entry) for name, entry in changes.items() if entry is not None]
+    if added and state["dim"]:
+        vectors = np.stack([_fold_in(state["idf"], state["components"], *document_counts(name, entry))
+                            for name, entry in added])
+        with open(VECTORS_FILE, "ab") as f:
+            vectors.astype(np.float32).tofile(f)
+    _write_state({"version": version, "names": state["names"] + [name for name, _ in added],
+                  "removed": sorted(removed), "fitted_rows": state["fitted_rows"], "dim": state["dim"]})
+
+
+def update_semantic():
+    """Intègre les modifications des métadonnées (fold-in) ou réajuste le modèle si nécessaire."""
+    # Chemin rapide sans verrou : l'état publié n'est jamais modifié, il est à jour si la
+    # version des métadonnées n'a pas bougé (pas de parcours du journal)
+    state = _state
+    if state is not None and state["version"] == metadata_version():
+        cache_hit("semantic")
+        return state
+    with file_lock("semantic"), _lock:
+        state = _load()
+        live = [n for i, n in enumerate(state["names"]) if i not in state["removed"]] if state else []
+        version, changes = changed_since(state["version"] if state else 0, known=live)
+        if state is not None and changes is not None and version == state["version"]:
+            cache_hit("semantic")
+            return state
+        cache_miss("semantic")
+        grown = state is not None and len(state["names"]) + len(changes or ()) > REFIT_GROWTH * state["fitted_rows"]
+        if state is None or changes is None or not state["dim"] or grown:
+            rebuild(load_metadata(), version)
+        else:
+            _apply(state, version, changes)
+        return _load()
+
+
+# ---------------------------
+# Recherche
+# ---------------------------
+
+def query_vector(state, query):
+    """Mots de la requête (tels quels et normalisés comme les documents) projetés sur les concepts."""
+    words = set(tokenize(query.lower())) | set(normalize_tokens(query))
+    ids = [i for i in term_ids(sorted(words), create=False) if i is not None]
+    if not ids or not state["dim"]:
+        return None
+    vector = _fold_in(state["idf"], state["components"], ids, np.ones(len(ids)))
+    return vector if vector.any() else None
+
+
+def search(query, names=None, top_n=TOP_N):
+    """
+    Documents les plus proches de la requête : [(nom, score cosinus)], score décroissant.
+    names : noms autorisés (filtres de facettes), None pour tout le corpus.
+    """
+    state = update_semantic()
+    vector = query_vector(state, query)
+    if vector is None:
+        return []
+    # Lignes utilisables : ni retirées, ni exclues par les filtres
+    live = np.ones(len(state["names"]), dtype=bool)
+    live[list(state["removed"])] = False
+    if names is not None:
+        rows = {name: i for i, name in enumerate(state["names"]) if live[i]}
+        live[:] = False
+        live[[rows[n] for n in names if n in rows]] = True
+    vectors = state["vectors"]
+    best_rows, best_scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    for start in range(0, len(vectors), BLOCK):
+        scores = np.asarray(vectors[start:start + BLOCK]) @ vector
+        rows = np.flatnonzero((scores >= MIN_SCORE) & live[start:start + BLOCK])
+        best_rows = np.concatenate([best_rows, rows + start])
+        best_scores = np.concatenate([best_scores, scores[rows]])
+        if len(best_rows) > top_n:
+            keep = np.argpartition(-best_scores, top_n - 1)[:top_n]
+            best_rows, best_scores = best_rows[keep], best_scores[keep]
+    order = np.lexsort((best_rows, -best_scores))
+    return [(state["names"][r], round(float(best_scores[i]), 4)) for i, r in zip(order, best_rows[order])]
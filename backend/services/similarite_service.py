@@ -0,0 +1,433 @@
+# similarite_service.py
+# Graphe de similarité entre documents (vue « relations ») : vecteurs TF-IDF creux construits
+# depuis les comptages de mots (ids du vocabulaire), similarité cosinus par produit de matrices
+# creuses (scipy.sparse) et k plus proches voisins gardés par document.
+#
+# Le graphe suit le journal des métadonnées comme l'index de recherche (changed_since) :
+# un document ajouté est comparé à tout le corpus en UN produit ligne x matrice, puis inséré
+# dans les listes de voisins qu'il améliore ; une suppression ne fait recalculer que les
+# documents qui l'avaient comme voisin. Jamais de recalcul de toutes les paires, sauf à la
+# première construction (ou si le journal ne permet plus de savoir ce qui a changé).
+# Le graphe est mis à jour en arrière-plan après chaque ingestion / suppression (nouvelle
+# génération) et n'écrit sur disque que les lignes et listes de voisins modifiées.
+from pathlib import Path
+import json
+import os
+import threading
+import uuid
+import numpy as np
+import scipy.sparse as sp
+
+from services.vocabulaire_service import document_counts
+from services.generation_service import on_new_generation
+from services.metadata_service import changed_since, load_metadata, metadata_version
+from services.verrou_service import file_lock, tmp_path
+from services.metrics_service import cache_hit, cache_miss
+
+SIMILARITY_DIR = Path("data/processed/similarity")
+GRAPH_LOG = SIMILARITY_DIR / "graph.log"
+# Ancien format (matrice et graphe complets réécrits à chaque mise à jour)
+_LEGACY_FILES = (SIMILARITY_DIR / "vectors.npz", SIMILARITY_DIR / "graph.json")
+
+# Voisins gardés par document, score minimal d'une arête
+TOP_K = int(os.environ.get("SIMILARITY_TOP_K", "10"))
+MIN_SCORE = float(os.environ.get("SIMILARITY_MIN_SCORE", "0.05"))
+# Lignes comparées à la fois lors d'une construction complète (mémoire : BLOCK x nb de documents)
+BLOCK = 256
+# Lignes de journal tolérées au-delà de 2 par document avant compactage
+COMPACT_RECORDS = 1000
+# Octets de lignes retirées tolérés dans le fichier des vecteurs avant compactage
+COMPACT_BYTES = 1 << 20
+BACKGROUND_UPDATE = os.environ.get("SIMILARITY_BACKGROUND_UPDATE", "1").lower() not in ("0", "false", "no")
+
+_lock = threading.Lock()
+_state = None
+
+
+# ---------------------------
+# Vecteurs
+# ---------------------------
+
+def _tf_rows(names, entries):
+    """Matrice creuse (documents x vocabulaire) des poids 1 + log(tf)."""
+    rows, cols, vals = [], [], []
+    for row, (name, entry) in enumerate(zip(names, entries)):
+        ids, counts = document_counts(name, entry)
+        keep = np.asarray(counts) > 0
+        ids, counts = np.asarray(ids, dtype=np.int64)[keep], np.asarray(counts, dtype=np.float32)[keep]
+        rows.append(np.full(len(ids), row, dtype=np.int64))
+        cols.append(ids)
+        vals.append(1 + np.log(counts))
+    if not rows:
+        return sp.csr_matrix((0, 0), dtype=np.float32)
+    cols = np.concatenate(cols)
+    width = int(cols.max()) + 1 if len(cols) else 0
+    return sp.csr_matrix((np.concatenate(vals), (np.concatenate(rows), cols)),
+                         shape=(len(names), width), dtype=np.float32)
+
+
+def _stack(tf, added):
+    """tf puis les lignes ajoutées (la largeur suit la croissance du vocabulaire)."""
+    width = max(tf.shape[1], added.shape[1])
+    tf, added = tf.copy(), added.copy()
+    tf.resize((tf.shape[0], width))
+    added.resize((added.shape[0], width))
+    return sp.vstack([tf, added], format="csr")
+
+
+def _weighted(tf):
+    """Lignes TF-IDF normalisées (L2) : le produit scalaire de deux lignes est leur cosinus."""
+    n = tf.shape[0]
+    df = np.bincount(tf.indices, minlength=tf.shape[1])
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    weighted = tf @ sp.diags(idf)
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sp.csr_matrix(sp.diags(1 / norms) @ weighted, dtype=np.float32)
+
+
+def _top(scores, exclude):
+    """[(position, score)] des TOP_K meilleurs scores (>= MIN_SCORE), sans le document lui-même."""
+    scores = np.asarray(scores, dtype=np.float32).copy()
+    scores[exclude] = 0
+    candidates = np.flatnonzero(scores >= MIN_SCORE)
+    if len(candidates) > TOP_K:
+        candidates = candidates[np.argpartition(-scores[candidates], TOP_K - 1)[:TOP_K]]
+    order = np.lexsort((candidates, -scores[candidates]))
+    return [(int(i), round(float(scores[i]), 4)) for i in candidates[order]]
+
+
+# ---------------------------
+# État persistant : journal en ajout seul + fichier des vecteurs en ajout seul
+#
+#   {"op": "base", "v": 12, "top_k": 10, "min_score": 0.05, "rows": "vectors-1a2b3c4d.bin"}
+#   {"op": "add", "name": "doc.pdf", "at": 4096, "n": 180, "neighbours": [["autre.pdf", 0.42]]}
+#   {"op": "remove", "name": "doc.pdf"}
+#   {"op": "neighbours", "name": "autre.pdf", "neighbours": [...]}   liste de voisins modifiée
+#   {"op": "version", "v": 14}                                        fin d'un lot de modifications
+#
+# Une ligne de la matrice TF est stockée dans le fichier "rows" à l'octet "at" : n ids (uint32)
+# puis n poids (float32). Un import n'ajoute que ses lignes et les listes de voisins qu'il
+# modifie ; les autres processus ne relisent que la fin du journal. Journal et vecteurs sont
+# réécrits (compactage) quand le journal dépasse COMPACT_RECORDS + 2 x documents ou que les
+# lignes retirées dépassent les lignes vivantes de plus de COMPACT_BYTES.
+# ---------------------------
+
+def _empty_state(version=None):
+    return {"version": version, "names": [], "neighbours": {}, "tf": sp.csr_matrix((0, 0), dtype=np.float32),
+            "spans": {}, "rows": None, "rows_size": 0, "ino": None, "offset": 0, "records": 0}
+
+
+def _read_rows(rows_file, spans):
+    """Matrice creuse des lignes [(at, n)] lues dans le fichier des vecteurs."""
+    indptr, indices, data = [0], [], []
+    with open(SIMILARITY_DIR / rows_file, "rb") as f:
+        for at, n in spans:
+            f.seek(at)
+            raw = f.read(8 * n)
+            if len(raw) != 8 * n:
+                raise ValueError("fichier des vecteurs tronqué")
+            indices.append(np.frombuffer(raw, dtype="<u4", count=n).astype(np.int64))
+            data.append(np.frombuffer(raw, dtype="<f4", offset=4 * n, count=n))
+            indptr.append(indptr[-1] + n)
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+    width = int(indices.max()) + 1 if len(indices) else 0
+    return sp.csr_matrix((np.concatenate(data) if data else np.zeros(0, dtype=np.float32), indices, indptr),
+                         shape=(len(spans), width), dtype=np.float32)
+
+
+def _write_rows(f, tf, rows):
+    """Écrit des lignes de tf en fin de fichier ; retourne leurs positions [(at, n)]."""
+    spans = []
+    for row in rows:
+        start, end = tf.indptr[row], tf.indptr[row + 1]
+        spans.append((f.tell(), int(end - start)))
+        f.write(tf.indices[start:end].astype("<u4").tobytes())
+        f.write(tf.data[start:end].astype("<f4").tobytes())
+    return spans
+
+
+def _apply_log(state, data):
+    """
+    Applique les lignes complètes d'un morceau de journal à une copie de l'état (vecteurs lus pour
+    les seuls documents ajoutés) ; retourne le nombre d'octets consommés.
+    """
+    end = data.rfind(b"\n") + 1
+    neighbours, spans = state["neighbours"], state["spans"]
+    gone, added = set(), {}
+    for line in data[:end].split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # Ligne tronquée par un arrêt brutal : ignorée
+            continue
+        op = record.get("op")
+        if op == "base":
+            if record.get("top_k") != TOP_K or record.get("min_score") != MIN_SCORE:
+                raise ValueError("paramètres du graphe modifiés")
+            state["version"], state["rows"] = record["v"], record["rows"]
+        elif op == "add":
+            name = record["name"]
+            gone.add(name)
+            added[name] = spans[name] = (record["at"], record["n"])
+            neighbours[name] = record["neighbours"]
+        elif op == "remove":
+            name = record["name"]
+            gone.add(name)
+            added.pop(name, None)
+            spans.pop(name, None)
+            neighbours.pop(name, None)
+        elif op == "neighbours":
+            neighbours[record["name"]] = record["neighbours"]
+        elif op == "version":
+            state["version"] = record["v"]
+        state["records"] += 1
+    if gone:
+        keep = [i for i, name in enumerate(state["names"]) if name not in gone]
+        tf = state["tf"][keep]
+        names = [state["names"][i] for i in keep]
+        if added:
+            tf = _stack(tf, _read_rows(state["rows"], list(added.values())))
+            names += list(added)
+        state["names"], state["tf"] = names, tf
+    return end
+
+
+def _copy(state):
+    """Copie modifiable d'un état publié (lu sans verrou) : dictionnaires copiés, listes de voisins partagées."""
+    return dict(state, names=list(state["names"]), neighbours=dict(state["neighbours"]), spans=dict(state["spans"]))
+
+
+def _load():
+    """État à jour du journal, en ne lisant que les lignes ajoutées depuis le dernier chargement. Sous _lock."""
+    global _state
+    try:
+        st = GRAPH_LOG.stat()
+    except OSError:
+        _state = None
+        return None
+    state = _state
+    if state is not None and state["ino"] == st.st_ino and st.st_size == state["offset"]:
+        return state
+    if state is None or state["ino"] != st.st_ino or st.st_size < state["offset"]:
+        # Journal remplacé (compactage, reconstruction) : tout relire
+        state = _empty_state()
+        state["ino"] = st.st_ino
+    else:
+        state = _copy(state)
+    try:
+        with open(GRAPH_LOG, "rb") as f:
+            f.seek(state["offset"])
+            state["offset"] += _apply_log(state, f.read(st.st_size - state["offset"]))
+        if state["version"] is None:
+            raise ValueError("en-tête manquant")
+        if state["tf"].shape[0] != len(state["names"]) or set(state["names"]) != set(state["neighbours"]):
+            raise ValueError("vecteurs et graphe désynchronisés")
+        state["rows_size"] = (SIMILARITY_DIR / state["rows"]).stat().st_size
+    except Exception as e:
+        print(f"⚠️ Graphe de similarité illisible, reconstruction: {e}")
+        state = None
+    _state = state
+    return state
+
+
+def _append(state, records):
+    """Ajoute les enregistrements d'un lot au journal (une écriture). Sous file_lock("similarity")."""
+    payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+    with open(GRAPH_LOG, "ab") as f:
+        if f.tell() > state["offset"]:
+            # Fin de journal incomplète (arrêt brutal) : repartir sur une nouvelle ligne
+            payload = b"\n" + payload
+        f.write(payload)
+        state["offset"] = f.tell()
+    state["records"] += len(records)
+
+
+def _write_log(state):
+    """
+    Réécrit vecteurs et journal depuis l'état (reconstruction, compactage). Les vecteurs vont dans
+    un nouveau fichier, publié par le remplacement du journal. Sous file_lock("similarity").
+    """
+    SIMILARITY_DIR.mkdir(parents=True, exist_ok=True)
+    rows_file = f"vectors-{uuid.uuid4().hex[:8]}.bin"
+    with open(SIMILARITY_DIR / rows_file, "wb") as f:
+        spans = _write_rows(f, state["tf"], range(len(state["names"])))
+        rows_size = f.tell()
+    records = [{"op": "base", "v": state["version"], "top_k": TOP_K, "min_score": MIN_SCORE, "rows": rows_file}]
+    records += [{"op": "add", "name": name, "at": at, "n": n, "neighbours": state["neighbours"][name]}
+                for name, (at, n) in zip(state["names"], spans)]
+    tmp = tmp_path(GRAPH_LOG)
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, GRAPH_LOG)
+    st = GRAPH_LOG.stat()
+    state.update(spans=dict(zip(state["names"], spans)), rows=rows_file, rows_size=rows_size,
+                 ino=st.st_ino, offset=st.st_size, records=len(records))
+    # Anciens fichiers de vecteurs (lus seulement sous le même verrou) et ancien format
+    stale = [path for path in SIMILARITY_DIR.glob("vectors-*.bin") if path.name != rows_file]
+    for path in stale + list(_LEGACY_FILES):
+        try:
+            path.unlink()
+        except OSError:
+            pass  # absent, ou encore ouvert par un autre processus (Windows)
+
+
+# ---------------------------
+# Construction et mise à jour
+# ---------------------------
+
+def rebuild(metadata, version=0):
+    """Graphe complet (toutes les paires, par blocs de lignes) : première construction, migration."""
+    names = list(metadata)
+    tf = _tf_rows(names, [metadata[n] for n in names])
+    weighted = _weighted(tf)
+    neighbours = {}
+    for start in range(0, len(names), BLOCK):
+        scores = (weighted[start:start + BLOCK] @ weighted.T).toarray()
+        for offset, row in enumerate(scores):
+            neighbours[names[start + offset]] = [[names[j], s] for j, s in _top(row, start + offset)]
+    return dict(_empty_state(version), names=names, neighbours=neighbours, tf=tf)
+
+
+def _apply(state, version, changes):
+    """
+    Intègre les documents modifiés (entrée) ou supprimés (None) :
+      1. retrait des anciennes lignes et des arêtes vers ces documents ;
+      2. ajout des nouvelles lignes ;
+      3. un produit creux (corpus x documents touchés) donne les scores des nouveaux documents
+         et des documents qui ont perdu un voisin, dont la liste est recalculée ;
+      4. les nouveaux documents entrent dans les listes des autres s'ils battent leur k-ième voisin.
+    Les scores des listes non touchées gardent l'IDF du moment où ils ont été calculés.
+    """
+    names, neighbours = state["names"], state["neighbours"]
+    gone = set(changes)
+    keep = [i for i, name in enumerate(names) if name not in gone]
+    tf = state["tf"][keep] if len(keep) != len(names) else state["tf"]
+    names = [names[i] for i in keep]
+    neighbours = {name: list(neighbours[name]) for name in names}  # l'état en cache reste intact
+    affected = {name for name in names if any(other in gone for other, _ in neighbours[name])}
+
+    added = {name: entry for name, entry in changes.items() if entry is not None}
+    new_names = list(added)
+    if new_names:
+        tf = _stack(tf, _tf_rows(new_names, list(added.values())))
+        names = names + new_names
+    positions = {name: i for i, name in enumerate(names)}
+
+    targets = new_names + sorted(affected)
+    if targets:
+        weighted = _weighted(tf)
+        cols = [positions[name] for name in targets]
+        scores = (weighted @ weighted[cols].T).toarray().T
+        for name, col, row in zip(targets, cols, scores):
+            neighbours[name] = [[names[j], s] for j, s in _top(row, col)]
+        new_rows = {positions[name] for name in new_names}
+        for name, col, row in zip(new_names, cols, scores):
+            for j in np.flatnonzero(row >= MIN_SCORE).tolist():
+                other = names[j]
+                if j in new_rows or other in affected:
+                    continue
+                if _insert(neighbours[other], name, round(float(row[j]), 4)):
+                    affected.add(other)
+    state = dict(state, version=version, names=names, neighbours=neighbours, tf=tf)
+    # Listes de voisins recalculées ou complétées (à enregistrer), hors documents ajoutés
+    return state, affected
+
+
+def _insert(neighbours, name, score):
+    """Insère (name, score) dans une liste triée de voisins si le score y a sa place ; True si insérée."""
+    if len(neighbours) >= TOP_K and score <= neighbours[-1][1]:
+        return False
+    at = next((i for i, (_, s) in enumerate(neighbours) if score > s), len(neighbours))
+    neighbours.insert(at, [name, score])
+    del neighbours[TOP_K:]
+    return True
+
+
+def _persist(state, previous, changes, changed):
+    """Ajoute au journal les lignes du lot (vecteurs des documents ajoutés en fin de fichier)."""
+    records = [{"op": "remove", "name": name} for name in changes if name in previous["spans"]]
+    added = [name for name, entry in changes.items() if entry is not None]
+    first = len(state["names"]) - len(added)
+    with open(SIMILARITY_DIR / state["rows"], "ab") as f:
+        spans = _write_rows(f, state["tf"], range(first, len(state["names"])))
+        state["rows_size"] = f.tell()
+    for name in changes:
+        state["spans"].pop(name, None)
+    for name, (at, n) in zip(added, spans):
+        state["spans"][name] = (at, n)
+        records.append({"op": "add", "name": name, "at": at, "n": n, "neighbours": state["neighbours"][name]})
+    records += [{"op": "neighbours", "name": name, "neighbours": state["neighbours"][name]}
+                for name in sorted(changed)]
+    records.append({"op": "version", "v": state["version"]})
+    live = 8 * state["tf"].nnz
+    if (state["records"] + len(records) > COMPACT_RECORDS + 2 * len(state["names"])
+            or state["rows_size"] > 2 * live + COMPACT_BYTES):
+        _write_log(state)
+    else:
+        _append(state, records)
+
+
+def update_graph():
+    """
+    Met le graphe à jour avec les modifications des métadonnées depuis sa dernière version.
+    Coût proportionnel aux documents modifiés (et à ceux qui les avaient comme voisins),
+    y compris les écritures sur disque.
+    """
+    global _state
+    # Chemin rapide sans verrou : un état publié n'est jamais modifié (_apply en construit un nouveau)
+    state = _state
+    if state is not None and state["version"] == metadata_version():
+        cache_hit("similarity")
+        return state
+    with file_lock("similarity"), _lock:
+        state = _load()
+        version, changes = changed_since(state["version"] if state else 0,
+                                         known=state["names"] if state else ())
+        if state is not None and changes is not None and version == state["version"]:
+            cache_hit("similarity")
+            return state
+        cache_miss("similarity")
+        if state is None or changes is None:
+            state = rebuild(load_metadata(), version)
+            _write_log(state)
+            _state = state
+            return state
+        # Forcer la relecture du journal si l'écriture échoue
+        _state = None
+        previous = state
+        state, changed = _apply(_copy(previous), version, changes)
+        _persist(state, previous, changes, changed)
+        _state = state
+        return state
+
+
+@on_new_generation
+def _update_in_background(generation):
+    """Après une ingestion ou une suppression, met le graphe à jour hors de la requête."""
+    if BACKGROUND_UPDATE:
+        threading.Thread(target=update_graph, name=f"similarity-update-{generation}", daemon=True).start()
+
+
+# ---------------------------
+# Lecture
+# ---------------------------
+
+def similar_documents(name, k=TOP_K):
+    """Voisins d'un document : [{"name", "score"}] (score cosinus décroissant)."""
+    neighbours = update_graph()["neighbours"].get(name, [])
+    return [{"name": other, "score": score} for other, score in neighbours[:k]]
+
+
+def relations(limit=300):
+    """Arêtes du graphe, sans doublon (a-b et b-a) : [{"source", "target", "score"}], les plus fortes d'abord."""
+    edges = {}
+    for name, neighbours in update_graph()["neighbours"].items():
+        for other, score in neighbours:
+            key = (name, other) if name < other else (other, name)
+            edges[key] = max(score, edges.get(key, 0))
+    best = sorted(edges.items(), key=lambda e: (-e[1], e[0]))[:limit]
+    return [{"source": a, "target": b, "score": score} for (a, b), score in best]
@@ -0,0 +1,130 @@
+# stats_service.py
+# Instantanés des statistiques (une fois par génération du corpus) + ETag / 304
+from flask import request, jsonify
+import hashlib
+import json
+import os
+import threading
+
+from services.generation_service import current_generation, on_new_generation
+from services.metrics_service import cache_hit, cache_miss
+from services.visualisation_service import (
+    compute_visualisation_data,
+    stats_imports_by_date,
+    get_all_imports
+)
+
+# Recalcul en arrière-plan après chaque ingestion (désactivable)
+BACKGROUND_REFRESH = os.environ.get("STATS_BACKGROUND_REFRESH", "1").lower() not in ("0", "false", "no")
+
+_lock = threading.Lock()
+_snapshots = {}  # nom -> (génération, données, etag)
+
+
+# ---------------------------
+# Calcul des statistiques
+# ---------------------------
+
+def build_admin_stats():
+    """Statistiques globales de la page AdminStats."""
+    # Get visualisation data
+    viz_data = compute_visualisation_data()
+
+    # Get imports stats
+    imports = get_all_imports()
+    imports_stats = stats_imports_by_date(imports)
+
+    # Build by_date structure for compatibility
+    by_date_dict = {}
+    for stat in imports_stats:
+        by_date_dict[stat['date']] = stat.get('count', 0)
+
+    if by_date_dict:
+        sorted_items = sorted(by_date_dict.items())
+        by_date = {'labels': [k for k, _ in sorted_items], 'data': [v for _, v in sorted_items]}
+    else:
+        by_date = {'labels': [], 'data': []}
+
+    # Build by_type structure
+    by_type = {}
+    for word, count in viz_data.get('top_types', []):
+        by_type[word] = count
+
+    return {
+        'total_docs': viz_data.get('num_files', 0),
+        'total_words': viz_data.get('total_words', 0),
+        'total_size': round(viz_data.get('total_size_mo', 0) * 1024 * 1024),  # Convert back to bytes
+        'last_import': viz_data.get('last_import_date', 'Aucun'),
+        'by_type': by_type,
+        'by_date': by_date,
+        'top_words': viz_data.get('top_words', [])
+    }
+
+
+def build_wordcloud():
+    """Top mots au format {"mot": n, ...}."""
+    top_words = compute_visualisation_data().get('top_words', [])
+    return {word: count for word, count in top_words}
+
+
+def build_imports_stats():
+    """Imports par date (nombre, taille, types)."""
+    return stats_imports_by_date(get_all_imports())
+
+
+BUILDERS = {
+    "admin_stats": build_admin_stats,
+    "visualisation": compute_visualisation_data,
+    "imports": build_imports_stats,
+    "wordcloud": build_wordcloud,
+}
+
+
+# ---------------------------
+# Instantanés
+# ---------------------------
+
+def get_snapshot(name):
+    """
+    Retourne (données, etag) pour la génération courante du corpus.
+    Le calcul n'est fait qu'une fois par génération.
+    """
+    generation = current_generation()
+    cached = _snapshots.get(name)
+    if cached and cached[0] == generation:
+        cache_hit("stats_snapshot")
+        return cached[1], cached[2]
+    cache_miss("stats_snapshot")
+    data = BUILDERS[name]()
+    body = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    etag = f"{name}-g{generation}-{hashlib.sha1(body).hexdigest()[:16]}"
+    with _lock:
+        current = _snapshots.get(name)
+        if current is None or current[0] <= generation:
+            _snapshots[name] = (generation, data, etag)
+    return data, etag
+
+
+def snapshot_response(name):
+    """Réponse JSON avec ETag fort ; 304 Not Modified si le client a déjà cette version."""
+    data, etag = get_snapshot(name)
+    response = jsonify(data)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+def refresh_all():
+    """Recalcule tous les instantanés pour la génération courante."""
+    for name in BUILDERS:
+        try:
+            get_snapshot(name)
+        except Exception as e:
+            print(f"⚠️ Erreur recalcul statistiques '{name}': {e}")
+
+
+@on_new_generation
+def _refresh_in_background(generation):
+    """Après une ingestion, prépare les statistiques pour que le premier affichage soit rapide."""
+    if BACKGROUND_REFRESH:
+        threading.Thread(target=refresh_all, name=f"stats-refresh-{generation}", daemon=True).start()
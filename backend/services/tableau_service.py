@@ -0,0 +1,219 @@
+# tableau_service.py
+# Table en colonnes (pandas) des documents pour les statistiques d'administration :
+# une ligne par document (nom, type, taille, pages, tokens, caractères, date, langue), tenue à jour
+# depuis le journal des métadonnées (changed_since) : seules les lignes modifiées sont remplacées.
+# Regroupements, histogrammes et comptages filtrés sont vectorisés (masques, factorize + np.bincount,
+# np.histogram) : quelques millisecondes pour 50 000 documents.
+from datetime import datetime
+import threading
+import numpy as np
+import pandas as pd
+
+from services.facettes_service import doc_type
+from services.metadata_service import changed_since, load_metadata, metadata_version
+from services.metrics_service import cache_hit, cache_miss
+
+# Regroupements acceptés : colonne, ou date au jour / mois / année, ou tranches de taille / pages
+GROUPS = ("date", "month", "year", "type", "lang", "size", "pages")
+# Tranches de taille (octets) et de pages : bornes basses incluses (0 page = nombre inconnu, ignoré)
+SIZE_BINS = (0, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+SIZE_LABELS = ("<10 Ko", "10-100 Ko", "100 Ko-1 Mo", "1-10 Mo", "10-100 Mo", ">=100 Mo")
+PAGE_BINS = (1, 2, 11, 51)
+PAGE_LABELS = ("1", "2-10", "11-50", "51+")
+UNKNOWN = "inconnu"
+
+_lock = threading.Lock()
+_table = None    # DataFrame indexé par nom de document
+_version = None  # version des métadonnées intégrée
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _rows(entries):
+    """DataFrame des entrées {nom: métadonnées} (colonnes typées)."""
+    names = list(entries)
+    data = [entries[name] for name in names]
+    frame = pd.DataFrame({
+        "type": [doc_type(name, e) for name, e in zip(names, data)],
+        "size": [_number(e.get("size", e.get("size_bytes"))) for e in data],
+        "pages": [_number(e.get("num_pages")) for e in data],
+        "tokens": [_number(e.get("total_tokens_after")) for e in data],
+        "chars": [_number(e.get("char_count_after") or e.get("char_count_before")) for e in data],
+        "date": pd.to_datetime([e.get("date_import") for e in data], format="%Y-%m-%d", errors="coerce"),
+        "lang": [e.get("lang") or UNKNOWN for e in data],
+    }, index=pd.Index(names, name="name"))
+    frame["type"] = frame["type"].astype("category")
+    frame["lang"] = frame["lang"].astype("category")
+    return frame
+
+
+def _concat(table, added):
+    if table is None or table.empty:
+        return added
+    if added.empty:
+        return table
+    # Catégories réunies pour garder des colonnes catégorielles après concaténation
+    for column in ("type", "lang"):
+        categories = table[column].cat.categories.union(added[column].cat.categories)
+        table[column] = table[column].cat.set_categories(categories)
+        added[column] = added[column].cat.set_categories(categories)
+    return pd.concat([table, added])
+
+
+def document_table():
+    """
+    Table à jour des métadonnées. Seules les lignes des documents modifiés depuis la dernière
+    lecture sont recalculées ; la table retournée n'est jamais modifiée en place (remplacée).
+    """
+    global _table, _version
+    with _lock:
+        # Version inchangée : pas de parcours du journal
+        if _table is not None and metadata_version() == _version:
+            cache_hit("document_table")
+            return _table
+        version, changes = changed_since(_version if _version is not None else 0,
+                                         known=list(_table.index) if _table is not None else ())
+        if _table is not None and changes is not None and version == _version:
+            cache_hit("document_table")
+            return _table
+        cache_miss("document_table")
+        if _table is None or changes is None:
+            table = _rows(load_metadata())
+        else:
+            table = _table.drop(index=[n for n in changes if n in _table.index])
+            table = _concat(table, _rows({n: e for n, e in changes.items() if e is not None}))
+        _table, _version = table, version
+        return table
+
+
+# ---------------------------
+# Filtres et regroupements
+# ---------------------------
+
+def select(table, date_from=None, date_to=None, types=None, langs=None):
+    """Lignes retenues par les filtres (masques booléens vectorisés)."""
+    mask = np.ones(len(table), dtype=bool)
+    if date_from:
+        mask &= (table["date"] >= pd.Timestamp(date_from)).to_numpy()
+    if date_to:
+        mask &= (table["date"] <= pd.Timestamp(date_to)).to_numpy()
+    if types:
+        mask &= table["type"].isin([t.lower() for t in types]).to_numpy()
+    if langs:
+        mask &= table["lang"].isin(langs).to_numpy()
+    return table[mask]
+
+
+def _keys(table, group):
+    if group in ("date", "month", "year"):
+        # Dates tronquées au jour / mois / année (datetime64) : seules les clés des groupes sont formatées
+        return table["date"].to_numpy().astype("datetime64[%s]" % {"date": "D", "month": "M", "year": "Y"}[group])
+    if group == "size":
+        return pd.cut(table["size"], bins=list(SIZE_BINS) + [np.inf], labels=SIZE_LABELS, right=False)
+    if group == "pages":
+        return pd.cut(table["pages"], bins=list(PAGE_BINS) + [np.inf], labels=PAGE_LABELS, right=False)
+    return table[group]
+
+
+def _sums(codes, values, size):
+    return np.bincount(codes, weights=np.nan_to_num(values), minlength=size)
+
+
+def totals(table):
+    return {
+        "count": int(len(table)),
+        "size": int(table["size"].sum()),
+        "tokens": int(table["tokens"].sum()),
+        "chars": int(table["chars"].sum()),
+        "mean_size": float(round(table["size"].mean(), 1)) if len(table) and table["size"].notna().any() else 0,
+    }
+
+
+def breakdown(table, group, by_type=False):
+    """
+    [{"key", "count", "size", "tokens", ("types": {type: n})}] par valeur du regroupement,
+    dans l'ordre des clés (dates croissantes, tranches dans l'ordre). Documents sans date ignorés
+    pour les regroupements par date.
+    """
+    if group not in GROUPS:
+        raise ValueError(f"Regroupement inconnu '{group}' (attendu: {', '.join(GROUPS)})")
+    # Codes de groupe (-1 : valeur absente) puis sommes par np.bincount
+    codes, keys = pd.factorize(_keys(table, group), sort=True)
+    valid = codes >= 0
+    codes, width = codes[valid], len(keys)
+    counts = np.bincount(codes, minlength=width)
+    sizes = _sums(codes, table["size"].to_numpy()[valid], width)
+    tokens = _sums(codes, table["tokens"].to_numpy()[valid], width)
+    if by_type:
+        types = table["type"].cat.categories
+        type_codes = table["type"].cat.codes.to_numpy()[valid]
+        by_types = np.bincount(codes * len(types) + type_codes,
+                               minlength=width * len(types)).reshape(width, len(types))
+    result = []
+    for i in np.flatnonzero(counts).tolist():
+        item = {"key": str(keys[i]), "count": int(counts[i]), "size": int(sizes[i]), "tokens": int(tokens[i])}
+        if by_type:
+            item["types"] = {str(types[j]): int(by_types[i, j]) for j in np.flatnonzero(by_types[i]).tolist()}
+        result.append(item)
+    return result
+
+
+def histogram(table, column="size", bins=20, log=True):
+    """Histogramme d'une colonne numérique ({"edges", "counts"}), bornes logarithmiques par défaut."""
+    values = table[column].dropna().to_numpy()
+    values = values[values > 0] if log else values
+    if not len(values):
+        return {"edges": [], "counts": []}
+    if log:
+        edges = np.logspace(np.log10(values.min()), np.log10(values.max() + 1), bins + 1)
+    else:
+        edges = np.linspace(values.min(), values.max(), bins + 1)
+    counts, edges = np.histogram(values, bins=edges)
+    return {"edges": [round(float(e), 1) for e in edges], "counts": counts.tolist()}
+
+
+def parse_params(args):
+    """
+    Paramètres de /api/admin/analytics : group, date_from, date_to, type / types, lang,
+    bins (histogramme des tailles). ValueError si l'un d'eux est invalide.
+    """
+    def date(key):
+        value = (args.get(key) or "").strip()
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"Paramètre '{key}' attendu au format AAAA-MM-JJ")
+
+    def values(*keys):
+        joined = ",".join(v for key in keys for v in args.getlist(key))
+        return [v.strip() for v in joined.split(",") if v.strip()]
+
+    group = (args.get("group") or "date").strip().lower()
+    if group not in GROUPS:
+        raise ValueError(f"Regroupement inconnu '{group}' (attendu: {', '.join(GROUPS)})")
+    bins = (args.get("bins") or "20").strip()
+    if not bins.isdigit() or not 1 <= int(bins) <= 200:
+        raise ValueError("Paramètre 'bins' attendu entre 1 et 200")
+    return {
+        "group": group,
+        "filters": {"date_from": date("date_from"), "date_to": date("date_to"),
+                    "types": [t.lower() for t in values("type", "types")], "langs": values("lang")},
+        "bins": int(bins),
+    }
+
+
+def analytics(group="date", filters=None, bins=20):
+    """Totaux, regroupement (avec types) et histogramme des tailles des documents retenus par les filtres."""
+    table = select(document_table(), **(filters or {}))
+    return {
+        "totals": totals(table),
+        "groups": breakdown(table, group, by_type=True),
+        "size_histogram": histogram(table, "size", bins=bins),
+    }
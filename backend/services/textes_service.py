@@ -0,0 +1,285 @@
+# textes_service.py
+# Stockage compressé des textes (data/processed/raw_texts et clean_texts) :
+# un fichier <nom>.txt.z par document, texte découpé en blocs de BLOCK_CHARS caractères
+# compressés séparément (zlib), suivis de l'index des blocs :
+#
+#   [bloc 0][bloc 1]...[bloc n-1][débuts des blocs : (n + 1) x uint64][fin : position de l'index,
+#                                 nombre de caractères, BLOCK_CHARS, "TXZ1"]
+#
+# Écrit au fil de l'eau (mémoire bornée à un bloc), lu en entier ou par fenêtre : un extrait
+# (aperçu, détail d'un document) ne décompresse que les blocs qui le contiennent.
+# Les anciens fichiers <nom>.txt non compressés restent lisibles ; ils sont remplacés à la
+# prochaine écriture du document (ou par `python -m services.textes_service`).
+#
+# Le texte nettoyé n'est plus copié dans les métadonnées ("context") : detach_text le retire
+# des entrées comme detach_terms le fait pour les mots.
+from pathlib import Path
+import os
+import struct
+import zlib
+import numpy as np
+
+from services.metadata_service import load_metadata, transaction, upsert
+from services.verrou_service import tmp_path
+
+RAW_DIR = Path("data/processed/raw_texts")
+CLEAN_DIR = Path("data/processed/clean_texts")
+SUFFIX = ".txt.z"
+LEGACY_SUFFIX = ".txt"
+
+# Caractères par bloc : un extrait décompresse au plus ~BLOCK_CHARS caractères par bloc touché
+BLOCK_CHARS = 64 * 1024
+LEVEL = 6
+_MAGIC = b"TXZ1"
+_TRAILER = struct.Struct("<QQI4s")
+# Fichier tronqué ou abîmé (arrêt brutal, disque plein) : index, bloc zlib ou UTF-8 invalide
+_CORRUPT = (ValueError, zlib.error, struct.error)
+
+
+def text_path(directory, name):
+    return Path(directory) / f"{name}{SUFFIX}"
+
+
+def _legacy_path(directory, name):
+    return Path(directory) / f"{name}{LEGACY_SUFFIX}"
+
+
+# ---------------------------
+# Écriture
+# ---------------------------
+
+class TextWriter:
+    """
+    Écriture en flux d'un texte compressé (fichier temporaire puis rename à la fermeture).
+    S'utilise comme un fichier texte : write(), ou bloc with.
+    """
+
+    def __init__(self, directory, name):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = text_path(directory, name)
+        self._legacy = _legacy_path(directory, name)
+        self._tmp = tmp_path(self.path)
+        self._f = open(self._tmp, "wb")
+        self._offsets = [0]
+        self._pending = []
+        self._pending_chars = 0
+        self.chars = 0
+
+    def write(self, text):
+        self._pending.append(text)
+        self._pending_chars += len(text)
+        if self._pending_chars >= BLOCK_CHARS:
+            buffered = "".join(self._pending)
+            cut = len(buffered) - len(buffered) % BLOCK_CHARS
+            for start in range(0, cut, BLOCK_CHARS):
+                self._block(buffered[start:start + BLOCK_CHARS])
+            rest = buffered[cut:]
+            self._pending, self._pending_chars = ([rest] if rest else []), len(rest)
+
+    def _block(self, chunk):
+        data = zlib.compress(chunk.encode("utf-8"), LEVEL)
+        self._f.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self.chars += len(chunk)
+
+    def close(self):
+        """Termine le fichier et le publie (remplace aussi l'ancien .txt non compressé)."""
+        if self._f.closed:
+            return
+        if self._pending_chars:
+            self._block("".join(self._pending))
+        self._pending = []
+        self._f.write(np.asarray(self._offsets, dtype="<u8").tobytes())
+        self._f.write(_TRAILER.pack(self._offsets[-1], self.chars, BLOCK_CHARS, _MAGIC))
+        self._f.close()
+        os.replace(self._tmp, self.path)
+        if self._legacy.exists():
+            self._legacy.unlink()
+
+    def abort(self):
+        if not self._f.closed:
+            self._f.close()
+        if self._tmp.exists():
+            self._tmp.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def open_writer(directory, name):
+    return TextWriter(directory, name)
+
+
+def write_text(directory, name, text):
+    with open_writer(directory, name) as writer:
+        writer.write(text)
+
+
+# ---------------------------
+# Lecture
+# ---------------------------
+
+def _index(f):
+    """(débuts des blocs, nombre de caractères, caractères par bloc) d'un fichier ouvert."""
+    size = f.seek(0, os.SEEK_END)
+    if size < _TRAILER.size:
+        raise ValueError("fichier texte compressé tronqué")
+    f.seek(size - _TRAILER.size)
+    index_at, chars, block_chars, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+    if magic != _MAGIC or not block_chars or index_at > size - _TRAILER.size:
+        raise ValueError("fichier texte compressé invalide")
+    f.seek(index_at)
+    offsets = np.frombuffer(f.read(size - _TRAILER.size - index_at), dtype="<u8")
+    # Au moins un bloc par BLOCK_CHARS caractères, blocs contigus jusqu'à l'index
+    if (len(offsets) < -(-chars // block_chars) + 1 or offsets[0] != 0 or offsets[-1] != index_at
+            or np.any(np.diff(offsets.astype(np.int64)) < 0)):
+        raise ValueError("index des blocs invalide")
+    return offsets, chars, block_chars
+
+
+def _blocks(f, offsets, first, last):
+    f.seek(int(offsets[first]))
+    data = f.read(int(offsets[last + 1] - offsets[first]))
+    base = int(offsets[first])
+    return "".join(zlib.decompress(data[int(offsets[i]) - base:int(offsets[i + 1]) - base]).decode("utf-8")
+                   for i in range(first, last + 1))
+
+
+def _unreadable(path, error):
+    print(f"⚠️ Texte compressé illisible, ignoré: {path} ({error})")
+
+
+def read_text(directory, name):
+    """Texte complet d'un document, None s'il n'est pas stocké (ou si son fichier est illisible)."""
+    path = text_path(directory, name)
+    try:
+        with open(path, "rb") as f:
+            offsets, _, _ = _index(f)
+            return _blocks(f, offsets, 0, len(offsets) - 2) if len(offsets) > 1 else ""
+    except FileNotFoundError:
+        pass
+    except _CORRUPT as e:
+        # Traité comme absent : le document est réindexé sans texte plutôt que de faire échouer l'appelant
+        _unreadable(path, e)
+    try:
+        with open(_legacy_path(directory, name), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def read_window(directory, name, start=0, length=1000):
+    """
+    Caractères [start, start + length) d'un document (None s'il n'est pas stocké ou illisible) :
+    seuls les blocs qui recouvrent la fenêtre sont lus et décompressés.
+    """
+    path = text_path(directory, name)
+    try:
+        with open(path, "rb") as f:
+            offsets, chars, block_chars = _index(f)
+            end = min(start + length, chars)
+            if start >= end:
+                return ""
+            first, last = start // block_chars, (end - 1) // block_chars
+            return _blocks(f, offsets, first, last)[start - first * block_chars:end - first * block_chars]
+    except FileNotFoundError:
+        pass
+    except _CORRUPT as e:
+        _unreadable(path, e)
+    try:
+        with open(_legacy_path(directory, name), "r", encoding="utf-8") as f:
+            return f.read(start + length)[start:]
+    except FileNotFoundError:
+        return None
+
+
+def list_texts(directory):
+    """Noms des documents stockés dans directory (fichiers compressés et anciens .txt)."""
+    names = set()
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return []
+    for entry in entries:
+        if entry.name.endswith(SUFFIX):
+            names.add(entry.name[:-len(SUFFIX)])
+        elif entry.name.endswith(LEGACY_SUFFIX):
+            names.add(entry.name[:-len(LEGACY_SUFFIX)])
+    return sorted(names)
+
+
+def delete_text(directory, name):
+    """Supprime le texte d'un document ; retourne les chemins supprimés."""
+    deleted = []
+    for path in (text_path(directory, name), _legacy_path(directory, name)):
+        if path.exists():
+            path.unlink()
+            deleted.append(path)
+    return deleted
+
+
+# ---------------------------
+# Texte nettoyé des entrées de métadonnées
+# ---------------------------
+
+def detach_text(name, data, directory=CLEAN_DIR):
+    """
+    Retire 'context' d'une entrée de métadonnées et l'enregistre dans le stockage compressé.
+    Appelé avec l'enregistrement de l'entrée (même transaction) : texte et métadonnées restent
+    cohérents même si deux imports du même document se croisent. Retourne l'entrée allégée.
+    """
+    context = data.pop("context", None)
+    if context is not None:
+        write_text(directory, name, context)
+    return data
+
+
+def document_text(name, data=None, directory=CLEAN_DIR):
+    """Texte nettoyé d'un document : 'context' des anciennes entrées, sinon le stockage compressé."""
+    if data and data.get("context") is not None:
+        return data["context"]
+    return read_text(directory, name) or ""
+
+
+def document_window(name, data=None, start=0, length=1000, directory=CLEAN_DIR):
+    """Extrait du texte nettoyé (sans décompresser tout le document)."""
+    if data and data.get("context") is not None:
+        return data["context"][start:start + length]
+    return read_window(directory, name, start, length) or ""
+
+
+def compress_legacy(directory):
+    """Convertit les anciens fichiers .txt non compressés de directory ; retourne leur nombre."""
+    converted = 0
+    for entry in list(os.scandir(directory)) if Path(directory).exists() else []:
+        if entry.name.endswith(LEGACY_SUFFIX) and entry.is_file():
+            name = entry.name[:-len(LEGACY_SUFFIX)]
+            with open_writer(directory, name) as writer:
+                # Fichier lu fermé avant que close() ne le supprime (Windows)
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    for piece in iter(lambda: f.read(BLOCK_CHARS), ""):
+                        writer.write(piece)
+            converted += 1
+    return converted
+
+
+def detach_metadata_texts():
+    """Déplace le 'context' des anciennes entrées de métadonnées vers le stockage compressé."""
+    with transaction():
+        changed = {name: detach_text(name, entry) for name, entry in load_metadata().items() if "context" in entry}
+        if changed:
+            upsert(changed)
+    return len(changed)
+
+
+if __name__ == "__main__":
+    for folder in (RAW_DIR, CLEAN_DIR):
+        print(f"🗜️ {folder}: {compress_legacy(folder)} fichiers compressés")
+    print(f"🗜️ metadata: {detach_metadata_texts()} textes retirés des entrées")
@@ -0,0 +1,96 @@
+# verrou_service.py
+# Verrous inter-processus (fichiers .lock) : plusieurs workers peuvent modifier le corpus
+# sans perdre d'écritures. Réentrants dans un même thread.
+from pathlib import Path
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_DIR = Path("data/processed/locks")
+LOCK_TIMEOUT = float(os.environ.get("CORPUS_LOCK_TIMEOUT", "60"))
+
+
+class LockTimeout(TimeoutError):
+    """Le verrou n'a pas pu être obtenu dans le délai imparti."""
+
+
+_registry_lock = threading.Lock()
+_locks = {}  # nom -> {"thread": RLock, "depth": int, "fd": descripteur}
+
+
+def _entry(name):
+    with _registry_lock:
+        entry = _locks.get(name)
+        if entry is None:
+            entry = _locks[name] = {"thread": threading.RLock(), "depth": 0, "fd": None}
+        return entry
+
+
+def _try_lock(fd):
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(name, timeout=LOCK_TIMEOUT):
+    """
+    Verrou exclusif partagé entre processus (data/processed/locks/<name>.lock).
+    Un thread qui détient déjà le verrou peut le reprendre sans se bloquer.
+    """
+    entry = _entry(name)
+    deadline = time.monotonic() + timeout
+    if not entry["thread"].acquire(timeout=timeout):
+        raise LockTimeout(f"Verrou '{name}' indisponible après {timeout}s")
+    try:
+        if entry["depth"] == 0:
+            LOCK_DIR.mkdir(parents=True, exist_ok=True)
+            fd = os.open(str(LOCK_DIR / f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            delay = 0.001
+            while not _try_lock(fd):
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise LockTimeout(f"Verrou '{name}' indisponible après {timeout}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+            entry["fd"] = fd
+        entry["depth"] += 1
+        try:
+            yield
+        finally:
+            entry["depth"] -= 1
+            if entry["depth"] == 0:
+                fd, entry["fd"] = entry["fd"], None
+                try:
+                    _unlock(fd)
+                finally:
+                    os.close(fd)
+    finally:
+        entry["thread"].release()
+
+
+def tmp_path(path):
+    """Nom de fichier temporaire propre au processus et au thread (avant os.replace)."""
+    path = Path(path)
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
@@ -3,79 +3,35 @@ import json
 import os
 from pathlib import Path
 from datetime import datetime
-from collections import Counter, defaultdict
+import pandas as pd
+
+from services.aggregats_service import corpus_summary
+from services.inventaire_service import list_files
+from services.metadata_service import metadata_exists
+from services.similarite_service import relations as similarity_relations
 
 
 def compute_visualisation_data(metadata_path="data/processed/metadata.json"):
     path = Path(metadata_path)
-    if not path.exists():
+    if not metadata_exists(path):
         return {}
 
-    with open(path, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
-
-    # Exemple simple : agrégation des mots dans tous les fichiers
-    word_counts = {}
-    for fname, data in metadata.items():
-        for word, count in data.get("words", []):
-            word_counts[word] = word_counts.get(word, 0) + count
-
-    # Top mots
-    top_words = sorted(word_counts.items(), key=lambda x: x[1], reverse=True)[:50]
+    # Agrégats maintenus à l'ingestion / suppression : réponse en O(k)
+    summary = corpus_summary(k=50, num_types=5, metadata_path=path)
 
-    # Exemple simple de statistique : nombre de fichiers, nombre de mots totaux
-    num_files = len(metadata)
-    total_words = sum(word_counts.values())
-
-    # Calculer la taille totale et date du dernier import
-    total_size_bytes = 0
-    latest_date = None
-    type_counts = Counter()
-    corpus_dir = Path("data/corpus")
-    
-    for fname, data in metadata.items():
-        # Taille - chercher dans le corpus si non présent dans metadata
-        size = data.get("size", data.get("size_bytes", 0))
-        if size == 0 and corpus_dir.exists():
-            # Chercher le fichier dans le corpus
-            found = list(corpus_dir.rglob(fname))
-            if found:
-                size = found[0].stat().st_size
-        total_size_bytes += size
-        
-        # Date d'import
-        date_str = data.get("date_import")
-        if date_str:
-            try:
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                if latest_date is None or date_obj > latest_date:
-                    latest_date = date_obj
-            except:
-                pass
-        
-        # Type de document
-        doc_type = data.get("type", "inconnu")
-        type_counts[doc_type] += 1
-    
     # Convertir la taille en Mo
-    total_size_mo = round(total_size_bytes / (1024 * 1024), 2)
-    
-    # Formater la date du dernier import
-    last_import_date = latest_date.strftime("%Y-%m-%d") if latest_date else "Aucun"
-    
-    # Top 5 types les plus importés
-    top_types = type_counts.most_common(5)
+    total_size_mo = round(summary["total_size"] / (1024 * 1024), 2)
 
-    # Exemple relation documents (ici vide pour simplifier)
-    relations = []
+    # Arêtes du graphe de similarité (k plus proches voisins TF-IDF, mis à jour incrémentalement)
+    relations = similarity_relations()
 
     return {
-        "top_words": top_words,
-        "num_files": num_files,
-        "total_words": total_words,
+        "top_words": summary["top_words"],
+        "num_files": summary["num_files"],
+        "total_words": summary["total_words"],
         "total_size_mo": total_size_mo,
-        "last_import_date": last_import_date,
-        "top_types": top_types,
+        "last_import_date": summary["last_import_date"] or "Aucun",
+        "top_types": summary["top_types"],
         "relations": relations
     }
 
@@ -88,21 +44,22 @@ def stats_imports_by_date(imports):
         ...
     ]
     """
-    data = defaultdict(lambda: {"count": 0, "size": 0, "types": Counter()})
-    for imp in imports:
-        date = imp["date"]
-        data[date]["count"] += 1
-        data[date]["size"] += imp["size"]
-        data[date]["types"][imp["type"]] += 1
+    # Regroupement vectorisé (pandas) plutôt qu'une boucle de dictionnaires
+    frame = pd.DataFrame(list(imports), columns=["date", "type", "size"])
+    if frame.empty:
+        return []
+    grouped = frame.groupby("date", sort=True)["size"].agg(["count", "sum"])
+    types = pd.crosstab(frame["date"], frame["type"])
 
     # Transformer en liste triée
     result = []
-    for date, info in sorted(data.items()):
+    for date, count, size in zip(grouped.index, grouped["count"], grouped["sum"]):
+        counts = types.loc[date]
         result.append({
             "date": date,
-            "count": info["count"],
-            "size": info["size"],
-            "types": dict(info["types"])
+            "count": int(count),
+            "size": int(size),
+            "types": {t: int(n) for t, n in counts[counts > 0].items()}
         })
     return result
 
@@ -110,30 +67,15 @@ def stats_imports_by_date(imports):
 
 def get_all_imports(base_dir="data/corpus"):
     """
-    Simule la récupération des métadonnées d'import depuis le dossier corpus.
+    Récupère les métadonnées d'import depuis le dossier corpus.
     Retourne une liste de dictionnaires :
     [
       {"name": "fichier.txt", "type": "txt", "size": 12345, "date": "2025-11-03"},
       ...
     ]
     """
-    imports = []
-    base = Path(base_dir)
-    if not base.exists():
-        return imports
-
-    for file in base.rglob("*"):
-        if file.is_file():
-            # type du fichier (extension)
-            ext = file.suffix.lower().replace(".", "") or "inconnu"
-            # taille
-            size = file.stat().st_size
-            # date de modification -> utilisée comme date d'import
-            date = datetime.fromtimestamp(file.stat().st_mtime).strftime("%Y-%m-%d")
-            imports.append({
-                "name": file.name,
-                "type": ext,
-                "size": size,
-                "date": date
-            })
-    return imports
+    # Inventaire os.scandir en cache : seuls les dossiers modifiés sont relus
+    return [
+        {"name": f["name"], "type": f["type"], "size": f["size"], "date": f["date"]}
+        for f in list_files(base_dir)
+    ]
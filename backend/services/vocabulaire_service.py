@@ -0,0 +1,252 @@
+# vocabulaire_service.py
+# Vocabulaire global (terme -> id) et comptages par document en tableaux d'entiers
+from pathlib import Path
+import os
+import threading
+import numpy as np
+
+from services.verrou_service import file_lock, tmp_path
+
+VOCAB_FILE = Path("data/processed/vocabulary.txt")
+TERMS_DIR = Path("data/processed/terms")
+
+# En-tête des fichiers .bin : magic, version, nb de mots, nb de bigrammes (uint32)
+_MAGIC = 0x31435654  # "TVC1"
+_VERSION = 1
+_DTYPE = np.dtype("<u4")
+
+_lock = threading.Lock()
+_terms = []       # id -> terme
+_ids = {}         # terme -> id
+_loaded_bytes = 0  # partie du fichier vocabulaire déjà chargée
+
+
+# ---------------------------
+# Vocabulaire
+# ---------------------------
+
+def _refresh():
+    """Charge les termes ajoutés au fichier depuis la dernière lecture (appelé sous _lock)."""
+    global _loaded_bytes
+    if not VOCAB_FILE.exists():
+        if _loaded_bytes:
+            # Fichier supprimé (réinitialisation du corpus)
+            _terms.clear()
+            _ids.clear()
+            _loaded_bytes = 0
+        return
+    size = VOCAB_FILE.stat().st_size
+    if size < _loaded_bytes:
+        # Fichier recréé : tout recharger
+        _terms.clear()
+        _ids.clear()
+        _loaded_bytes = 0
+    if size == _loaded_bytes:
+        return
+    with open(VOCAB_FILE, "rb") as f:
+        f.seek(_loaded_bytes)
+        data = f.read(size - _loaded_bytes)
+    # Ignorer une éventuelle ligne incomplète en fin de fichier
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].decode("utf-8").split("\n")[:-1]:
+        _ids[line] = len(_terms)
+        _terms.append(line)
+    _loaded_bytes += end
+
+
+def term_ids(terms, create=True):
+    """
+    Retourne les ids des termes. Les termes inconnus sont ajoutés au
+    vocabulaire si create=True, sinon leur id vaut None.
+    """
+    terms = list(terms)
+    with _lock:
+        _refresh()
+        result = [_ids.get(term) for term in terms]
+        if not create or None not in result:
+            return result
+        # Nouveaux termes : verrou de fichier pour que deux workers n'attribuent
+        # pas le même id, et relecture des termes ajoutés par les autres
+        with file_lock("vocabulary"):
+            _refresh()
+            new_terms = []
+            result = []
+            for term in terms:
+                tid = _ids.get(term)
+                if tid is None:
+                    tid = len(_terms)
+                    _ids[term] = tid
+                    _terms.append(term)
+                    new_terms.append(term)
+                result.append(tid)
+            if new_terms:
+                _append_terms(new_terms)
+        return result
+
+
+def _append_terms(new_terms):
+    """Ajoute les nouveaux termes en fin de fichier (appelé sous _lock et le verrou 'vocabulary')."""
+    global _loaded_bytes
+    VOCAB_FILE.parent.mkdir(parents=True, exist_ok=True)
+    data = "".join(f"{t}\n" for t in new_terms).encode("utf-8")
+    with open(VOCAB_FILE, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    _loaded_bytes += len(data)
+
+
+def get_terms(ids):
+    """Retourne les termes correspondant à une liste d'ids."""
+    with _lock:
+        _refresh()
+        return [_terms[i] for i in ids]
+
+
+def vocabulary():
+    """Retourne la liste de tous les termes connus (index = id)."""
+    with _lock:
+        _refresh()
+        return list(_terms)
+
+
+def vocabulary_size():
+    with _lock:
+        _refresh()
+        return len(_terms)
+
+
+# ---------------------------
+# Comptages par document
+# ---------------------------
+
+def _terms_file(name):
+    return TERMS_DIR / f"{name}.bin"
+
+
+def encode_counts(words, bigrams):
+    """
+    Convertit les listes [(mot, n)] et [("mot1 mot2", n)] en tableaux triés :
+    (word_ids, word_counts, bigram_ids (n x 2), bigram_counts).
+    """
+    words = list(words)
+    bigrams = list(bigrams)
+    pairs = [bg.split(" ", 1) for bg, _ in bigrams]
+    ids = term_ids([w for w, _ in words] + [t for pair in pairs for t in pair])
+
+    word_ids = np.array(ids[:len(words)], dtype=_DTYPE)
+    word_counts = np.array([c for _, c in words], dtype=_DTYPE)
+    order = np.argsort(word_ids, kind="stable")
+    word_ids, word_counts = word_ids[order], word_counts[order]
+
+    bigram_ids = np.array(ids[len(words):], dtype=_DTYPE).reshape(-1, 2)
+    bigram_counts = np.array([c for _, c in bigrams], dtype=_DTYPE)
+    if len(bigram_ids):
+        order = np.lexsort((bigram_ids[:, 1], bigram_ids[:, 0]))
+        bigram_ids, bigram_counts = bigram_ids[order], bigram_counts[order]
+    return word_ids, word_counts, bigram_ids, bigram_counts
+
+
+def save_document_terms(name, words, bigrams):
+    """Écrit les comptages d'un document au format binaire (écriture atomique)."""
+    word_ids, word_counts, bigram_ids, bigram_counts = encode_counts(words, bigrams)
+    header = np.array([_MAGIC, _VERSION, len(word_ids), len(bigram_counts)], dtype=_DTYPE)
+    TERMS_DIR.mkdir(parents=True, exist_ok=True)
+    path = _terms_file(name)
+    tmp = tmp_path(path)
+    with open(tmp, "wb") as f:
+        for arr in (header, word_ids, word_counts, bigram_ids.ravel(), bigram_counts):
+            f.write(arr.tobytes())
+    os.replace(tmp, path)
+
+
+def load_document_terms(name):
+    """
+    Lit les comptages binaires d'un document.
+    Retourne (word_ids, word_counts, bigram_ids (n x 2), bigram_counts) ou None.
+    """
+    path = _terms_file(name)
+    if not path.exists():
+        return None
+    buf = np.fromfile(path, dtype=_DTYPE)
+    if len(buf) < 4 or buf[0] != _MAGIC:
+        return None
+    n_words, n_bigrams = int(buf[2]), int(buf[3])
+    pos = 4
+    word_ids = buf[pos:pos + n_words]
+    pos += n_words
+    word_counts = buf[pos:pos + n_words]
+    pos += n_words
+    bigram_ids = buf[pos:pos + 2 * n_bigrams].reshape(-1, 2)
+    pos += 2 * n_bigrams
+    bigram_counts = buf[pos:pos + n_bigrams]
+    return word_ids, word_counts, bigram_ids, bigram_counts
+
+
+def delete_document_terms(name):
+    """Supprime le fichier de comptages d'un document (s'il existe)."""
+    path = _terms_file(name)
+    if path.exists():
+        path.unlink()
+        return True
+    return False
+
+
+def detach_terms(name, data):
+    """
+    Retire 'words' et 'bigrams' d'une entrée de métadonnées et les enregistre
+    dans le stockage binaire. Retourne l'entrée allégée.
+    """
+    if "words" in data or "bigrams" in data:
+        save_document_terms(name, data.pop("words", []), data.pop("bigrams", []))
+    return data
+
+
+def document_counts(name, data=None):
+    """
+    Retourne (word_ids, word_counts) d'un document, depuis le stockage binaire
+    ou, pour les anciennes entrées, depuis la liste 'words' des métadonnées.
+    """
+    if data and data.get("words"):
+        words = data["words"]
+        ids = np.array(term_ids([w for w, _ in words]), dtype=_DTYPE)
+        counts = np.array([c for _, c in words], dtype=_DTYPE)
+        return ids, counts
+    stored = load_document_terms(name)
+    if stored is None:
+        return np.zeros(0, dtype=_DTYPE), np.zeros(0, dtype=_DTYPE)
+    return stored[0], stored[1]
+
+
+def _top_pairs(labels, counts, limit):
+    order = np.argsort(-counts.astype(np.int64), kind="stable")
+    if limit is not None:
+        order = order[:limit]
+    return [[labels[i], int(counts[i])] for i in order]
+
+
+def document_words(name, data=None, limit=None):
+    """Liste [[mot, n]] d'un document, triée par fréquence décroissante."""
+    if data and data.get("words"):
+        words = sorted(data["words"], key=lambda x: x[1], reverse=True)
+        return [list(w) for w in (words[:limit] if limit is not None else words)]
+    stored = load_document_terms(name)
+    if stored is None:
+        return []
+    word_ids, word_counts = stored[0], stored[1]
+    return _top_pairs(get_terms(word_ids.tolist()), word_counts, limit)
+
+
+def document_bigrams(name, data=None, limit=None):
+    """Liste [["mot1 mot2", n]] d'un document, triée par fréquence décroissante."""
+    if data and data.get("bigrams"):
+        bigrams = sorted(data["bigrams"], key=lambda x: x[1], reverse=True)
+        return [list(b) for b in (bigrams[:limit] if limit is not None else bigrams)]
+    stored = load_document_terms(name)
+    if stored is None:
+        return []
+    bigram_ids, bigram_counts = stored[2], stored[3]
+    firsts = get_terms(bigram_ids[:, 0].tolist())
+    seconds = get_terms(bigram_ids[:, 1].tolist())
+    labels = [f"{a} {b}" for a, b in zip(firsts, seconds)]
+    return _top_pairs(labels, bigram_counts, limit)
@@ -0,0 +1,35 @@
+# Les services s'importent comme depuis backend/ (from services.x import ...) et écrivent
+# dans data/... relatif au répertoire courant : chaque test travaille dans un dossier temporaire.
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    from services import metadata_service, vocabulaire_service
+
+    monkeypatch.chdir(tmp_path)
+    # Caches indexés par chemin relatif : rien ne doit venir du dossier d'un autre test
+    monkeypatch.setattr(metadata_service, "_caches", {})
+    monkeypatch.setattr(vocabulaire_service, "_terms", [])
+    monkeypatch.setattr(vocabulaire_service, "_ids", {})
+    monkeypatch.setattr(vocabulaire_service, "_loaded_bytes", 0)
+    return tmp_path
+
+
+@pytest.fixture
+def index(workdir, monkeypatch):
+    """Module de l'index de recherche, vide, dans le dossier du test."""
+    from services import recherche_service
+
+    # Segments ouverts et vue indexés par id : propres à chaque dossier de test
+    monkeypatch.setattr(recherche_service, "_segments", {})
+    monkeypatch.setattr(recherche_service, "_current", None)
+    monkeypatch.setattr(recherche_service, "BACKGROUND_BUILD", False)
+    # Fusions lancées explicitement par les tests
+    monkeypatch.setattr(recherche_service, "_schedule_merge", lambda: None)
+    return recherche_service
@@ -0,0 +1,72 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from services import aggregats_service as aggregats
+from services import metadata_service as metadata
+from services.verrou_service import LOCK_DIR
+
+
+@pytest.fixture
+def corpus(workdir, monkeypatch):
+    monkeypatch.setattr(aggregats, "_state", None)
+    monkeypatch.setattr(aggregats, "_state_stamp", None)
+    metadata.upsert({
+        "a.txt": {"type": "txt", "size": 10, "date_import": "2025-01-02", "words": [["chat", 3], ["chien", 1]]},
+        "b.pdf": {"type": "pdf", "size": 20, "date_import": "2025-01-03", "words": [["chat", 2]]},
+    })
+    return aggregats
+
+
+def test_summary_and_incremental_changes(corpus):
+    summary = corpus.corpus_summary()
+    assert summary["top_words"] == [("chat", 5), ("chien", 1)]
+    assert summary["num_files"] == 2 and summary["total_size"] == 30
+    before = corpus._current()
+
+    entry = {"type": "txt", "size": 5, "date_import": "2025-02-01", "words": [["chien", 4]]}
+    with metadata.transaction():
+        metadata.upsert({"c.txt": entry})
+        corpus.apply_changes(added=[corpus.document_contribution("c.txt", entry)])
+    summary = corpus.corpus_summary()
+    assert summary["top_words"] == [("chat", 5), ("chien", 5)]
+    assert summary["last_import_date"] == "2025-02-01"
+    # L'état déjà retourné n'a pas été modifié en place
+    assert before["num_files"] == 2 and int(before["totals"].sum()) == 6
+
+
+def test_write_outside_module_triggers_rebuild(corpus):
+    corpus.corpus_summary()
+    metadata.remove(["a.txt"])
+    assert corpus.corpus_summary()["top_words"] == [("chat", 2)]
+    assert len(corpus.live_term_ids()) == 1
+
+
+def test_fresh_read_does_not_wait_for_metadata_lock(corpus):
+    pytest.importorskip("fcntl")
+    corpus.corpus_summary()
+    LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    # Un autre worker détient le verrou des métadonnées (import en cours)
+    holder = subprocess.Popen(
+        [sys.executable, "-c",
+         "import fcntl, sys, time\n"
+         "f = open(sys.argv[1], 'a')\n"
+         "fcntl.flock(f, fcntl.LOCK_EX)\n"
+         "print('ok', flush=True)\n"
+         "time.sleep(float(sys.argv[2]))\n",
+         str(LOCK_DIR / "metadata.lock"), "2"],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == "ok"
+        result = {}
+        reader = threading.Thread(target=lambda: result.update(corpus.corpus_summary()))
+        reader.start()
+        reader.join(1)
+        assert not reader.is_alive()
+        assert result["num_files"] == 2
+    finally:
+        holder.kill()
+        holder.wait()
@@ -0,0 +1,138 @@
+import math
+import random
+
+import numpy as np
+
+from services import doublons_service as doublons
+
+
+def _sets(rng, size, jaccard):
+    """Deux ensembles de chaînes de Jaccard exact `jaccard` (union de `size` éléments)."""
+    items = [f"mot{rng.getrandbits(48):x} {i}" for i in range(size)]
+    common = round(size * jaccard)
+    rest = items[common:]
+    half = len(rest) // 2
+    a = set(items[:common]) | set(rest[:half])
+    b = set(items[:common]) | set(rest[half:])
+    return a, b, len(a & b) / len(a | b)
+
+
+def test_permutations_match_exact_arithmetic():
+    rng = np.random.RandomState(7)
+    hashes = rng.randint(0, 1 << 32, size=64, dtype=np.uint64)
+    hashes[:2] = (0, (1 << 32) - 1)
+    permuted = doublons._permute(hashes)
+    for i, h in enumerate(hashes.tolist()):
+        expected = [(a * h + b) % doublons._PRIME for a, b in zip(doublons._A.tolist(), doublons._B.tolist())]
+        assert permuted[i].tolist() == expected
+
+
+def test_coefficients_span_the_field():
+    # a et b ne sont pas limités à 2^31 : sinon a * h < p et les permutations sont corrélées
+    assert int(doublons._A.max()) > 1 << 60
+    assert int(doublons._B.max()) > 1 << 60
+    assert int(doublons._A.min()) >= 1
+
+
+def test_estimated_jaccard_within_three_sigma():
+    rng = random.Random(2024)
+    errors = []
+    for target in (0.1, 0.3, 0.5, 0.7, 0.8, 0.9, 0.95):
+        for _ in range(5):
+            a, b, exact = _sets(rng, 600, target)
+            estimate = doublons.jaccard(doublons.minhash(a), doublons.minhash(b))
+            sigma = math.sqrt(exact * (1 - exact) / doublons.NUM_PERM)
+            assert abs(estimate - exact) <= 3 * sigma + 1e-9, (exact, estimate)
+            errors.append(estimate - exact)
+    # Estimateur sans biais : l'erreur moyenne reste petite devant sigma
+    assert abs(sum(errors) / len(errors)) < 0.02
+
+
+def test_signature_roundtrip_and_old_versions():
+    sig = doublons.signature("le chat dort sur le tapis rouge".split())
+    assert doublons.decode(doublons.encode(sig)).tolist() == sig.tolist()
+    # Signature sans version (ancienne famille de hachage) : ignorée, recalculée depuis le texte
+    legacy = doublons.encode(sig).split(":", 1)[1]
+    assert doublons.decode(legacy) is None
+    assert doublons.signature([]) is None
+
+
+def test_identical_and_disjoint_texts():
+    text = "un deux trois quatre cinq six sept huit neuf dix".split()
+    other = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+    assert doublons.jaccard(doublons.signature(text), doublons.signature(list(text))) == 1.0
+    assert doublons.jaccard(doublons.signature(text), doublons.signature(other)) < 0.1
+
+
+def _entries(texts):
+    return {name: {"minhash": doublons.text_signature(text)} for name, text in texts.items()}
+
+
+def _upsert(entries):
+    from services.metadata_service import upsert
+    upsert(entries)
+
+
+BASE = " ".join(f"mot{i}" for i in range(200))
+
+
+def test_log_is_append_only_and_reloaded(workdir, monkeypatch):
+    from services.metadata_service import remove
+
+    monkeypatch.setattr(doublons, "_state", None)
+    _upsert(_entries({"a.txt": BASE, "autre.txt": "rien à voir avec le reste du corpus ici"}))
+    doublons.update_duplicates()
+    before = doublons.DUPLICATES_LOG.read_bytes()
+
+    # Copie légèrement modifiée : seules ses lignes sont ajoutées au journal
+    _upsert(_entries({"b.txt": BASE + " fin"}))
+    assert doublons.duplicates_of_many(["b.txt"])["b.txt"][0]["name"] == "a.txt"
+    after = doublons.DUPLICATES_LOG.read_bytes()
+    assert after.startswith(before) and len(after.splitlines()) == len(before.splitlines()) + 2
+
+    remove(["a.txt"])
+    assert doublons.duplicates_of("b.txt") == []
+    pairs = doublons.update_duplicates()["pairs"]
+
+    # Un autre processus relit le journal : même état
+    monkeypatch.setattr(doublons, "_state", None)
+    reloaded = doublons.update_duplicates()
+    assert reloaded["pairs"] == pairs
+    assert sorted(reloaded["lsh"].signatures) == ["autre.txt", "b.txt"]
+
+
+def test_published_state_is_not_modified(workdir, monkeypatch):
+    monkeypatch.setattr(doublons, "_state", None)
+    _upsert(_entries({"a.txt": BASE, "b.txt": BASE + " fin"}))
+    first = doublons.update_duplicates()
+    snapshot = {name: dict(linked) for name, linked in first["pairs"].items()}
+    _upsert(_entries({"c.txt": BASE + " autre fin"}))
+    assert "c.txt" in doublons.update_duplicates()["pairs"]
+    assert first["pairs"] == snapshot
+
+
+def test_compaction_rewrites_log(workdir, monkeypatch):
+    monkeypatch.setattr(doublons, "_state", None)
+    monkeypatch.setattr(doublons, "COMPACT_RECORDS", 0)
+    _upsert(_entries({"a.txt": BASE}))
+    doublons.update_duplicates()
+    for i in range(3):
+        _upsert(_entries({"a.txt": BASE + f" version {i}"}))
+        doublons.update_duplicates()
+    lines = doublons.DUPLICATES_LOG.read_text(encoding="utf-8").splitlines()
+    assert len(lines) <= 3
+    monkeypatch.setattr(doublons, "_state", None)
+    assert list(doublons.update_duplicates()["lsh"].signatures) == ["a.txt"]
+
+
+def test_unchanged_metadata_reads_without_lock(workdir, monkeypatch):
+    monkeypatch.setattr(doublons, "_state", None)
+    _upsert(_entries({"a.txt": BASE, "b.txt": BASE + " fin"}))
+    doublons.update_duplicates()
+
+    def locked(name, *args, **kwargs):
+        raise AssertionError(f"verrou {name} pris en lecture")
+
+    monkeypatch.setattr(doublons, "file_lock", locked)
+    assert doublons.representatives() == {"a.txt": "a.txt", "b.txt": "a.txt"}
+    assert doublons.duplicates_of("a.txt")[0]["name"] == "b.txt"
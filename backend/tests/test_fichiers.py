@@ -0,0 +1,66 @@
+import html
+import re
+
+from flask import Flask
+
+from services.fichiers_service import _page_bounds, txt_viewer_response
+
+
+def _pages(path, page_bytes):
+    first = _page_bounds(path, 0, page_bytes)
+    return [_page_bounds(path, p, page_bytes) for p in range(first[3])]
+
+
+def _body(path, page, page_bytes):
+    with Flask(__name__).test_request_context(f"/view?page={page}"):
+        response = txt_viewer_response(path, "doc.txt", page, page_bytes)
+        return "".join(response.response)
+
+
+def test_pages_end_on_line_boundaries(workdir):
+    path = workdir / "doc.txt"
+    path.write_bytes(b"".join(b"ligne %03d\n" % i for i in range(100)))  # 10 octets par ligne
+    pages = _pages(path, 64)
+    # Chaque page commence à la première ligne qui suit sa limite nominale
+    assert [p[1] for p in pages] == [-(-p * 64 // 10) * 10 for p in range(16)]
+    assert pages[-1][2] == 1000
+    for _, start, end, _ in pages:
+        assert end > start and start % 10 == 0
+
+
+def test_long_line_is_cut_at_page_size(workdir):
+    path = workdir / "doc.txt"
+    text = "é" * 300_000 + "\nfin\n"  # une seule longue ligne de 600 Ko
+    path.write_bytes(text.encode("utf-8"))
+    page_bytes = 256 * 1024
+    pages = _pages(path, page_bytes)
+    assert len(pages) == 3
+    assert pages[0][1:3] == (0, page_bytes)
+    for _, start, end, _ in pages:
+        assert 0 < end - start <= 2 * page_bytes
+
+    # Aucune page vide, aucun caractère coupé entre deux pages, texte complet
+    parts = [re.search(r"<pre>(.*)</pre>", _body(path, p, page_bytes), re.S).group(1) for p in range(3)]
+    assert all(parts) and "�" not in "".join(parts)
+    assert html.unescape("".join(parts)) == text
+    assert "Page 3 / 3" in _body(path, 2, page_bytes)
+
+
+def test_odd_page_size_keeps_utf8_characters(workdir):
+    path = workdir / "doc.txt"
+    path.write_bytes(("aé€" * 1000).encode("utf-8"))
+    pages = _pages(path, 7)
+    data = path.read_bytes()
+    assert pages[-1][2] == len(data)
+    for (_, start, end, _), following in zip(pages, pages[1:]):
+        assert end == following[1]
+        data[start:end].decode("utf-8")
+
+
+def test_trailing_newline_does_not_add_empty_page(workdir):
+    path = workdir / "doc.txt"
+    path.write_bytes(b"a" * 15 + b"\n" + b"b" * 3 + b"\n")
+    pages = _pages(path, 10)
+    assert [p[1:3] for p in pages] == [(0, 16), (16, 20)]
+    # Page demandée hors limites : dernière page
+    assert _page_bounds(path, 5, 10)[:3] == (1, 16, 20)
@@ -0,0 +1,38 @@
+from services import inventaire_service as inventaire
+from services.generation_service import GENERATION_FILE
+
+
+def _sizes(base):
+    return {f["name"]: f["size"] for f in inventaire.list_files(base)}
+
+
+def test_unchanged_directories_are_not_rescanned(workdir):
+    corpus = workdir / "data" / "corpus"
+    (corpus / "sous").mkdir(parents=True)
+    (corpus / "a.txt").write_text("a")
+    (corpus / "sous" / "b.txt").write_text("bb")
+    files, version = inventaire.list_files_versioned(corpus)
+    assert {f["name"]: f["size"] for f in files} == {"a.txt": 1, "b.txt": 2}
+    assert inventaire.list_files_versioned(corpus)[1] == version
+
+    (corpus / "c.txt").write_text("ccc")
+    files, newer = inventaire.list_files_versioned(corpus)
+    assert newer != version and len(files) == 3
+
+
+def test_file_rewritten_in_place(workdir):
+    corpus = workdir / "data" / "corpus"
+    corpus.mkdir(parents=True)
+    (corpus / "a.txt").write_text("a")
+    assert _sizes(corpus) == {"a.txt": 1}
+
+    # Même processus : invalidate() après la réécriture
+    (corpus / "a.txt").write_text("aa")
+    inventaire.invalidate(corpus, corpus)
+    assert _sizes(corpus) == {"a.txt": 2}
+
+    # Autre worker : réécriture puis nouvelle génération publiée, sans invalidate() ici
+    (corpus / "a.txt").write_text("aaa")
+    GENERATION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    GENERATION_FILE.write_text("42")
+    assert _sizes(corpus) == {"a.txt": 3}
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from services import metadata_service as metadata
+from services.verrou_service import LOCK_DIR
+
+
+def test_log_and_changed_since(workdir):
+    metadata.upsert({"a.txt": {"size": 1}, "b.txt": {"size": 2}})
+    start = metadata.metadata_version()
+    metadata.upsert({"a.txt": {"size": 3}})
+    metadata.remove(["b.txt"])
+    version, changes = metadata.changed_since(start, known=["a.txt", "b.txt"])
+    assert version == metadata.metadata_version() == start + 2
+    assert changes == {"a.txt": {"size": 3}, "b.txt": None}
+    # Relecture complète (autre processus) : même contenu
+    metadata._caches.clear()
+    assert metadata.load_metadata() == {"a.txt": {"size": 3}}
+
+
+def test_waiting_writer_does_not_block_readers(workdir):
+    pytest.importorskip("fcntl")
+    metadata.upsert({"a.txt": {"size": 1}})
+    LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    # Un autre worker détient le verrou des métadonnées
+    holder = subprocess.Popen(
+        [sys.executable, "-c",
+         "import fcntl, sys, time\n"
+         "f = open(sys.argv[1], 'a')\n"
+         "fcntl.flock(f, fcntl.LOCK_EX)\n"
+         "print('ok', flush=True)\n"
+         "time.sleep(float(sys.argv[2]))\n",
+         str(LOCK_DIR / "metadata.lock"), "2"],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == "ok"
+        writer = threading.Thread(target=metadata.upsert, args=({"b.txt": {"size": 2}},))
+        writer.start()
+        time.sleep(0.2)
+        assert writer.is_alive()  # en attente du verrou de fichier
+
+        started = time.monotonic()
+        assert metadata.load_metadata() == {"a.txt": {"size": 1}}
+        assert metadata.metadata_version() >= 1
+        assert time.monotonic() - started < 1
+        writer.join(10)
+        assert metadata.get_entry("b.txt") == {"size": 2}
+    finally:
+        holder.kill()
+        holder.wait()
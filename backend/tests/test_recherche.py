@@ -0,0 +1,107 @@
+import json
+
+from services.generation_service import bump_generation
+from services.metadata_service import remove, upsert
+
+
+def _doc(text, **extra):
+    return dict({"context": text, "type": "txt"}, **extra)
+
+
+def test_heavy_fields_stay_in_metadata(index):
+    upsert({"a.txt": _doc("le chat dort", thumbnail="data:image/png;base64," + "A" * 5000, minhash="2:AAAA")})
+    bump_generation()
+    manifest = index.update_index()
+    seg_id = manifest["segments"][0]["id"]
+    with open(index._segment_dir(seg_id) / "docs.json", encoding="utf-8") as f:
+        entry = json.load(f)["entries"][0]
+    assert entry == {"type": "txt"}
+    view = index.current_index()
+    assert view.text(0) == "le chat dort"
+
+
+def _ingest(index, docs=None, deleted=()):
+    if docs:
+        upsert({name: _doc(text) for name, text in docs.items()})
+    if deleted:
+        remove(list(deleted))
+    bump_generation()
+    return index.update_index()
+
+
+def _dead(index, manifest):
+    """Noms des documents marqués supprimés (tombstones) dans le manifeste."""
+    return {index._open_segment(int(seg_id)).names[local]
+            for seg_id, positions in manifest["tombstones"].items() for local in positions}
+
+
+def _texts(index):
+    view = index.current_index()
+    return {name: view.text(i) for i, name in enumerate(view.names)}
+
+
+def _found(index, term):
+    view = index.current_index()
+    return sorted(view.names[i] for i in view.postings(term).tolist())
+
+
+def test_write_delete_merge(index, monkeypatch):
+    monkeypatch.setattr(index, "MERGE_FACTOR", 4)
+    for i in range(0, 8, 2):
+        manifest = _ingest(index, {f"d{i}.txt": f"document {i} chat", f"d{i + 1}.txt": f"document {i + 1} chat"})
+    assert [s["docs"] for s in manifest["segments"]] == [2, 2, 2, 2]
+
+    # Remplacement et suppression : tombstones dans les anciens segments, nouveau segment pour d1
+    manifest = _ingest(index, {"d1.txt": "document 1 chien"}, deleted=["d2.txt"])
+    assert [s["docs"] for s in manifest["segments"]] == [2, 2, 2, 2, 1]
+    assert sorted(manifest["tombstones"]) == ["1", "2"] and _dead(index, manifest) == {"d1.txt", "d2.txt"}
+    expected = {f"d{i}.txt": f"document {i} chat" for i in (0, 3, 4, 5, 6, 7)}
+    expected["d1.txt"] = "document 1 chien"
+    assert _texts(index) == expected
+
+    assert index.merge_segments() == 1
+    manifest = index._read_manifest()
+    assert [s["docs"] for s in manifest["segments"]] == [6, 1]
+    assert manifest["tombstones"] == {}
+    # Anciens segments supprimés du disque
+    assert sorted(p.name for p in index.INDEX_DIR.iterdir() if p.name.startswith("seg_")) == \
+        sorted(index._segment_dir(s["id"]).name for s in manifest["segments"])
+    assert _texts(index) == expected
+    assert _found(index, "chat") == sorted(set(expected) - {"d1.txt"})
+    assert _found(index, "chien") == ["d1.txt"]
+
+
+def test_deletion_during_merge_is_carried_over(index, monkeypatch):
+    monkeypatch.setattr(index, "MERGE_FACTOR", 2)
+    _ingest(index, {"a.txt": "alpha chat", "c.txt": "gamma chat"})
+    _ingest(index, {"b.txt": "beta chat", "d.txt": "delta"})
+    write = index._write_segment_files
+
+    def write_then_delete(directory, names, entries, contexts):
+        info = write(directory, names, entries, contexts)
+        if "seg_merge" in directory.name:
+            # Un autre worker supprime un document pendant l'écriture du segment fusionné
+            _ingest(index, deleted=["a.txt"])
+        return info
+
+    monkeypatch.setattr(index, "_write_segment_files", write_then_delete)
+    assert index.merge_segments() == 1
+    manifest = index._read_manifest()
+    merged = manifest["segments"][0]["id"]
+    assert [s["docs"] for s in manifest["segments"]] == [4]
+    # La suppression notée sur l'ancien segment est reportée sur le segment fusionné
+    assert list(manifest["tombstones"]) == [str(merged)] and _dead(index, manifest) == {"a.txt"}
+    assert _texts(index) == {"c.txt": "gamma chat", "b.txt": "beta chat", "d.txt": "delta"}
+    assert _found(index, "chat") == ["b.txt", "c.txt"]
+
+
+def test_orphan_segment_directory_is_replaced(index):
+    manifest = _ingest(index, {"a.txt": "alpha"})
+    # Écrivain arrêté après avoir publié son dossier mais avant le manifeste
+    orphan = index._segment_dir(manifest["next_id"])
+    orphan.mkdir()
+    (orphan / "docs.json").write_text("{tronqué", encoding="utf-8")
+
+    manifest = _ingest(index, {"b.txt": "beta"})
+    assert manifest["segments"][-1]["id"] == int(orphan.name.split("_")[1])
+    assert _texts(index) == {"a.txt": "alpha", "b.txt": "beta"}
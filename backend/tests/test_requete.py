@@ -0,0 +1,150 @@
+import pytest
+
+from services.generation_service import bump_generation
+from services.metadata_service import upsert
+from services.requete_service import And, Field, Not, Or, Phrase, Prefix, QuerySyntaxError, Term, execute, parse_query
+
+
+def _shape(node):
+    """Arbre de la requête sous forme comparable."""
+    if isinstance(node, Term):
+        return node.term
+    if isinstance(node, Prefix):
+        return node.prefix + "*"
+    if isinstance(node, Phrase):
+        return '"' + " ".join(node.words) + '"'
+    if isinstance(node, Field):
+        return f"{node.name}{node.op}{node.value}"
+    if isinstance(node, Not):
+        return ("NOT", _shape(node.child))
+    return (type(node).__name__.upper(), [_shape(c) for c in node.children])
+
+
+# ---------------------------
+# Analyse
+# ---------------------------
+
+@pytest.mark.parametrize("query, shape", [
+    ("abeille", "abeille"),
+    ("abeille miel", ("AND", ["abeille", "miel"])),
+    ("abeille AND miel OR ruche", ("OR", [("AND", ["abeille", "miel"]), "ruche"])),
+    ("abeille OR miel ruche", ("OR", ["abeille", ("AND", ["miel", "ruche"])])),
+    ("abeille AND (miel OR ruche)", ("AND", ["abeille", ("OR", ["miel", "ruche"])])),
+    ("NOT abeille miel", ("AND", [("NOT", "abeille"), "miel"])),
+    ("NOT (abeille OR miel)", ("NOT", ("OR", ["abeille", "miel"]))),
+    ("abeille -robot", ("AND", ["abeille", ("NOT", "robot")])),
+    ('abeille -"miel de fleurs"', ("AND", ["abeille", ("NOT", '"miel fleurs"')])),
+    ("-(robot OR ruche) miel", ("AND", [("NOT", ("OR", ["robot", "ruche"])), "miel"])),
+    ("poll*", "poll*"),
+    ('"miel de fleurs"', '"miel fleurs"'),
+    ('"le miel"', "miel"),
+    ('"de la"', '"de la"'),
+    ("l'abeille", "abeille"),
+    ("type:PDF", "type:pdf"),
+    ("date>=2025-01-01 date<2025-02", ("AND", ["date>=2025-01-01", "date<2025-02"])),
+    ("date:2025", "date:2025"),
+    ('"and"', "and"),
+])
+def test_parse(query, shape):
+    assert _shape(parse_query(query)) == shape
+
+
+@pytest.mark.parametrize("query, message", [
+    ("", "vide"),
+    ("   ", "vide"),
+    ("(abeille OR miel", "non fermée"),
+    ("abeille)", "en trop"),
+    ("abeille AND", "manquant"),
+    ("abeille OR OR miel", "inattendu"),
+    ("type>pdf", "type:pdf"),
+    ("date>hier", "AAAA-MM-JJ"),
+    ("date:2025-1", "AAAA-MM-JJ"),
+    ("***", "invalide"),
+    ("chat and chien", "majuscules"),
+    ("chat Or chien", "majuscules"),
+    ("not chat", "majuscules"),
+])
+def test_syntax_errors(query, message):
+    with pytest.raises(QuerySyntaxError, match=message):
+        parse_query(query)
+
+
+def test_terms_for_highlighting():
+    assert parse_query('abeille OR "miel de fleurs" -robot poll*').terms() == ["abeille", "miel fleurs", "poll"]
+
+
+# ---------------------------
+# Exécution sur l'index
+# ---------------------------
+
+DOCS = {
+    "a.txt": ("abeille miel fleurs printemps", "txt", "2025-01-10"),
+    "b.pdf": ("abeille ruche reine", "pdf", "2025-02-01"),
+    "c.html": ("miel fleurs lavande", "html", "2024-12-31"),
+    "d.txt": ("robot abeille miel", "txt", "2025-03-05"),
+    "e.pdf": ("fleurs miel pollen", "pdf", None),
+}
+
+
+@pytest.fixture
+def view(index):
+    upsert({name: {"context": text, "type": doc_type, "date_import": date}
+            for name, (text, doc_type, date) in DOCS.items()})
+    bump_generation()
+    return index.current_index()
+
+
+def _run(view, query, candidates=None):
+    return sorted(view.names[i] for i in execute(parse_query(query), view, candidates).tolist())
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("abeille miel", ["a.txt", "d.txt"]),
+    ("abeille AND miel -robot", ["a.txt"]),
+    ("abeille OR lavande", ["a.txt", "b.pdf", "c.html", "d.txt"]),
+    ("miel abeille OR ruche", ["a.txt", "b.pdf", "d.txt"]),
+    ("miel (abeille OR ruche)", ["a.txt", "d.txt"]),
+    ("NOT abeille", ["c.html", "e.pdf"]),
+    ("NOT abeille NOT pollen", ["c.html"]),
+    ("-miel", ["b.pdf"]),
+    ('"miel de fleurs"', ["a.txt", "c.html"]),
+    ('"fleurs miel"', ["e.pdf"]),
+    ('-"miel fleurs" miel', ["d.txt", "e.pdf"]),
+    ("abei*", ["a.txt", "b.pdf", "d.txt"]),
+    ("poll* OR lav*", ["c.html", "e.pdf"]),
+    ("inconnu", []),
+    ("abeille inconnu", []),
+    ("type:pdf", ["b.pdf", "e.pdf"]),
+    ("abeille NOT type:pdf", ["a.txt", "d.txt"]),
+    ("date>=2025-01-10 date<2025-03", ["a.txt", "b.pdf"]),
+    ("date:2025-02", ["b.pdf"]),
+    ("date<2025", ["c.html"]),
+    ("date>2025-01", ["b.pdf", "d.txt"]),
+    ("(abeille OR lavande) AND NOT type:html", ["a.txt", "b.pdf", "d.txt"]),
+])
+def test_execute(view, query, expected):
+    assert _run(view, query) == expected
+
+
+def test_execute_within_candidates(view):
+    allowed = sorted(view.names.index(n) for n in ("a.txt", "c.html", "e.pdf"))
+    assert _run(view, "miel", allowed) == ["a.txt", "c.html", "e.pdf"]
+    assert _run(view, "miel NOT fleurs", allowed) == []
+    assert _run(view, "abeille OR pollen", allowed) == ["a.txt", "e.pdf"]
+
+
+def test_type_filter_matches_type_facet(index):
+    from services.facettes_service import facets_for, to_positions
+
+    # Type enregistré différent de l'extension (fichier renommé), et document sans extension
+    upsert({"renomme.htm": {"context": "abeille", "type": "pdf"},
+            "rapport": {"context": "abeille", "type": "PDF"},
+            "b.pdf": {"context": "abeille", "type": "pdf"}})
+    bump_generation()
+    view = index.current_index()
+    facets = facets_for(view)
+    for value in ("pdf", "htm"):
+        by_facet = sorted(view.names[i] for i in to_positions(facets.allowed(type=[value]), len(view)))
+        assert _run(view, f"type:{value}") == by_facet
+    assert _run(view, "type:pdf") == ["b.pdf", "rapport"]
+    assert _run(view, "type:htm") == ["renomme.htm"]
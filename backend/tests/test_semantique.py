@@ -0,0 +1,39 @@
+import numpy as np
+import scipy.sparse as sp
+
+from services import semantique_service as semantique
+from services.metadata_service import upsert
+
+
+def _tf(n, width, seed=0):
+    rng = np.random.RandomState(seed)
+    return sp.csr_matrix(rng.poisson(0.3, size=(n, width)).astype(np.float32))
+
+
+def test_number_of_concepts():
+    for n, expected in ((1, 1), (2, 1), (4, 3), (8, 7), (20, 8), (100, 25), (800, semantique.DIM)):
+        _, components, vectors = semantique._fit(_tf(n, 300))
+        assert components.shape[1] == expected, n
+        assert vectors.shape == (n, expected)
+
+
+def _words(text):
+    counts = {}
+    for word in text.split():
+        counts[word] = counts.get(word, 0) + 1
+    return sorted(counts.items())
+
+
+def test_small_corpus_finds_documents(workdir, monkeypatch):
+    monkeypatch.setattr(semantique, "_state", None)
+    monkeypatch.setattr(semantique, "_state_stamp", None)
+    upsert({
+        "chats.txt": {"words": _words("chat dort canapé chat noir chaton joue souris salon")},
+        "chiens.txt": {"words": _words("chien aboie jardin chien berger garde troupeau mouton")},
+        "felins.txt": {"words": _words("félin chat lion chasse souris gazelle savane")},
+        "cuisine.txt": {"words": _words("recette tarte pomme beurre farine sucre")},
+    })
+    found = dict(semantique.search("chat"))
+    assert set(found) >= {"chats.txt", "felins.txt"}
+    assert "cuisine.txt" not in found
+    assert [name for name, _ in semantique.search("tarte")] == ["cuisine.txt"]
@@ -0,0 +1,124 @@
+import threading
+
+import numpy as np
+import pytest
+
+from services import similarite_service as similarite
+from services.metadata_service import remove, upsert
+
+
+@pytest.fixture
+def graph(workdir, monkeypatch):
+    monkeypatch.setattr(similarite, "_state", None)
+    monkeypatch.setattr(similarite, "BACKGROUND_UPDATE", False)
+    return similarite
+
+
+def _entry(*words):
+    return {"words": [[w, 1 + i % 3] for i, w in enumerate(words)]}
+
+
+def _corpus(n, start=0):
+    # Documents voisins deux à deux (mots partagés avec le suivant)
+    return {f"doc{i}.txt": _entry(f"mot{i}", f"mot{i + 1}", f"seul{i}", "commun") for i in range(start, start + n)}
+
+
+def _reloaded(graph):
+    """État relu depuis le disque (comme par un autre worker)."""
+    graph._state = None
+    with graph._lock:
+        return graph._load()
+
+
+def _same(a, b):
+    assert a["version"] == b["version"]
+    assert a["names"] == b["names"]
+    assert a["neighbours"] == b["neighbours"]
+    assert (a["tf"] != b["tf"]).nnz == 0
+
+
+def test_update_appends_only_changes(graph):
+    upsert(_corpus(20))
+    graph.update_graph()
+    rows_file = graph.SIMILARITY_DIR / graph._state["rows"]
+    log_before, rows_before = graph.GRAPH_LOG.read_bytes(), rows_file.read_bytes()
+
+    upsert({"nouveau.txt": _entry("mot3", "mot4", "seul3")})
+    state = graph.update_graph()
+    # Fichiers complétés, pas réécrits
+    assert graph.GRAPH_LOG.read_bytes().startswith(log_before)
+    assert rows_file.read_bytes().startswith(rows_before)
+    assert len(rows_file.read_bytes()) - len(rows_before) == 8 * 3
+    assert state["neighbours"]["nouveau.txt"][0][0] == "doc3.txt"
+    assert "nouveau.txt" in [n for n, _ in state["neighbours"]["doc3.txt"]]
+    _same(_reloaded(graph), state)
+
+
+def test_remove_and_modify_replayed_from_log(graph):
+    upsert(_corpus(10))
+    graph.update_graph()
+    before = _reloaded(graph)
+    remove(["doc4.txt"])
+    upsert({"doc5.txt": _entry("autre", "chose")})
+    state = graph.update_graph()
+    assert "doc4.txt" not in state["neighbours"]
+    assert all(other != "doc4.txt" for ns in state["neighbours"].values() for other, _ in ns)
+    # Relecture de la seule fin du journal depuis un état plus ancien
+    graph._state = before
+    with graph._lock:
+        tail = graph._load()
+    _same(tail, state)
+    _same(_reloaded(graph), state)
+
+
+def test_incremental_matches_rebuild_for_new_documents(graph):
+    upsert(_corpus(12))
+    graph.update_graph()
+    upsert(_corpus(3, start=12))
+    state = graph.update_graph()
+    from services.metadata_service import load_metadata
+    full = graph.rebuild(load_metadata())
+    for name in ("doc12.txt", "doc13.txt", "doc14.txt"):
+        assert [n for n, _ in state["neighbours"][name]] == [n for n, _ in full["neighbours"][name]]
+
+
+def test_compaction_rewrites_log_and_vectors(graph, monkeypatch):
+    monkeypatch.setattr(graph, "COMPACT_RECORDS", 0)
+    monkeypatch.setattr(graph, "COMPACT_BYTES", 0)
+    upsert(_corpus(6))
+    graph.update_graph()
+    first = graph._state["rows"]
+    remove(["doc0.txt", "doc1.txt"])
+    state = graph.update_graph()
+    assert state["rows"] != first
+    assert sorted(p.name for p in graph.SIMILARITY_DIR.glob("vectors-*.bin")) == [state["rows"]]
+    assert (graph.SIMILARITY_DIR / state["rows"]).stat().st_size == 8 * state["tf"].nnz
+    _same(_reloaded(graph), state)
+
+
+def test_legacy_files_removed_and_unreadable_log_rebuilt(graph):
+    graph.SIMILARITY_DIR.mkdir(parents=True)
+    for path in graph._LEGACY_FILES:
+        path.write_bytes(b"ancien")
+    upsert(_corpus(4))
+    graph.update_graph()
+    assert not any(path.exists() for path in graph._LEGACY_FILES)
+
+    (graph.SIMILARITY_DIR / graph._state["rows"]).unlink()
+    graph._state = None
+    state = graph.update_graph()
+    assert sorted(state["names"]) == sorted(_corpus(4))
+    assert np.all(np.diff(state["tf"].indptr) == 4)
+
+
+def test_new_generation_updates_in_background(graph, monkeypatch):
+    from services import generation_service
+
+    assert graph._update_in_background in generation_service._listeners
+    # Seul l'abonné de ce module (les autres services ne travaillent pas pendant ce test)
+    monkeypatch.setattr(generation_service, "_listeners", [graph._update_in_background])
+    monkeypatch.setattr(graph, "BACKGROUND_UPDATE", True)
+    done = threading.Event()
+    monkeypatch.setattr(graph, "update_graph", done.set)
+    generation_service.bump_generation()
+    assert done.wait(5)
@@ -0,0 +1,149 @@
+import random
+import struct
+
+import numpy as np
+import pytest
+
+from services import textes_service as textes
+
+
+@pytest.fixture
+def small_blocks(workdir, monkeypatch):
+    # Blocs de 16 caractères : les fenêtres traversent plusieurs blocs
+    monkeypatch.setattr(textes, "BLOCK_CHARS", 16)
+    return workdir / "textes"
+
+
+def _text(n, seed=0):
+    rng = random.Random(seed)
+    alphabet = "abcdefghij éèàç€🐝\n"
+    return "".join(rng.choice(alphabet) for _ in range(n))
+
+
+@pytest.mark.parametrize("n", [0, 1, 15, 16, 17, 32, 100, 1000])
+def test_roundtrip(small_blocks, n):
+    text = _text(n)
+    textes.write_text(small_blocks, "doc.pdf", text)
+    assert textes.read_text(small_blocks, "doc.pdf") == text
+
+
+def test_streamed_writes_match_single_write(small_blocks):
+    text = _text(500, seed=1)
+    rng = random.Random(2)
+    with textes.open_writer(small_blocks, "flux.txt") as writer:
+        pos = 0
+        while pos < len(text):
+            step = rng.randint(0, 40)
+            writer.write(text[pos:pos + step])
+            pos += step
+    textes.write_text(small_blocks, "direct.txt", text)
+    assert textes.read_text(small_blocks, "flux.txt") == text
+    assert textes.text_path(small_blocks, "flux.txt").read_bytes() == \
+        textes.text_path(small_blocks, "direct.txt").read_bytes()
+
+
+def test_trailer_and_block_index(small_blocks):
+    text = _text(100)
+    textes.write_text(small_blocks, "doc.txt", text)
+    data = textes.text_path(small_blocks, "doc.txt").read_bytes()
+    index_at, chars, block_chars, magic = struct.unpack("<QQI4s", data[-textes._TRAILER.size:])
+    assert (chars, block_chars, magic) == (100, 16, b"TXZ1")
+    offsets = np.frombuffer(data[index_at:-textes._TRAILER.size], dtype="<u8")
+    assert len(offsets) == 7 + 1  # ceil(100 / 16) blocs
+    assert offsets[0] == 0 and offsets[-1] == index_at
+    assert np.all(np.diff(offsets.astype(np.int64)) > 0)
+
+
+def test_windows_across_blocks(small_blocks):
+    text = _text(100, seed=3)
+    textes.write_text(small_blocks, "doc.txt", text)
+    for start in range(0, 104, 3):
+        for length in (0, 1, 5, 15, 16, 17, 40, 200):
+            assert textes.read_window(small_blocks, "doc.txt", start, length) == text[start:start + length]
+
+
+def test_window_reads_only_needed_blocks(small_blocks, monkeypatch):
+    text = _text(100)
+    textes.write_text(small_blocks, "doc.txt", text)
+    read = []
+    blocks = textes._blocks
+    monkeypatch.setattr(textes, "_blocks", lambda f, offsets, first, last: read.append((first, last))
+                        or blocks(f, offsets, first, last))
+    assert textes.read_window(small_blocks, "doc.txt", 30, 5) == text[30:35]
+    assert read == [(1, 2)]
+
+
+def test_legacy_txt_fallback(small_blocks):
+    small_blocks.mkdir()
+    legacy = small_blocks / "ancien.pdf.txt"
+    legacy.write_text("ancien texte non compressé", encoding="utf-8")
+    assert textes.read_text(small_blocks, "ancien.pdf") == "ancien texte non compressé"
+    assert textes.read_window(small_blocks, "ancien.pdf", 7, 5) == "texte"
+    assert textes.list_texts(small_blocks) == ["ancien.pdf"]
+
+    assert textes.compress_legacy(small_blocks) == 1
+    assert not legacy.exists()
+    assert textes.read_text(small_blocks, "ancien.pdf") == "ancien texte non compressé"
+
+    # Réécriture d'un document encore au format .txt : l'ancien fichier est retiré
+    legacy.write_text("vieux", encoding="utf-8")
+    textes.write_text(small_blocks, "ancien.pdf", "nouveau")
+    assert not legacy.exists()
+    assert textes.read_text(small_blocks, "ancien.pdf") == "nouveau"
+    assert textes.delete_text(small_blocks, "ancien.pdf") == [textes.text_path(small_blocks, "ancien.pdf")]
+    assert textes.read_text(small_blocks, "ancien.pdf") is None
+    assert textes.read_window(small_blocks, "ancien.pdf") is None
+
+
+def _corrupt_truncated(data):
+    return data[:len(data) // 2]
+
+
+def _corrupt_trailer(data):
+    return data[:-4] + b"XXXX"
+
+
+def _corrupt_block(data):
+    return b"\x00\xff" * 4 + data[8:]
+
+
+def _corrupt_index(data):
+    index_at = struct.unpack("<Q", data[-textes._TRAILER.size:][:8])[0]
+    return data[:index_at] + b"\xff" * 8 + data[index_at + 8:]
+
+
+@pytest.mark.parametrize("damage", [_corrupt_truncated, _corrupt_trailer, _corrupt_block, _corrupt_index,
+                                    lambda data: b"", lambda data: data[:10]])
+def test_corrupt_file_is_treated_as_missing(small_blocks, capsys, damage):
+    textes.write_text(small_blocks, "doc.txt", _text(100))
+    path = textes.text_path(small_blocks, "doc.txt")
+    path.write_bytes(damage(path.read_bytes()))
+    assert textes.read_text(small_blocks, "doc.txt") is None
+    assert textes.read_window(small_blocks, "doc.txt", 0, 50) is None
+    assert textes.document_text("doc.txt", {}, small_blocks) == ""
+    assert textes.document_window("doc.txt", {}, 0, 50, small_blocks) == ""
+    assert "illisible" in capsys.readouterr().out
+
+
+def test_metadata_context_takes_precedence(small_blocks):
+    textes.write_text(small_blocks, "doc.txt", "stocké")
+    assert textes.document_text("doc.txt", {"context": "ancien"}, small_blocks) == "ancien"
+    assert textes.document_window("doc.txt", {"context": "ancien"}, 1, 3, small_blocks) == "nci"
+    data = {"context": "détaché", "size": 3}
+    assert textes.detach_text("doc.txt", data, small_blocks) == {"size": 3}
+    assert textes.document_text("doc.txt", data, small_blocks) == "détaché"
+
+
+def test_index_build_survives_corrupt_text(index, capsys):
+    from services.generation_service import bump_generation
+    from services.metadata_service import upsert
+
+    textes.write_text(textes.CLEAN_DIR, "sain.txt", "texte sain")
+    textes.write_text(textes.CLEAN_DIR, "abime.txt", "texte abîmé")
+    path = textes.text_path(textes.CLEAN_DIR, "abime.txt")
+    path.write_bytes(path.read_bytes()[:-3])
+    upsert({"sain.txt": {"type": "txt"}, "abime.txt": {"type": "txt"}})
+    bump_generation()
+    view = index.current_index()
+    assert {name: view.text(i) for i, name in enumerate(view.names)} == {"sain.txt": "texte sain", "abime.txt": ""}
+    assert "abime.txt" in capsys.readouterr().out
@@ -0,0 +1,6 @@
+# wsgi.py
+# Point d'entrée WSGI pour un serveur de production, par exemple :
+#   gunicorn -w 4 -b 0.0.0.0:5000 --preload wsgi:app
+from app import app
+
+application = app
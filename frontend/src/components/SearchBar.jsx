@@ -134,6 +134,8 @@ export default function SearchBar({ onSearch, inputValue = null, onInputChange =
         <option value="all_words_and">AND</option>
         <option value="or">OR</option>
         <option value="exact">Terme complet</option>
+        <option value="query" title='AND, OR, NOT, "phrase", préfixe*, type:pdf, date>2025-01-01'>Avancée</option>
+        <option value="semantic" title="Documents proches par le sens, même sans les mots exacts">Sémantique</option>
       </select>
     </form>
   );
@@ -20,7 +20,7 @@ export function AdminHome() {
         axios.get('http://localhost:5000/api/admin/stats', {
           headers: { 'X-Role': 'admin', 'Authorization': `Bearer ${token}` }
         }),
-        axios.get('http://localhost:5000/api/admin/files?limit=5', {
+        axios.get('http://localhost:5000/api/admin/files?limit=5&sort=date&order=desc', {
           headers: { 'X-Role': 'admin', 'Authorization': `Bearer ${token}` }
         })
       ]);
@@ -11,6 +11,7 @@ export default function IndexationView() {
   const [mode, setMode] = useState('all_words_and');
   const [selectedTypes, setSelectedTypes] = useState([]);
   const [availableTypes, setAvailableTypes] = useState([]);
+  const [facets, setFacets] = useState({});
   const [error, setError] = useState(null);
   const [searchParams, setSearchParams] = useSearchParams();
 
@@ -21,7 +22,9 @@ export default function IndexationView() {
   const modeLabels = {
     all_words_and: "Tous les mots",
     or: "Au moins un mot",
-    exact: "Expression exacte"
+    exact: "Expression exacte",
+    query: "Requête avancée",
+    semantic: "Recherche sémantique"
   };
 
   useEffect(() => {
@@ -81,6 +84,8 @@ export default function IndexationView() {
       );
       const data = await response.json();
       setResults(data.results || []);
+      setFacets(data.facets || {});
+      if (data.error) setError(data.error);
 
       if (!skipUrlUpdate) {
         const nextParams = { q: trimmedQuery, mode: appliedMode };
@@ -132,6 +137,7 @@ export default function IndexationView() {
                     }}
                   >
                     {type}
+                    {facets.type && facets.type[type] ? ` (${facets.type[type]})` : ''}
                   </button>
                 ))}
               </div>